@@ -0,0 +1,125 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2024-2025      Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+Benchmark for building the search index: the serial writer vs. the
+multiprocess writer that SearchEngine.build_index uses when more than one
+build process is selected.
+
+This runs outside Gramps with synthetic documents that look like people and
+notes. Usage:
+
+    python bench_build.py [number of objects] [processes]
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from whoosh.index import create_in
+from whoosh.fields import ID, TEXT, NUMERIC, STORED, Schema
+from whoosh.analysis import RegexTokenizer, LowercaseFilter
+
+# same settings as in SearchEngine
+MP_BATCHSIZE = 1000
+MP_LIMITMB = 64
+
+FIRST_NAMES = ["Matti", "Maria", "Juho", "Anna", "Johan", "Liisa", "Erik", "Kaisa", "Antti", "Helena"]
+SURNAMES = ["Virtanen", "Korhonen", "Nieminen", "Johansson", "Mäkinen", "Hämäläinen", "Laine", "Heikkinen"]
+WORDS = ("born baptized married died buried farm village parish church record "
+         "witness father mother son daughter house crofter soldier widow").split()
+
+
+def create_schema():
+    # same as in SearchEngine.init_fulltext
+    analyzer = RegexTokenizer(r"\w+|@|\$|£|€|#|=|\[|\]") | LowercaseFilter()
+    return Schema(
+        objtype=TEXT(stored=True),
+        title=TEXT(stored=True),
+        handle=ID(stored=True),
+        seq=NUMERIC(stored=True),
+        contenttype=TEXT(stored=True),
+        content=TEXT(analyzer=analyzer),
+        text=STORED(),
+    )
+
+
+def generate_documents(count):
+    rnd = random.Random(1)
+    for i in range(count):
+        if i % 2:
+            name = rnd.choice(FIRST_NAMES) + " " + rnd.choice(SURNAMES)
+            yield ("person", "I%d" % i, "%027x" % i, 0, "name", name)
+        else:
+            text = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(10, 200)))
+            yield ("note", "N%d" % i, "%027x" % i, 0, "text", text)
+
+
+def build(indexdir, count, procs):
+    if os.path.exists(indexdir):
+        shutil.rmtree(indexdir)
+    os.makedirs(indexdir)
+    ix = create_in(indexdir, create_schema())
+    t1 = time.time()
+    if procs > 1:
+        writer = ix.writer(procs=procs, batchsize=MP_BATCHSIZE, limitmb=MP_LIMITMB)
+    else:
+        writer = ix.writer()
+    with writer:
+        for objtype, gramps_id, handle, seq, contenttype, content in generate_documents(count):
+            writer.add_document(
+                objtype=objtype,
+                title=gramps_id,
+                handle=handle,
+                seq=seq,
+                contenttype=contenttype,
+                content=content,
+                text=zlib.compress(content.encode("utf-8")) if len(content) > 100 else content,
+            )
+        t2 = time.time()
+    t3 = time.time()
+    with ix.searcher() as searcher:
+        assert searcher.doc_count() == count
+    return t2 - t1, t3 - t2
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    procs = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print("{} objects".format(count))
+        print("{:>10} {:>10} {:>10} {:>10} {:>12}".format("processes", "add", "commit", "total", "objects/s"))
+        for p in sorted({1, procs}):
+            add, commit = build(os.path.join(tmpdir, "indexdir%d" % p), count, p)
+            total = add + commit
+            print("{:>10} {:>10.2f} {:>10.2f} {:>10.2f} {:>12.0f}".format(p, add, commit, total, count / total))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
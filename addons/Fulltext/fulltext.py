@@ -20,7 +20,7 @@
 
 # This program uses the Whoosh library by Matt Chaput, see https://whoosh.readthedocs.io/en/latest/
 
-dbtrace_version = 1
+dbtrace_version = 2
 
 import html
 import os
@@ -30,10 +30,12 @@ import time
 import traceback
 import uuid
 
+from collections import OrderedDict
+
 #import whoosh
 import whoosh.highlight
 from whoosh.index import create_in, open_dir
-from whoosh.fields import ID, TEXT, NUMERIC, Schema
+from whoosh.fields import ID, TEXT, NUMERIC, STORED, Schema
 from whoosh.qparser import QueryParser
 from whoosh.lang import morph_en
 from whoosh.analysis import filters, StandardAnalyzer, RegexTokenizer, LowercaseFilter
@@ -65,6 +67,9 @@ _ = _trans.gettext
 fulltext_config = configman.register_manager("fulltext")
 
 fulltext_config.register("defaults.querytext", "")
+fulltext_config.register("defaults.procs", 1)
+
+searchers = {}  # dbid -> CachedSearcher
 
 class ColorFormatter(whoosh.highlight.Formatter):
     """
@@ -83,6 +88,51 @@ class ColorFormatter(whoosh.highlight.Formatter):
         # Return the text as you want it to appear in the highlighted string
         return ColorFormatter.PREFIX1 + tokentext + ColorFormatter.SUFFIX1
 
+class CachedSearcher:
+    """
+    A long-lived searcher for the index of one family tree. The searcher is
+    refreshed only when the live update writer has committed changes to the
+    index. Results of the latest queries are kept in a small LRU cache that
+    is cleared whenever the searcher is refreshed.
+    """
+    CACHE_SIZE = 50
+
+    def __init__(self, dbid, indexdir):
+        self.dbid = dbid
+        self.ix = open_dir(indexdir)
+        self.generation = fulltext_loader.get_generation(dbid)
+        self.searcher = self.ix.searcher()
+        self.results = OrderedDict()
+
+    def get_searcher(self):
+        generation = fulltext_loader.get_generation(self.dbid)
+        if generation != self.generation:
+            self.generation = generation
+            self.searcher = self.searcher.refresh()
+            self.results.clear()
+        return self.searcher
+
+    def get_results(self, key):
+        rows = self.results.get(key)
+        if rows is not None:
+            self.results.move_to_end(key)
+        return rows
+
+    def put_results(self, key, rows):
+        self.results[key] = rows
+        if len(self.results) > self.CACHE_SIZE:
+            self.results.popitem(last=False)
+
+    def close(self):
+        self.searcher.close()
+        self.results.clear()
+
+
+def close_searchers(keep=None):
+    for dbid in list(searchers):
+        if dbid != keep:
+            searchers.pop(dbid).close()
+
 class FulltextWindow(ManagedWindow):
     def __init__(self, uistate, window):
         ManagedWindow.__init__(self, uistate, [], window, modal=False)
@@ -102,6 +152,8 @@ class FulltextWindow(ManagedWindow):
 #
 # -------------------------------------------------------------------------
 class Tool(tool.Tool):
+    COMPLETION_MINLEN = 2   # complete only words at least this long
+    COMPLETION_LIMIT = 50   # max number of words in the completion list
 
     def __init__(self, dbstate, user, options_class, name, callback=None):
         # type: (Any, Any, Any, str, Callable) -> None
@@ -110,6 +162,9 @@ class Tool(tool.Tool):
         except:
             ErrorDialog(_("Error"), _("The Fulltext tool requires the dbtrace addon"))
             return
+        if not hasattr(dbtrace, "enable_changes"):
+            ErrorDialog(_("Error"), _("The Fulltext tool requires a newer version of the dbtrace addon"))
+            return
         self.user = user
         self.uistate = user.uistate
         self.dbstate = dbstate
@@ -140,8 +195,10 @@ class Tool(tool.Tool):
         self.build_index_button = self.glade.get_child_object("build_index")
         self.close_button = self.glade.get_child_object("close")
         self.limit = self.glade.get_child_object("limit")
+        self.box3 = self.glade.get_child_object("box3")
 
         self.query_field.connect("key-press-event", self.keypress)
+        self.query_field.connect("changed", self.update_completions)
         self.search_button.connect("clicked", self.dosearch)
         self.create_index_button.connect("clicked", self.build_index2)
         self.listview.connect("button-press-event", self.button_press)
@@ -170,6 +227,14 @@ class Tool(tool.Tool):
         lastquery = fulltext_config.get("defaults.querytext")
         self.query_field.set_text(lastquery)
 
+        # number of processes used to build the index
+        self.procs = Gtk.SpinButton.new_with_range(1, os.cpu_count() or 1, 1)
+        self.procs.set_value(fulltext_config.get("defaults.procs"))
+        self.procs.set_tooltip_text("Number of processes used when building the index")
+        self.box3.pack_end(self.procs, False, False, 0)
+        self.box3.pack_end(Gtk.Label(label="Build processes:"), False, False, 5)
+        self.box3.show_all()
+
         ret = self.engine.init_fulltext()
         if ret == self.engine.ERR_DB_NOT_OPEN:            
             ErrorDialog("Error", "Database is not open")
@@ -213,15 +278,27 @@ class Tool(tool.Tool):
         entry_completion.set_model(self.completion_list)
         self.query_field.set_completion(entry_completion)
 
+    def update_completions(self, entry):
+        """
+        Fill the completion list with the words in the index that start with
+        the last (partial) word in the query field.
+        """
+        if not hasattr(self, "completion_list"):
+            return
+        self.completion_list.clear()
+        text = entry.get_text()
+        m = re.search(r"\w+$", text)
+        if not m or len(m.group(0)) < self.COMPLETION_MINLEN:
+            return
+        head = text[:m.start()]
         try:
-            words = open(self.engine.wordfile, encoding='utf-8').readlines()
+            words = self.engine.complete(m.group(0).lower(), self.COMPLETION_LIMIT)
         except:
-            words = []
-        
-        self.completion_list.clear()
-        for text in words:
-            self.completion_list.append([text.strip()])
-                    
+            traceback.print_exc()
+            return
+        for word in words:
+            self.completion_list.append([head + word])
+
     def db_changed(self, db):
         self.glade.toplevel.destroy()
 
@@ -266,9 +343,9 @@ class Tool(tool.Tool):
             if treeiter is None:
                 return  # list is empty
             row = list(model[treeiter])
-            namespace = row[-2].capitalize()
-            obj = row[-1]
-            self.right_click(obj, namespace, event)
+            handle = row[3]
+            namespace = row[4].capitalize()
+            self.right_click(handle, namespace, event)
             return True
 
     def is_right_click(self, event):
@@ -281,7 +358,7 @@ class Tool(tool.Tool):
             return True            
         return False
 
-    def right_click(self, obj, namespace, event):
+    def right_click(self, handle, namespace, event):
         """
         On right click show a popup menu.
         """
@@ -292,7 +369,7 @@ class Tool(tool.Tool):
         item = Gtk.MenuItem.new_with_mnemonic("Activate")
         item.connect(
             "activate",
-            lambda _menuitem: self.uistate.set_active(obj.handle, namespace),
+            lambda _menuitem: self.uistate.set_active(handle, namespace),
         )
         menu.append(item)
         item.show()
@@ -300,7 +377,7 @@ class Tool(tool.Tool):
         # item = Gtk.MenuItem.new_with_mnemonic("Copy to clipboard")
         # item.connect(
         #     "activate",
-        #     lambda _menuitem: self.copy_to_clipboard(obj.handle, namespace),
+        #     lambda _menuitem: self.copy_to_clipboard(handle, namespace),
         # )
         # menu.append(item)
         # item.show()
@@ -325,10 +402,13 @@ class Tool(tool.Tool):
         QuestionDialog("Confirm rebuild","", "Build",  self.build_index2)
 
     def build_index2(self, _widget=None):
+        procs = self.procs.get_value_as_int()
+        fulltext_config.set("defaults.procs", procs)
+        fulltext_config.save()
         progress = ProgressMeter('Building index', 'Building', can_cancel=True)
-        n, elapsed = self.engine.build_index(progress=progress)
+        n, elapsed = self.engine.build_index(progress=progress, procs=procs)
         progress.close()
-        msg = "Indexed {} objects in {:.2f} seconds".format(n, elapsed)
+        msg = "Indexed {} objects in {:.2f} seconds ({} processes)".format(n, elapsed, procs)
         self.set_entry_completion()
         self.msg.set_text(msg)
         self.msg2.set_text("")
@@ -358,7 +438,10 @@ class Tool(tool.Tool):
             self.msg2.set_text("Results: {} (time {:.2f} s)".format(len(rows), elapsed))
 
 class SearchEngine:
-    VERSION = 3
+    VERSION = 4
+
+    MP_BATCHSIZE = 1000     # documents per job sent to a worker process
+    MP_LIMITMB = 64         # memory limit per worker process
     
     ERR_OK = 0
     ERR_DB_NOT_OPEN = 1
@@ -374,8 +457,10 @@ class SearchEngine:
         if not dbid:
             return self.ERR_DB_NOT_OPEN
 
+        self.dbid = dbid
         self.indexdir = os.path.join(dbpath, dbid, "indexdir")
-        self.wordfile = self.indexdir + ".words"
+        close_searchers(keep=dbid)
+        self.wordfile = self.indexdir + ".words"   # used by versions < 4
         self.versionfile = self.indexdir + ".version"
 
         analyzer = RegexTokenizer(r"\w+|@|\$|£|€|#|=|\[|\]") | LowercaseFilter()
@@ -386,6 +471,7 @@ class SearchEngine:
             seq=NUMERIC(stored=True),
             contenttype=TEXT(stored=True),
             content=TEXT(analyzer=analyzer),
+            text=STORED(),      # the content as text, compressed if long
         )
         self.create_parser()
 
@@ -406,15 +492,23 @@ class SearchEngine:
         self.parser.add_plugin(whoosh.qparser.PlusMinusPlugin())
 
     def delete_index(self):
+        # stop the live updates first so that nothing is writing to the index
+        fulltext_loader.disable_trace(self.db)
+        close_searchers()
         if os.path.exists(self.indexdir):
             shutil.rmtree(self.indexdir)
         if os.path.exists(self.wordfile):
             os.remove(self.wordfile)
         if os.path.exists(self.versionfile):
             os.remove(self.versionfile)
-        fulltext_loader.disable_trace(self.db)
 
-    def build_index(self, _widget=None, progress=None):
+    def build_index(self, _widget=None, progress=None, procs=1):
+        """
+        Build the index from scratch. With procs > 1 the objects are read and
+        serialized in this process but the text analysis and indexing is done
+        in a pool of procs worker processes (whoosh.multiproc.MpWriter) and the
+        resulting segments are merged into one at the end.
+        """
         t1 = time.time()
         self.delete_index()
         os.makedirs(self.indexdir)
@@ -422,8 +516,11 @@ class SearchEngine:
 
         canceled = False
         n = 0
-        words = set()
-        with ix.writer() as writer:
+        if procs > 1:
+            writer = ix.writer(procs=procs, batchsize=self.MP_BATCHSIZE, limitmb=self.MP_LIMITMB)
+        else:
+            writer = ix.writer()
+        with writer:
             for objtype in sorted(fulltext_objects.OBJTYPES):
                 if canceled: break
                 proxy = fulltext_objects.getproxy(objtype)
@@ -442,62 +539,95 @@ class SearchEngine:
                             seq=seq,
                             contenttype=contenttype,
                             content=content,
+                            text=fulltext_objects.pack_text(content),
                         )
-                    words.update(re.split(r"\W+", content))
                     n += 1
 
-            with open(self.wordfile, "wt", encoding='utf-8') as f:
-                for w in sorted(words):
-                    print(w, file=f)
+            if progress:
+                progress.set_header("Merging index segments")
         
         fulltext_loader.enable_trace(self.db)
         t2 = time.time()
         open(self.versionfile, "wt").write(str(self.VERSION))
         return n, t2-t1
 
+    def get_cached_searcher(self):
+        cached = searchers.get(self.dbid)
+        if cached is None:
+            cached = CachedSearcher(self.dbid, self.indexdir)
+            searchers[self.dbid] = cached
+        return cached
+
+    def complete(self, prefix, limit):
+        """
+        Returns at most 'limit' words from the index that start with 'prefix'.
+        The words come from the term dictionary of the index. A live update
+        or delete leaves the old terms in the dictionary until the segments
+        are merged, so a term is skipped if all its documents are deleted.
+        """
+        reader = self.get_cached_searcher().get_searcher().reader()
+        deletions = reader.has_deletions()
+        words = []
+        for btext in reader.expand_prefix("content", prefix):
+            word = btext.decode("utf-8")
+            if words and words[-1] == word:
+                continue
+            if deletions and not reader.postings("content", btext).is_active():
+                continue
+            words.append(word)
+            if len(words) >= limit:
+                break
+        return words
+
     def search(self, query_text, limit):
         t1 = time.time()
-        ix = open_dir(self.indexdir)
+        cached = self.get_cached_searcher()
+        searcher = cached.get_searcher()
+        key = (query_text, limit)
+        rows = cached.get_results(key)
+        if rows is None:
+            rows = self.do_search(searcher, query_text, limit)
+            cached.put_results(key, rows)
+        t2 = time.time()
+        return rows, t2-t1
 
+    def do_search(self, searcher, query_text, limit):
         query = self.parser.parse(query_text)
 
-        with ix.searcher() as searcher:
-            results = searcher.search(query, limit=limit)
-            results.formatter = whoosh.highlight.UppercaseFormatter()
+        results = searcher.search(query, limit=limit)
+        results.formatter = whoosh.highlight.UppercaseFormatter()
 
-            # Increase character limit
-            results.fragmenter.charlimit = 100000
-            
-            # Allow larger fragments
-            results.fragmenter.maxchars = 300
+        # Increase character limit
+        results.fragmenter.charlimit = 100000
+        
+        # Allow larger fragments
+        results.fragmenter.maxchars = 300
 
-            # Show more context before and after
-            results.fragmenter.surround = 50
-            
-            results.formatter = ColorFormatter()
-            
-            n = 0
-            rows = []
-            for res in results:
-                objtype = res["objtype"]
-                handle = res["handle"]
-                seq = res["seq"]
-                contenttype = res["contenttype"]
-                proxy = fulltext_objects.getproxy(objtype)
-                proxy.from_handle(self.db, handle)
-                text = proxy.content_for_display(self.db, contenttype, seq)
-                hltext = res.highlights("content", text=text)
-                hltext2 = hltext.replace(ColorFormatter.PREFIX1, "").replace(ColorFormatter.SUFFIX1, "")
-                if not text.startswith(hltext2): hltext = "..." + hltext
-
-                hltext = html.escape(hltext)
-                hltext = (hltext.replace(ColorFormatter.PREFIX1, ColorFormatter.PREFIX2)
-                          .replace(ColorFormatter.SUFFIX1, ColorFormatter.SUFFIX2)) 
-
-                rows.append([proxy.gramps_id, objtype+"."+contenttype, hltext, handle, objtype, proxy.obj])
-                n += 1
-            t2 = time.time()
-            return rows, t2-t1
+        # Show more context before and after
+        results.fragmenter.surround = 50
+        
+        results.formatter = ColorFormatter()
+        
+        n = 0
+        rows = []
+        for res in results:
+            objtype = res["objtype"]
+            handle = res["handle"]
+            contenttype = res["contenttype"]
+            # the text is stored in the index; the object itself is loaded
+            # from the database only when the row is opened
+            text = fulltext_objects.unpack_text(res["text"])
+            hltext = res.highlights("content", text=text)
+            hltext2 = hltext.replace(ColorFormatter.PREFIX1, "").replace(ColorFormatter.SUFFIX1, "")
+            if not text.startswith(hltext2): hltext = "..." + hltext
+
+            hltext = html.escape(hltext)
+            hltext = (hltext.replace(ColorFormatter.PREFIX1, ColorFormatter.PREFIX2)
+                      .replace(ColorFormatter.SUFFIX1, ColorFormatter.SUFFIX2)) 
+
+            rows.append([res["title"], objtype+"."+contenttype, hltext, handle, objtype])
+            n += 1
+        return rows
 
 
 # ------------------------------------------------------------------------
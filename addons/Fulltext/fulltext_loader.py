@@ -18,20 +18,15 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
+import atexit
 import logging
 import os
-import pickle
-import pprint
-import re
 import shutil
 import sys
+import threading
+import time
 import traceback
 
-try:
-    import orjson   # only in 6.0+
-except:
-    pass
-
 from whoosh.index import open_dir
 
 from gramps.gen.config import CONFIGMAN as config
@@ -56,6 +51,14 @@ import fulltext_objects
 
 LOG = logging.getLogger(".fulltext")
 
+UPDATE_DELAY = 1.0      # seconds to wait for more changes before writing a batch
+MAX_PENDING = 1000      # write a batch immediately if this many objects are waiting
+MERGE_INTERVAL = 300    # seconds between segment merges
+WRITER_TIMEOUT = 10.0   # seconds to wait for the index lock
+
+updaters = {}   # dbid -> IndexUpdater
+generations = {}    # dbid -> number of batches committed by the updater
+
 def load_on_reg(dbstate, uistate, plugin):
     if "fulltext_marker" in sys.modules: # to avoid doing the dbstate.connect below multiple times if plugins are reloaded
         #print("already loaded")
@@ -66,6 +69,7 @@ def load_on_reg(dbstate, uistate, plugin):
     import whoosh
 
     dbstate.connect("database-changed", db_changed)
+    atexit.register(close_updaters)
 
     if not hasattr(DbManager, "orig_really_delete_db"):
         DbManager.orig_really_delete_db = DbManager._DbManager__really_delete_db
@@ -80,6 +84,7 @@ def really_delete_db(self):
 
 
 def db_changed(db):
+    close_updaters()
     dbid = db.get_dbid()
     if dbid == "":
         return
@@ -93,181 +98,176 @@ def db_changed(db):
 
 def enable_trace(db):
     import dbtrace
-    db.fulltext_dbtrace_callback_key = dbtrace.enable_trace(db, lambda sqlstring: callback(db, sqlstring))
+    db.fulltext_dbtrace_callback_key = dbtrace.enable_changes(db, lambda event: callback(db, event))
 
 def disable_trace(db):
     import dbtrace
     if hasattr(db, "fulltext_dbtrace_callback_key"):
-        dbtrace.disable_trace(db, db.fulltext_dbtrace_callback_key)
+        dbtrace.disable_changes(db, db.fulltext_dbtrace_callback_key)
         del db.fulltext_dbtrace_callback_key
+    close_updater(db.get_dbid(), flush=False)
 
-def callback(db, sqlstring):
-    # print(sqlstring)
-    if sqlstring.startswith("SELECT "):
-        return
-    
-    if re.match(r"INSERT INTO \w+ \(handle, blob_data\) VALUES",  sqlstring):
-        # INSERT INTO note (handle, blob_data) VALUES ('fa58e755a2176eb0842bba649f3', x'800495...')
-        # print(sqlstring)
-        
-        objtype = sqlstring.split()[2]
-        if objtype not in fulltext_objects.OBJTYPES:
+
+class IndexUpdater:
+    """
+    Collects changes to the search index and writes them in batches in a
+    background thread.
+
+    Changes are keyed by handle so an object that is updated several times
+    within one batch is written only once. A batch is written when the
+    database transaction commits, when MAX_PENDING objects are waiting or
+    at the latest UPDATE_DELAY seconds after the changes were made. All
+    batches use the same FileIndex object and small segments are merged
+    only every MERGE_INTERVAL seconds.
+    """
+    def __init__(self, dbid, indexdir):
+        self.dbid = dbid
+        self.indexdir = indexdir
+        self.ix = None
+        self.pending = {}   # handle -> (objtype, gramps_id, contents) or None (= deleted)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = True
+        self.last_merge = time.time()
+        self.thread = threading.Thread(target=self.run, name="fulltext-updater", daemon=True)
+        self.thread.start()
+
+    def add(self, objtype, proxy):
+        contents = list(proxy.content())
+        with self.lock:
+            self.pending[proxy.handle] = (objtype, proxy.gramps_id, contents)
+            n = len(self.pending)
+        if n >= MAX_PENDING:
+            self.wakeup.set()
+
+    def delete(self, handle):
+        with self.lock:
+            self.pending[handle] = None
+
+    def commit(self):
+        self.wakeup.set()
+
+    def stop(self, flush=True):
+        if not flush:
+            with self.lock:
+                self.pending = {}
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
+
+    def run(self):
+        while self.running:
+            self.wakeup.wait(UPDATE_DELAY)
+            self.wakeup.clear()
+            self.write_pending()
+
+    def write_pending(self):
+        with self.lock:
+            batch = self.pending
+            self.pending = {}
+        if not batch:
             return
-        hexdata = sqlstring.split()[7][2:-2]
-        proxy = fulltext_objects.getproxy(objtype)
-        proxy.from_hexdata(hexdata)
-        ix = get_ix(db)
-        if ix is None: return
-        with ix.writer() as writer:
-            for seq, (contenttype, content) in enumerate(proxy.content()):
-                writer.add_document(
-                    objtype=objtype,
-                    title=proxy.gramps_id,
-                    handle=proxy.handle,
-                    seq=seq,
-                    contenttype=contenttype,
-                    content=content,
-                )
-
-    if re.match(r"UPDATE \w+ SET blob_data = ",  sqlstring):
-        # print(sqlstring)
-        # UPDATE note SET blob_data = x'800495cd...' WHERE handle = 'f9e7c3ae9d734e31b1879b0bc4c'
-        #
-        objtype = sqlstring.split()[1]
-        if objtype not in fulltext_objects.OBJTYPES:
+        ix = self.get_ix()
+        if ix is None:
             return
-        hexdata = sqlstring.split()[5][2:-1]
-        proxy = fulltext_objects.getproxy(objtype)
-        proxy.from_hexdata(hexdata)
-        # print(sqlstring)
-        ix = get_ix(db)
-        if ix is None: return
-        with ix.writer() as writer:
-            writer.delete_by_term('handle', proxy.handle)
-            for seq, (contenttype, content) in enumerate(proxy.content()):
-                writer.add_document(
-                    objtype=objtype,
-                    title=proxy.gramps_id,
-                    handle=proxy.handle,
-                    seq=seq,
-                    contenttype=contenttype,
-                    content=content,
-                )
-            # print("-", objtype, proxy.gramps_id, repr(proxy.handle), repr(proxy.content))
-
-    if re.match(r"INSERT INTO \w+ \(handle, json_data\) VALUES",  sqlstring):
-        # INSERT INTO person (handle, json_data) VALUES ('ff35452da6668a80f91bb708dfb',
-        # '{"handle":"ff35452da6668a80f91bb708dfb",
-        #    "change":1753733247,"private":false,"tag_list":[],"gramps_id":"I1959",
-        #    "citation_list":["c140d24888745dd09d7"],"note_list":[],"media_list":[],
-        #    "event_ref_list":[],"attribute_list":[],"address_list":[],"urls":[],
-        #    "lds_ord_list":[],"primary_name":{"private":false,
-        #    "surname_list":[{"surname":"Warner","prefix":"","primary":true,
-        #    "origintype":{"_class":"NameOriginType","value":1,"string":""},
-        #    "connector":"","_class":"Surname"}],"citation_list":[],
-        #    "note_list":[],"date":{"format":null,"calendar":0,"modifier":0,
-        #    "quality":0,"dateval":[0,0,0,false],"text":"","sortval":0,
-        #    "newyear":0,"_class":"Date"},"first_name":"Robert","suffix":"",
-        #    "title":"","type":{"_class":"NameType","value":2,"string":""},
-        #    "group_as":"","sort_as":0,"display_as":0,"call":"","nick":"",
-        #    "famnick":"","_class":"Name"},"family_list":["B2WKQCNO586QCPVZ9S"],
-        #    "parent_family_list":["OAAKQCZC8HVYD3C3JA"],"alternate_names":[],
-        #    "person_ref_list":[],"death_ref_index":-1,
-        #     "birth_ref_index":-1,"_class":"Person","gender":1}' 
-        print(sqlstring)
-        objtype = sqlstring.split()[2]
-        if objtype not in fulltext_objects.OBJTYPES:
+        merge = time.time() - self.last_merge > MERGE_INTERVAL
+        t1 = time.time()
+        try:
+            writer = ix.writer(timeout=WRITER_TIMEOUT)
+            try:
+                for handle, change in batch.items():
+                    writer.delete_by_term("handle", handle)
+                    if change is not None:
+                        objtype, gramps_id, contents = change
+                        add_documents(writer, objtype, gramps_id, handle, contents)
+            except:
+                writer.cancel()
+                raise
+            writer.commit(merge=merge)
+        except:
+            traceback.print_exc()
+            # try again with the next batch; newer changes take precedence
+            with self.lock:
+                for handle, change in batch.items():
+                    self.pending.setdefault(handle, change)
             return
+        generations[self.dbid] = generations.get(self.dbid, 0) + 1
+        if merge:
+            self.last_merge = time.time()
+        LOG.info("indexed %d objects in %.3f seconds", len(batch), time.time() - t1)
 
-        i = sqlstring.find("'")
-        i = sqlstring.find("'", i+1)
-        i = sqlstring.find("'", i+1)
-        j = sqlstring.rfind("'")
-        jsonstring = sqlstring[i+1:j]
-        LOG.info("INSERT INTO " + objtype + "\n" + pprint.pformat(orjson.loads(jsonstring)))
-        proxy = fulltext_objects.getproxy(objtype)
-        proxy.from_jsonstring(jsonstring)
-        ix = get_ix(db)
-        if ix is None: return
-        with ix.writer() as writer:
-            for seq, (contenttype, content) in enumerate(proxy.content()):
-                writer.add_document(
-                    objtype=objtype,
-                    title=proxy.gramps_id,
-                    handle=proxy.handle,
-                    seq=seq,
-                    contenttype=contenttype,
-                    content=content,
-                )
-
-
-    if re.match(r"UPDATE \w+ SET json_data = ",  sqlstring):
-        # UPDATE person SET json_data = '{"handle":"22WKQC0LKX6LZD83VP",
-        #    "change":1753733247,"private":false,"tag_list":[],"gramps_id":"I1959",
-        #    "citation_list":["c140d24888745dd09d7"],"note_list":[],"media_list":[],
-        #    "event_ref_list":[],"attribute_list":[],"address_list":[],"urls":[],
-        #    "lds_ord_list":[],"primary_name":{"private":false,
-        #    "surname_list":[{"surname":"Warner","prefix":"","primary":true,
-        #    "origintype":{"_class":"NameOriginType","value":1,"string":""},
-        #    "connector":"","_class":"Surname"}],"citation_list":[],
-        #    "note_list":[],"date":{"format":null,"calendar":0,"modifier":0,
-        #    "quality":0,"dateval":[0,0,0,false],"text":"","sortval":0,
-        #    "newyear":0,"_class":"Date"},"first_name":"Robert","suffix":"",
-        #    "title":"","type":{"_class":"NameType","value":2,"string":""},
-        #    "group_as":"","sort_as":0,"display_as":0,"call":"","nick":"",
-        #    "famnick":"","_class":"Name"},"family_list":["B2WKQCNO586QCPVZ9S"],
-        #    "parent_family_list":["OAAKQCZC8HVYD3C3JA"],"alternate_names":[],
-        #    "person_ref_list":[],"death_ref_index":-1,
-        #     "birth_ref_index":-1,"_class":"Person","gender":1}' 
-        # WHERE handle = '22WKQC0LKX6LZD83VP'
-        
-        objtype = sqlstring.split()[1]
-        if objtype not in fulltext_objects.OBJTYPES:
-            return
-        i = sqlstring.find("'")
-        j = sqlstring.rfind("'")
-        j = sqlstring.rfind("'", 0, j)
-        j = sqlstring.rfind("'", 0, j)
-        jsonstring = sqlstring[i+1:j]
-        LOG.info("UPDATE " + objtype + "\n" + pprint.pformat(orjson.loads(jsonstring)))
-        proxy = fulltext_objects.getproxy(objtype)
-        proxy.from_jsonstring(jsonstring)
-        ix = get_ix(db)
-        if ix is None: return
-        with ix.writer() as writer:
-            writer.delete_by_term('handle', proxy.handle)
-            for seq, (contenttype, content) in enumerate(proxy.content()):
-                writer.add_document(
-                    objtype=objtype,
-                    title=proxy.gramps_id,
-                    handle=proxy.handle,
-                    seq=seq,
-                    contenttype=contenttype,
-                    content=content,
-                )
-
-    if sqlstring.startswith("DELETE FROM "):
-        # DELETE FROM note WHERE handle = 'fa58e755a2176eb0842bba649f3'
-        # Works for both blob and json data
-        objtype = sqlstring.split()[2]
-        if objtype not in fulltext_objects.OBJTYPES:
-            return
-        handle = sqlstring.split()[-1][1:-1]
-        LOG.info(sqlstring)
-        ix = get_ix(db)
-        if ix is None: return
-        with ix.writer() as writer:
-            writer.delete_by_term("handle", handle)
+    def get_ix(self):
+        if self.ix is None:
+            try:
+                self.ix = open_dir(self.indexdir)
+            except:
+                traceback.print_exc()
+                if not os.path.exists(self.indexdir): # index has been deleted
+                    self.running = False
+                return None
+        return self.ix
 
 
-def get_ix(db):
+def get_updater(db):
     dbid = db.get_dbid()
-    indexdir = os.path.join(dbpath, dbid, "indexdir")
-    try:
-        ix = open_dir(indexdir)
-    except:
-        traceback.print_exc()
-        if not os.path.exists(indexdir): # index as been deleted
-            disable_trace(db)
+    updater = updaters.get(dbid)
+    if updater is not None and not updater.running:
+        # the index has been deleted
+        close_updater(dbid, flush=False)
+        disable_trace(db)
         return None
-    return ix
+    if updater is None:
+        indexdir = os.path.join(dbpath, dbid, "indexdir")
+        updater = IndexUpdater(dbid, indexdir)
+        updaters[dbid] = updater
+    return updater
+
+def close_updater(dbid, flush=True):
+    updater = updaters.pop(dbid, None)
+    if updater is not None:
+        updater.stop(flush)
+
+def get_generation(dbid):
+    """
+    Returns a number that changes every time the updater has committed
+    changes to the index of the tree.
+    """
+    return generations.get(dbid, 0)
+
+def close_updaters():
+    for dbid in list(updaters):
+        close_updater(dbid)
+
+def add_documents(writer, objtype, gramps_id, handle, contents):
+    for seq, (contenttype, content) in enumerate(contents):
+        writer.add_document(
+            objtype=objtype,
+            title=gramps_id,
+            handle=handle,
+            seq=seq,
+            contenttype=contenttype,
+            content=content,
+            text=fulltext_objects.pack_text(content),
+        )
+
+def callback(db, event):
+    if event.op == "COMMIT":
+        updater = updaters.get(db.get_dbid())
+        if updater is not None:
+            updater.commit()
+        return
+
+    objtype = event.table
+    if objtype not in fulltext_objects.OBJTYPES:
+        return
+    updater = get_updater(db)
+    if updater is None:
+        return
+    if event.op == "DELETE":
+        LOG.info("DELETE %s %s", objtype, event.handle)
+        updater.delete(event.handle)
+        return
+    proxy = fulltext_objects.getproxy(objtype)
+    proxy.from_change(event)
+    LOG.info("%s %s %s", event.op, objtype, event.handle)
+    updater.add(objtype, proxy)
@@ -22,11 +22,11 @@ import os
 import pickle
 import sys
 import traceback
+import zlib
 
 from gramps.gen.config import CONFIGMAN as config
 
 from gramps.gen.display.name import displayer as name_displayer
-from gramps.gen.display.place import displayer as place_displayer
 
 from gramps.gen.lib import Citation
 from gramps.gen.lib import Event
@@ -55,6 +55,22 @@ from gramps.gui.editors import EditSource
 
 dbpath = config.get("database.path")
 
+COMPRESS_LIMIT = 100    # texts longer than this are stored compressed in the index
+
+def pack_text(text):
+    """
+    Returns the value stored in the index for the text of a document.
+    Long texts (typically notes) are compressed.
+    """
+    if len(text) > COMPRESS_LIMIT:
+        return zlib.compress(text.encode("utf-8"))
+    return text
+
+def unpack_text(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode("utf-8")
+    return value
+
 class ProxyBase:
     @property
     def handle(self):
@@ -64,18 +80,16 @@ class ProxyBase:
     def gramps_id(self):
         return self.obj.gramps_id
 
-    def from_hexdata(self, hexdata):
-        pickled = bytes.fromhex(hexdata)
-        data = pickle.loads(pickled)
-        self.obj.unserialize(data)
+    def from_change(self, event):
+        # event is a dbtrace.ChangeEvent for an INSERT or UPDATE
+        if event.format == "json":
+            self.from_jsonstring(event.data)
+        else:
+            self.obj.unserialize(event.payload)
 
     def from_jsonstring(self, jsonstring):
         self.obj = json_utils.string_to_object(jsonstring)
 
-    def content_for_display(self, db, contenttype, seq):
-        (ctype, content) = list(self.content())[seq]
-        return content
-
     def process_attributes(self):
         for attr in self.obj.attribute_list:
             name = str(attr.type) + " = " + attr.value
@@ -196,14 +210,6 @@ class PlaceProxy(ProxyBase):
             yield ("altname", pn.get_value())
         yield from self.process_urls()         
 
-    def content_for_display(self, db, contenttype, seq):
-        if contenttype == "name":
-            names = [place_displayer.display(db, self.obj)] 
-            for pn in self.obj.get_alternative_names():
-                names.append(pn.get_value())
-            return " / ".join(names)
-        return super().content_for_display(db, contenttype, seq)
-
     def from_handle(self, db, handle):
         self.obj = db.get_place_from_handle(handle)
 
@@ -0,0 +1,304 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2025      Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+#######################################################################
+#
+# Ancestry index for the open family tree
+#
+# Usage:
+#
+#     import ancestryindex
+#
+#     index = ancestryindex.get_index(db)
+#     if index.is_ancestor(handle1, handle2):
+#         # the person handle1 is an ancestor of the person handle2
+#         ...
+#
+# The index is built with one pass over the families when it is first
+# requested and it is kept up to date with the family-add, family-update
+# and family-delete signals. A batch transaction (e.g. a GEDCOM import)
+# emits family-rebuild or person-rebuild instead; then the index is built
+# again when it is next requested. All parent families are followed, like
+# in the "Ancestors of <person>" filter.
+#
+#######################################################################
+
+import sys
+
+from array import array
+from collections import OrderedDict
+
+CACHE_SIZE = 10000  # number of memoized ancestor sets
+
+NO_VALUE = -1
+ON_PATH = -2
+
+
+def load_on_reg(dbstate, uistate, plugin):
+    if not hasattr(sys, "ancestryindex_indexes"):
+        # survives reloading the plugin
+        sys.ancestryindex_indexes = dict()
+        dbstate.connect("database-changed", db_changed)
+
+
+def db_changed(db):
+    sys.ancestryindex_indexes = dict()
+
+
+def get_index(db):
+    """
+    Returns the AncestryIndex of the database, building it if needed.
+    """
+    indexes = getattr(sys, "ancestryindex_indexes", None)
+    if indexes is None:
+        indexes = sys.ancestryindex_indexes = dict()
+    dbid = db.get_dbid()
+    index = indexes.get(dbid)
+    if index is not None and index.stale:
+        for key in index.signal_keys:
+            db.disconnect(key)
+        index = None
+    if index is None:
+        index = AncestryIndex()
+        index.build(
+            (family.handle, family.get_father_handle(), family.get_mother_handle(),
+             [ref.ref for ref in family.get_child_ref_list()])
+            for family in db.iter_families()
+        )
+        index.signal_keys = track_changes(db, index)
+        indexes[dbid] = index
+    return index
+
+
+def track_changes(db, index):
+    def family_updated(handles):
+        for handle in handles:
+            family = db.get_family_from_handle(handle)
+            if family:
+                index.set_family(
+                    handle,
+                    family.get_father_handle(),
+                    family.get_mother_handle(),
+                    [ref.ref for ref in family.get_child_ref_list()],
+                )
+
+    def family_deleted(handles):
+        for handle in handles:
+            index.set_family(handle, None, None, [])
+
+    def rebuilt(*args):
+        # not disconnected here: Callback.emit is iterating the callbacks
+        index.stale = True
+
+    return [
+        db.connect("family-add", family_updated),
+        db.connect("family-update", family_updated),
+        db.connect("family-delete", family_deleted),
+        db.connect("family-rebuild", rebuilt),
+        db.connect("person-rebuild", rebuilt),
+    ]
+
+
+class AncestryIndex:
+    """
+    Parent links of all people in a compact form.
+
+    is_ancestor() is answered in constant time in most cases:
+
+    - people in different connected components are not related
+    - an ancestor always has a smaller generation level (the length of the
+      longest chain of ancestors above the person) than the descendant
+    - otherwise the ancestor set of the descendant is computed once and
+      memoized (the CACHE_SIZE most recently used sets are kept)
+
+    The object contains no reference to the database so it can be given to
+    other processes.
+    """
+
+    def __init__(self):
+        self.numbers = {}           # person handle -> number
+        self.parents = []           # number -> tuple of parent numbers
+        self.families = {}          # family handle -> (parent numbers, child numbers)
+        self.child_families = {}    # number -> family handles where the person is a child
+        self.level = None           # number -> generation level, computed when needed
+        self.loops = False          # True if somebody is his own ancestor
+        self.component = None       # number -> connected component, computed when needed
+        self.cache = OrderedDict()  # number -> frozenset of ancestor numbers
+        self.stale = False          # True after a rebuild signal; see get_index
+        self.signal_keys = []       # database signal keys of track_changes
+
+    def number(self, handle):
+        n = self.numbers.get(handle)
+        if n is None:
+            n = len(self.parents)
+            self.numbers[handle] = n
+            self.parents.append(())
+        return n
+
+    def build(self, families):
+        """
+        'families' is an iterable of (family handle, father handle, mother
+        handle, list of child handles).
+        """
+        for family_handle, father, mother, children in families:
+            self.set_family(family_handle, father, mother, children)
+
+    def set_family(self, family_handle, father, mother, children):
+        old_parents, old_children = self.families.pop(family_handle, ((), ()))
+        parents = tuple(self.number(handle) for handle in (father, mother) if handle)
+        children = tuple(self.number(handle) for handle in children)
+        if (parents, children) == (old_parents, old_children):
+            self.families[family_handle] = (parents, children)
+            return
+        if parents or children:
+            self.families[family_handle] = (parents, children)
+        for child in old_children:
+            self.child_families[child].remove(family_handle)
+        for child in children:
+            self.child_families.setdefault(child, []).append(family_handle)
+        for child in set(old_children) | set(children):
+            self.update_parents(child)
+        self.invalidate()
+
+    def update_parents(self, child):
+        parents = []
+        for family_handle in self.child_families.get(child, []):
+            for parent in self.families[family_handle][0]:
+                if parent not in parents:
+                    parents.append(parent)
+        self.parents[child] = tuple(parents)
+
+    def invalidate(self):
+        self.level = None
+        self.component = None
+        self.cache.clear()
+
+    def compute_levels(self):
+        """
+        level[n] is the length of the longest chain of ancestors of person n.
+        If the data has a loop (somebody is his own ancestor) the levels
+        cannot be used and self.loops is set.
+        """
+        parents = self.parents
+        count = len(parents)
+        level = array("i", [NO_VALUE]) * count
+        self.loops = False
+        for start in range(count):
+            if level[start] != NO_VALUE:
+                continue
+            stack = [(start, False)]
+            while stack:
+                i, expanded = stack.pop()
+                if not expanded:
+                    if level[i] != NO_VALUE:
+                        continue
+                    level[i] = ON_PATH
+                    stack.append((i, True))
+                    for p in parents[i]:
+                        if level[p] == NO_VALUE:
+                            stack.append((p, False))
+                    continue
+                value = 0
+                for p in parents[i]:
+                    if level[p] == ON_PATH:
+                        self.loops = True
+                    else:
+                        value = max(value, level[p] + 1)
+                level[i] = value
+        self.level = level
+
+    def compute_components(self):
+        component = array("i", range(len(self.parents)))
+
+        def find(i):
+            while component[i] != i:
+                component[i] = component[component[i]]
+                i = component[i]
+            return i
+
+        for child, parents in enumerate(self.parents):
+            for parent in parents:
+                a = find(child)
+                b = find(parent)
+                if a != b:
+                    component[a] = b
+        for i in range(len(component)):
+            component[i] = find(i)
+        self.component = component
+
+    def prepare(self):
+        """
+        Computes the levels and components now instead of at the first
+        is_ancestor() call.
+        """
+        if self.level is None:
+            self.compute_levels()
+        if self.component is None:
+            self.compute_components()
+
+    def ancestors(self, n):
+        """
+        Returns the frozenset of the ancestor numbers of person n.
+        """
+        result = self.cache.get(n)
+        if result is not None:
+            self.cache.move_to_end(n)
+            return result
+        result = set()
+        stack = list(self.parents[n])
+        while stack:
+            p = stack.pop()
+            if p in result:
+                continue
+            result.add(p)
+            cached = self.cache.get(p)
+            if cached is not None:
+                result.update(cached)
+            else:
+                stack.extend(self.parents[p])
+        result = frozenset(result)
+        self.cache[n] = result
+        if len(self.cache) > CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return result
+
+    def is_ancestor(self, ancestor, person):
+        """
+        True if the person 'ancestor' is 'person' or one of the ancestors of
+        'person'. The arguments are person handles.
+        """
+        if ancestor == person:
+            return True
+        a = self.numbers.get(ancestor)
+        p = self.numbers.get(person)
+        if a is None or p is None:
+            return False
+        self.prepare()
+        if self.component[a] != self.component[p]:
+            return False
+        if not self.loops and self.level[a] >= self.level[p]:
+            return False
+        return a in self.ancestors(p)
+
+    def is_related_by_descent(self, handle1, handle2):
+        """
+        True if either person is an ancestor of the other.
+        """
+        return self.is_ancestor(handle1, handle2) or self.is_ancestor(handle2, handle1)
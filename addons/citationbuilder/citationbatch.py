@@ -0,0 +1,318 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2024-2025      Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Citation Builder for existing citations.
+
+Does for all citations that have no source what citationbuilder does when
+a new citation is saved: the Volume/Page field is matched against the
+citation formats of matcher_module and a matching citation gets its page,
+source, repository and a note. Existing sources and repositories are found
+through the index of citationindex; new ones are created once.
+
+read      read all citations once
+classify  classify the Volume/Page fields of the citations without a source
+          with matcher_module.match_lines
+build     update the matching citations, 'chunk_size' citations in each
+          transaction (each transaction is one undo step)
+
+With 'dry run' the citations are only read and classified, and the report
+lists the citations that would be changed and the sources and repositories
+that would be created.
+
+Usage:
+
+    gramps -O "My tree" -a tool -p name=citationbatch,dry_run=1
+"""
+
+import time
+
+from collections import Counter
+
+from gi.repository import Gtk
+
+from gramps.gen.const import GRAMPS_LOCALE as glocale
+from gramps.gen.db import DbTxn
+from gramps.gui.managedwindow import ManagedWindow
+from gramps.gui.plug import tool
+from gramps.gui.utils import ProgressMeter
+
+try:
+    _trans = glocale.get_addon_translator(__file__)
+except ValueError:
+    _trans = glocale.translation
+_ = _trans.sgettext
+
+import matcher_module as matcher
+from citationbuilder import build_citation, find_existing_citation, find_repo, find_source
+from citationindex import get_index
+
+
+class CitationBatch:
+    """
+    Usage:
+
+        batch = CitationBatch(db, chunk_size=1000)
+        batch.scan()
+        batch.build()
+        print(batch.report())
+
+    'progress' is an optional ProgressMeter. If it is cancelled while
+    reading nothing is changed; while building, the citations built
+    before the cancel are committed.
+    """
+
+    def __init__(self, db, chunk_size=1000, online=False, progress=None):
+        self.db = db
+        self.chunk_size = max(1, chunk_size)
+        self.online = online
+        self.progress = progress
+        self.items = []  # (citation handle, gramps id, page, Match)
+        self.counts = Counter()  # matcher name -> number of citations
+        self.new_sources = Counter()  # title -> number of citations
+        self.new_repos = Counter()  # name -> number of citations
+        self.timings = []  # (phase, number of citations, seconds)
+        self.scanned = 0  # citations read
+        self.without_source = 0  # citations without a source
+        self.built = 0  # citations updated
+        self.duplicates = 0  # updated citations that have an identical citation
+        self.transactions = 0
+        self.cancelled = False
+
+    def scan(self):
+        start = time.time()
+        if self.progress:
+            self.progress.set_pass(
+                _("Reading citations"), self.db.get_number_of_citations()
+            )
+        citations = []
+        for citation in self.db.iter_citations():
+            self.scanned += 1
+            if self.progress and self.progress.step():
+                self.cancelled = True
+                return
+            if citation.get_reference_handle() or not citation.page:
+                continue
+            citations.append(citation)
+        self.without_source = len(citations)
+        self.timings.append(("read", self.scanned, time.time() - start))
+
+        start = time.time()
+        if self.progress:
+            self.progress.set_pass(_("Classifying citations"), mode=ProgressMeter.MODE_ACTIVITY)
+        results = matcher.match_lines([citation.page for citation in citations], self.online)
+        index = get_index(self.db)
+        for citation, m in zip(citations, results):
+            if m is None:
+                continue
+            self.items.append((citation.handle, citation.gramps_id, citation.page, m))
+            self.counts[m.matcher] += 1
+            if index.find_source_handle(m.sourcetitle) is None:
+                self.new_sources[m.sourcetitle] += 1
+            if m.reponame and index.find_repository_handle(m.reponame) is None:
+                self.new_repos[m.reponame] += 1
+        self.timings.append(("classify", len(citations), time.time() - start))
+
+    def build(self):
+        start = time.time()
+        index = get_index(self.db)
+        if self.progress:
+            self.progress.set_pass(_("Building citations"), len(self.items))
+        for i in range(0, len(self.items), self.chunk_size):
+            with DbTxn(_("Build citations"), self.db) as trans:
+                self.transactions += 1
+                for handle, _gramps_id, page, m in self.items[i : i + self.chunk_size]:
+                    if self.progress and self.progress.step():
+                        self.cancelled = True
+                        break
+                    citation = self.db.get_citation_from_handle(handle)
+                    # skip a citation that was changed after the scan
+                    if citation is None or citation.get_reference_handle() or citation.page != page:
+                        continue
+                    source = find_source(m.sourcetitle, self.db, trans)
+                    if find_existing_citation(self.db, m.citationpage, m.details, source.handle):
+                        self.duplicates += 1
+                    repo = find_repo(m.reponame, self.db, trans)
+                    build_citation(m, citation, source, repo, self.db, trans)
+                    self.db.commit_citation(citation, trans)
+                    index.add_citation(citation)
+                    self.built += 1
+            if self.cancelled:
+                break
+        self.timings.append(("build", self.built, time.time() - start))
+
+    def report(self, dry_run=False):
+        lines = []
+        lines.append(_("Citations: {}").format(self.scanned))
+        lines.append(_("Citations without a source: {}").format(self.without_source))
+        lines.append(_("Recognized: {}").format(len(self.items)))
+        for name, count in self.counts.most_common():
+            lines.append("    {:30} {:8}".format(name, count))
+        if dry_run:
+            lines.append(_("New sources: {}").format(len(self.new_sources)))
+            for title, count in sorted(self.new_sources.items()):
+                lines.append("    {:8} {}".format(count, title))
+            lines.append(_("New repositories: {}").format(len(self.new_repos)))
+            for name, count in sorted(self.new_repos.items()):
+                lines.append("    {:8} {}".format(count, name))
+            lines.append(_("Citations to update:"))
+            for _handle, gramps_id, page, m in self.items:
+                lines.append(
+                    "{:10} {:18} {} -> {} | {}".format(
+                        gramps_id, m.matcher, page.replace("\n", " "), m.sourcetitle, m.citationpage
+                    )
+                )
+        else:
+            lines.append(
+                _("Updated: {} in {} transactions").format(self.built, self.transactions)
+            )
+            lines.append(
+                _("Updated citations with an identical citation: {}").format(self.duplicates)
+            )
+            if self.cancelled:
+                lines.append(_("Cancelled"))
+        for phase, count, seconds in self.timings:
+            rate = count / seconds if seconds > 0 else 0
+            lines.append(
+                "{:10} {:8} {:8.2f}s {:10.0f}/s".format(phase, count, seconds, rate)
+            )
+        return "\n".join(lines)
+
+
+class Tool(tool.Tool, ManagedWindow):
+    def __init__(self, dbstate, user, options_class, name, callback=None):
+        tool.Tool.__init__(self, dbstate, options_class, name)
+        self.dbstate = dbstate
+        self.db = dbstate.db
+        self.uistate = user.uistate
+        options = self.options.handler.options_dict
+        self.dry_run = options["dry_run"]
+        self.chunk_size = options["chunk_size"]
+        self.online = options["online"]
+
+        if not user.uistate:
+            self.run_cli()
+            return
+
+        ManagedWindow.__init__(self, user.uistate, [], self.__class__)
+        self.dbstate.connect("database-changed", self.db_changed)
+
+        window = Gtk.Window()
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        box.set_border_width(6)
+
+        self.dry_run_obj = Gtk.CheckButton(label=_("Dry run: only report the changes"))
+        self.dry_run_obj.set_active(self.dry_run)
+        box.pack_start(self.dry_run_obj, False, False, 0)
+
+        self.online_obj = Gtk.CheckButton(
+            label=_("Use also the formats that read a web page (HisKi, Katiha)")
+        )
+        self.online_obj.set_active(self.online)
+        box.pack_start(self.online_obj, False, False, 0)
+
+        hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        hbox.pack_start(Gtk.Label(label=_("Citations per transaction:")), False, False, 0)
+        self.chunk_size_obj = Gtk.SpinButton.new_with_range(1, 100000, 100)
+        self.chunk_size_obj.set_value(self.chunk_size)
+        hbox.pack_start(self.chunk_size_obj, False, False, 0)
+        box.pack_start(hbox, False, False, 0)
+
+        self.textview = Gtk.TextView(editable=False, monospace=True)
+        scrolledwindow = Gtk.ScrolledWindow()
+        scrolledwindow.add(self.textview)
+        box.pack_start(scrolledwindow, True, True, 0)
+
+        buttons = Gtk.ButtonBox(layout_style=Gtk.ButtonBoxStyle.END, spacing=6)
+        run_button = Gtk.Button(label=_("Run"))
+        run_button.connect("clicked", self.on_run_clicked)
+        close_button = Gtk.Button(label=_("Close"))
+        close_button.connect("clicked", self.close)
+        buttons.add(run_button)
+        buttons.add(close_button)
+        box.pack_start(buttons, False, False, 0)
+
+        window.add(box)
+        self.set_window(window, None, _("Citation Builder for existing citations"))
+        self.setup_configs("interface.citationbatch", 700, 500)
+        self.show()
+
+    def run_cli(self):
+        batch = CitationBatch(self.db, self.chunk_size, self.online)
+        batch.scan()
+        if not self.dry_run:
+            batch.build()
+        print(batch.report(self.dry_run))
+
+    def on_run_clicked(self, obj):
+        self.dry_run = int(self.dry_run_obj.get_active())
+        self.online = int(self.online_obj.get_active())
+        self.chunk_size = int(self.chunk_size_obj.get_value())
+        self.options.handler.options_dict["dry_run"] = self.dry_run
+        self.options.handler.options_dict["online"] = self.online
+        self.options.handler.options_dict["chunk_size"] = self.chunk_size
+        self.options.handler.save_options()
+
+        progress = ProgressMeter(
+            _("Citation Builder"), can_cancel=True, parent=self.window
+        )
+        batch = CitationBatch(self.db, self.chunk_size, self.online, progress)
+        try:
+            batch.scan()
+            if not self.dry_run and not batch.cancelled:
+                batch.build()
+        finally:
+            progress.close()
+        self.textview.get_buffer().set_text(batch.report(self.dry_run))
+
+    def db_changed(self, db):
+        self.close()
+
+    def build_menu_names(self, obj):
+        return (_("Citation Builder for existing citations"), None)
+
+
+class Options(tool.ToolOptions):
+    """
+    Defines options and provides handling interface.
+    """
+
+    def __init__(self, name, person_id=None):
+        tool.ToolOptions.__init__(self, name, person_id)
+
+        self.options_dict = {
+            "dry_run": 1,
+            "chunk_size": 1000,
+            "online": 0,
+        }
+        self.options_help = {
+            "dry_run": (
+                "=0/1",
+                "Only report the changes",
+                ["Update the citations", "Dry run"],
+                True,
+            ),
+            "chunk_size": ("=num", "Citations per transaction", "Integer number"),
+            "online": (
+                "=0/1",
+                "Use also the formats that read a web page (HisKi, Katiha)",
+                ["Do not use", "Use"],
+                True,
+            ),
+        }
@@ -36,3 +36,19 @@ register(
     fname="citationbuilder.py",
     load_on_reg=True,
 )
+
+register(
+    TOOL,
+    id="citationbatch",
+    name=_("Citation Builder for existing citations"),
+    description=_("Builds the source, repository and note of the citations whose Volume/Page field has a recognized citation string"),
+    version="0.9.0",
+    gramps_target_version=major_version,
+    status=STABLE,
+    fname="citationbatch.py",
+    authors=["Kari Kujansuu"],
+    category=TOOL_DBPROC,
+    toolclass="Tool",
+    optionclass="Options",
+    tool_modes=[TOOL_MODE_GUI, TOOL_MODE_CLI],
+)
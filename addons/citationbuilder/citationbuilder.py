@@ -54,6 +54,7 @@ except ValueError:
 _ = _trans.sgettext
 
 import matcher_module as matcher
+from citationindex import drop_index, find_url, get_index
 
 
 def load_on_reg(dbstate, uistate, plugin):
@@ -62,6 +63,7 @@ def load_on_reg(dbstate, uistate, plugin):
         setattr(EditCitation, orig_funcname, EditCitation.save)
     orig_save = getattr(EditCitation, orig_funcname)
     EditCitation.save = lambda self, *args: new_save(self, orig_save, *args)
+    dbstate.connect("database-changed", drop_index)
 
 
 def new_save(self, orig_save, _w):
@@ -98,87 +100,81 @@ def add_source_to_citation(m, citation, db):
             return existing_citation
 
         repo = find_repo(m.reponame, db, trans)
+        build_citation(m, citation, source, repo, db, trans)
 
-        citation.set_page(m.citationpage)
-        citation.set_reference_handle(source.handle)
 
-        date = time.strftime("%d.%m.%Y", time.localtime(time.time()))
-        date = time.localtime(time.time())
-        dt = Date(date.tm_year, date.tm_mon, date.tm_mday)
-#        strdate = str(Date(date.tm_year, date.tm_mon, date-tm_day))
-        from gramps.gen.datehandler import format_time, displayer
-        strdate = displayer.display(dt)
-        newnote = Note()
-        newnote.set(f"{m.details} / {_('Retrieved')} {strdate}")
-        print(newnote.get())
-        newnote.set_type(NoteType.CITATION)
-        db.add_note(newnote, trans)
-
-        citation.add_note(newnote.handle)
+def build_citation(m, citation, source, repo, db, trans):
+    """
+    Sets the page and the source of the citation, adds a note with the
+    details and the current date and adds the repository to the source.
+    The citation itself is not committed.
+    """
+    citation.set_page(m.citationpage)
+    citation.set_reference_handle(source.handle)
 
-        if repo and not source.has_repo_reference(repo.handle):
-            reporef = RepoRef()
-            reporef.set_reference_handle(repo.handle)
-            source.add_repo_reference(reporef)
-            db.commit_source(source, trans)
+    date = time.localtime(time.time())
+    dt = Date(date.tm_year, date.tm_mon, date.tm_mday)
+    from gramps.gen.datehandler import displayer
+    strdate = displayer.display(dt)
+    newnote = Note()
+    newnote.set(f"{m.details} / {_('Retrieved')} {strdate}")
+    newnote.set_type(NoteType.CITATION)
+    db.add_note(newnote, trans)
+    get_index(db).add_note(newnote)
 
+    citation.add_note(newnote.handle)
 
-def find_existing_citation(db, citationpage, notetext, sourcehandle):
-    """Find a matching citation"""
-    for citation in db.iter_citations():
-        if (
-            citation.handle
-            and citation.page == citationpage
-            and citation.source_handle == sourcehandle
-        ):
-            for notehandle in citation.get_note_list():
-                note = db.get_note_from_handle(notehandle)
-                if note.get() == notetext or links_match(note.get(), notetext):
-                    return citation
-    return None
+    if repo and not source.has_repo_reference(repo.handle):
+        reporef = RepoRef()
+        reporef.set_reference_handle(repo.handle)
+        source.add_repo_reference(reporef)
+        db.commit_source(source, trans)
 
 
-def links_match(text1, text2):
-    print("links match")
-    print("-", text1)
-    print("-", text2)
-    url1 = find_url(text1)
-    if url1 is None:
-        return False
-    url2 = find_url(text2)
-    if url2 is None:
-        return False
-    return url1 == url2
-
-
-def find_url(text):
-    i = text.find("https://")
-    if i >= 0:
-        return text[i:].split()[0]
-    i = text.find("http://")
-    if i >= 0:
-        return text[i:].split()[0]
+def find_existing_citation(db, citationpage, notetext, sourcehandle):
+    """
+    Find a matching citation: same source and page and a note with the same
+    text or the same link. Only the citations with the same source and page
+    are read, and a note is read only if the link does not match.
+    """
+    index = get_index(db)
+    url = find_url(notetext)
+    linked_notes = index.find_note_handles(url) if url else set()
+    for citation_handle in index.find_citation_handles(sourcehandle, citationpage):
+        citation = db.get_citation_from_handle(citation_handle)
+        if citation is None:
+            continue
+        for notehandle in citation.get_note_list():
+            if notehandle in linked_notes:
+                return citation
+            note = db.get_note_from_handle(notehandle)
+            if note.get() == notetext:
+                return citation
     return None
 
 
 def find_source(sourcetitle, db, trans):
-    for source in db.iter_sources():
-        if source.title == sourcetitle:
-            return source
+    index = get_index(db)
+    handle = index.find_source_handle(sourcetitle)
+    if handle:
+        return db.get_source_from_handle(handle)
     source = Source()
     source.set_title(sourcetitle)
     db.add_source(source, trans)
+    index.add_source(source)
     return source
 
 
 def find_repo(reponame, db, trans):
     if reponame == "":
         return None
-    for repo in db.iter_repositories():
-        if repo.name == reponame:
-            return repo
+    index = get_index(db)
+    handle = index.find_repository_handle(reponame)
+    if handle:
+        return db.get_repository_from_handle(handle)
     repo = Repository()
     repo.set_type(RepositoryType.ARCHIVE)
     repo.set_name(reponame)
     db.add_repository(repo, trans)
+    index.add_repository(repo)
     return repo
@@ -0,0 +1,219 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2024-2025      Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+In-memory index of the sources, repositories and citations of a tree for
+citationbuilder, so that saving a citation does not scan the whole database.
+
+sources     source title -> source handles
+repos       repository name -> repository handles
+citations   (source handle, page) -> citation handles
+urls        URL in a note (see find_url) -> note handles
+
+The index is built on first use with one pass over the sources,
+repositories, citations and notes and is then kept current through the
+database signals (add, update, delete). A batch transaction (e.g. an
+import) does not emit those signals but a rebuild signal; that makes the
+index invalid and it is built again the next time it is needed.
+
+Objects added by citationbuilder itself are also added to the index
+immediately (add_source, add_repository, add_citation) because the
+signals are emitted only when the transaction is committed.
+"""
+
+SIGNALS = ["source", "repository", "citation", "note"]
+
+
+def find_url(text):
+    i = text.find("https://")
+    if i >= 0:
+        return text[i:].split()[0]
+    i = text.find("http://")
+    if i >= 0:
+        return text[i:].split()[0]
+    return None
+
+
+class CitationIndex:
+    def __init__(self, db):
+        self.db = db
+        self.valid = True
+        self.sources = {}  # title -> [handle]
+        self.source_keys = {}  # handle -> title
+        self.repos = {}  # name -> [handle]
+        self.repo_keys = {}  # handle -> name
+        self.citations = {}  # (source handle, page) -> [handle]
+        self.citation_keys = {}  # handle -> (source handle, page)
+        self.urls = {}  # url -> [note handle]
+        self.url_keys = {}  # note handle -> url
+        self.signal_keys = []
+        self.build()
+        self.connect()
+
+    def build(self):
+        for source in self.db.iter_sources():
+            self.add(self.sources, self.source_keys, source.handle, source.title)
+        for repo in self.db.iter_repositories():
+            self.add(self.repos, self.repo_keys, repo.handle, repo.name)
+        for citation in self.db.iter_citations():
+            key = (citation.source_handle, citation.page)
+            self.add(self.citations, self.citation_keys, citation.handle, key)
+        for note in self.db.iter_notes():
+            self.add_note(note)
+
+    def connect(self):
+        for objtype in SIGNALS:
+            self.signal_keys.append(
+                self.db.connect(objtype + "-add", getattr(self, objtype + "_updated"))
+            )
+            self.signal_keys.append(
+                self.db.connect(objtype + "-update", getattr(self, objtype + "_updated"))
+            )
+            self.signal_keys.append(
+                self.db.connect(objtype + "-delete", getattr(self, objtype + "_deleted"))
+            )
+            self.signal_keys.append(
+                self.db.connect(objtype + "-rebuild", self.invalidate)
+            )
+
+    def disconnect(self):
+        for key in self.signal_keys:
+            self.db.disconnect(key)
+        self.signal_keys = []
+
+    def invalidate(self, *args):
+        # not disconnected here: Callback.emit is iterating the callbacks
+        self.valid = False
+
+    # generic maps: key -> [handle] and handle -> key
+
+    def add(self, index, keys, handle, key):
+        if keys.get(handle) == key:
+            return
+        self.remove(index, keys, handle)
+        index.setdefault(key, []).append(handle)
+        keys[handle] = key
+
+    def remove(self, index, keys, handle):
+        if handle not in keys:
+            return
+        key = keys.pop(handle)
+        handles = index[key]
+        handles.remove(handle)
+        if not handles:
+            del index[key]
+
+    # lookups
+
+    def find_source_handle(self, title):
+        handles = self.sources.get(title)
+        return handles[0] if handles else None
+
+    def find_repository_handle(self, name):
+        handles = self.repos.get(name)
+        return handles[0] if handles else None
+
+    def find_citation_handles(self, source_handle, page):
+        return list(self.citations.get((source_handle, page), []))
+
+    def find_note_handles(self, url):
+        return set(self.urls.get(url, []))
+
+    # additions made by citationbuilder
+
+    def add_source(self, source):
+        self.add(self.sources, self.source_keys, source.handle, source.title)
+
+    def add_repository(self, repo):
+        self.add(self.repos, self.repo_keys, repo.handle, repo.name)
+
+    def add_citation(self, citation):
+        key = (citation.source_handle, citation.page)
+        self.add(self.citations, self.citation_keys, citation.handle, key)
+
+    def add_note(self, note):
+        url = find_url(note.get())
+        if url is None:
+            self.remove(self.urls, self.url_keys, note.handle)
+        else:
+            self.add(self.urls, self.url_keys, note.handle, url)
+
+    # database signals
+
+    def source_updated(self, handles):
+        for handle in handles:
+            source = self.db.get_source_from_handle(handle)
+            if source:
+                self.add_source(source)
+
+    def source_deleted(self, handles):
+        for handle in handles:
+            self.remove(self.sources, self.source_keys, handle)
+
+    def repository_updated(self, handles):
+        for handle in handles:
+            repo = self.db.get_repository_from_handle(handle)
+            if repo:
+                self.add_repository(repo)
+
+    def repository_deleted(self, handles):
+        for handle in handles:
+            self.remove(self.repos, self.repo_keys, handle)
+
+    def citation_updated(self, handles):
+        for handle in handles:
+            citation = self.db.get_citation_from_handle(handle)
+            if citation:
+                self.add_citation(citation)
+
+    def citation_deleted(self, handles):
+        for handle in handles:
+            self.remove(self.citations, self.citation_keys, handle)
+
+    def note_updated(self, handles):
+        for handle in handles:
+            note = self.db.get_note_from_handle(handle)
+            if note:
+                self.add_note(note)
+
+    def note_deleted(self, handles):
+        for handle in handles:
+            self.remove(self.urls, self.url_keys, handle)
+
+
+_index = None
+
+
+def get_index(db):
+    """
+    Returns the index of the tree in 'db'; it is built when first needed
+    and again after the tree was changed or rebuilt.
+    """
+    global _index
+    if _index is None or _index.db is not db or not _index.valid:
+        drop_index()
+        _index = CitationIndex(db)
+    return _index
+
+
+def drop_index(*args):
+    global _index
+    if _index is not None:
+        _index.disconnect()
+        _index = None
@@ -17,8 +17,24 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+"""
+Citation string matchers for citationbuilder.
+
+Each match_* function recognizes one citation format and returns a Match or
+None. The functions are registered with @register in the order they are
+tried, together with a cheap pre-filter: a function is called only if the
+line starts with one of its 'prefixes' and contains one of its 'keywords'
+(when given), so for most lines only one function runs. The regular
+expressions are compiled once when the module is loaded.
+
+    m = matches(line)                 # one citation string
+    results = match_lines(lines)      # many at once, a Match or None for each
+
+Matchers marked 'online' fetch a web page (HisKi, Katiha); pass
+online=False to skip them, e.g. when classifying a whole database.
+"""
+
 import re
-import shlex
 import time
 import urllib.parse
 import urllib.request
@@ -30,15 +46,74 @@ from pprint import pprint
 import ssl
 ssl._create_default_https_context = ssl._create_unverified_context # for HisKi
 
-def matches(line):
-    for funcname, func in globals().items():
-        if funcname.startswith("match_"):
-            m = func(line)
-            if m:
-                return m
+MATCHERS = []  # registered matchers in the order they are tried
+
+
+class Matcher:
+    def __init__(self, func, prefixes=(), keywords=(), online=False):
+        self.func = func
+        self.name = func.__name__[len("match_") :]
+        self.prefixes = tuple(prefixes)
+        self.keywords = tuple(keywords)
+        self.online = online
+
+    def is_plausible(self, line):
+        if self.prefixes and not line.startswith(self.prefixes):
+            return False
+        if self.keywords and not any(keyword in line for keyword in self.keywords):
+            return False
+        return True
+
+
+def register(prefixes=(), keywords=(), online=False):
+    """
+    Decorator that registers a match_* function. 'prefixes' and 'keywords'
+    must be necessary conditions for a match: the function is not called
+    for a line that does not start with any of the prefixes or does not
+    contain any of the keywords.
+    """
+
+    def decorator(func):
+        MATCHERS.append(Matcher(func, prefixes, keywords, online))
+        return func
+
+    return decorator
+
+
+def candidates(line, online=True):
+    """The matchers that may match 'line', in the order they are tried."""
+    return [
+        matcher
+        for matcher in MATCHERS
+        if (online or not matcher.online) and matcher.is_plausible(line)
+    ]
+
+
+def matches(line, online=True):
+    for matcher in candidates(line, online):
+        m = matcher.func(line)
+        if m:
+            m.matcher = matcher.name
+            return m
     return None
 
 
+def match_lines(lines, online=False):
+    """
+    Classifies many citation strings at once. Returns a list that has a
+    Match or None for each line. A line that occurs many times is matched
+    only once and gets the same Match object. The online matchers are
+    skipped unless 'online' is True.
+    """
+    found = {}
+    results = []
+    for line in lines:
+        if line not in found:
+            found[line] = matches(line, online)
+        results.append(found[line])
+    return results
+
+
 def maketitle(reponame, sourcetitle):
     if reponame.endswith("seurakunnan arkisto"):
         return (
@@ -60,6 +135,7 @@ class Match:
         self.details = details
         self.url = url
         self.date = date
+        self.matcher = None  # name of the matcher, set by matches()
 
 
 def parse_html(htmlstring):
@@ -127,12 +203,15 @@ def parse_html2(htmlstring):
     parser.feed(htmlstring)
     return parser.items2
 
+REGEX_NARC1 = re.compile(
+    "(.+?) - (.+?), jakso (.+); Kansallisarkisto: (.+) / Viitattu (.+)"
+)  # now I have two problems
+
+
+@register(keywords=["; Kansallisarkisto: "])
 def match_narc1(line):
     # Liperin seurakunnan arkisto - Syntyneiden ja kastettujen luettelot 1772-1811 (I C:3), jakso 3: kastetut 1772 tammikuu; Kansallisarkisto: http://digi.narc.fi/digi/view.ka?kuid=6593368 / Viitattu 22.10.2018
-    regex_narc = re.compile(
-        "(.+?) - (.+?), jakso (.+); Kansallisarkisto: (.+) / Viitattu (.+)"
-    )  # now I have two problems
-    m = regex_narc.match(line)
+    m = REGEX_NARC1.match(line)
     if not m:
         return None
     reponame = m.group(1)
@@ -143,11 +222,14 @@ def match_narc1(line):
     return Match(line, reponame, sourcetitle, citationpage, details, url)
 
 
+REGEX_NARC2 = re.compile(r"(.+?) - (.+?); Kansallisarkisto: (.+) / Viitattu (.+)")
+
+
+@register(keywords=["; Kansallisarkisto: "])
 def match_narc2(line):
     # Lähdeviite aineistoon, ei kuvaan.
     # Kaatuneiden henkilöasiakirjat (kokoelma) - Perhonen Onni Aleksi, 16.10.1907; Kansallisarkisto: https://astia.narc.fi/uusiastia/kortti_aineisto.html?id=2684857838 / Viitattu 26.5.2022"
-    regex_narc = re.compile(r"(.+?) - (.+?); Kansallisarkisto: (.+) / Viitattu (.+)")
-    m = regex_narc.match(line)
+    m = REGEX_NARC2.match(line)
     if not m:
         return None
     reponame = m.group(1)
@@ -158,10 +240,13 @@ def match_narc2(line):
     return Match(line, reponame, sourcetitle, citationpage, details, url)
 
 
+REGEX_SSHY = re.compile(r"(.+) - (.+) > (.+?): (.*); SSHY: (.+) / Viitattu (.+)")
+
+
+@register(keywords=["; SSHY: "])
 def match_sshy(line):
     # Tampereen tuomiokirkkoseurakunta - rippikirja, 1878-1887 (MKO166-181 I Aa:17) > 39: Clayhills tjenstespersoner; SSHY: http://www.sukuhistoria.fi/sshy/sivut/jasenille/paikat.php?bid=18233&pnum=39 / Viitattu 6.11.2018
-    regex_sshy = re.compile(r"(.+) - (.+) > (.+?): (.*); SSHY: (.+) / Viitattu (.+)")
-    m = regex_sshy.match(line)
+    m = REGEX_SSHY.match(line)
     if not m:
         return None
     reponame = m.group(1)
@@ -172,13 +257,16 @@ def match_sshy(line):
     return Match(line, reponame, sourcetitle, citationpage, details, url)
 
 
+REGEX_SSHY2 = re.compile(
+    r"(.+) ([\w-]+ \d{4}-\d{4} \(.+?\)) (.+); SSHY (http.+) / Viitattu (.+)"
+)
+
+
+@register(keywords=["; SSHY http"])
 def match_sshy2(line):
     # Tampereen tuomiokirkkoseurakunta rippikirja 1795-1800 (TK630 I Aa:2)  N:o 1 Häggman, Kask, Grefvelin ; SSHY http://www.sukuhistoria.fi/sshy/sivut/jasenille/paikat.php?bid=15950&pnum=8 / Viitattu 03.02.2022
     # Alastaro rippikirja 1751-1757 (JK478 I Aa1:3)  Sivu 10 Laurois Nepponen ; SSHY http://www.sukuhistoria.fi/sshy/sivut/jasenille/paikat.php?bid=15846&pnum=13 / Viitattu 03.02.2022
-    regex_sshy = re.compile(
-        r"(.+) ([\w-]+ \d{4}-\d{4} \(.+?\)) (.+); SSHY (http.+) / Viitattu (.+)"
-    )
-    m = regex_sshy.match(line)
+    m = REGEX_SSHY2.match(line)
     if not m:
         return None
     reponame = m.group(1)
@@ -189,6 +277,7 @@ def match_sshy2(line):
     return Match(line, reponame, sourcetitle, citationpage, details, url)
 
 
+@register(keywords=["bildid:"])
 def match_svar(line):
     # Hajoms kyrkoarkiv, Husförhörslängder, SE/GLA/13195/A I/12 (1861-1872), bildid: C0045710_00045
     if line.find("bildid:") < 0:
@@ -205,6 +294,15 @@ def match_svar(line):
     details = f"SVAR: {url}"
     return Match(line, reponame, sourcetitle, citationpage, details, url)
 
+KANSALLISKIRJASTO_REPOS = [
+    "Kansalliskirjaston Digitoidut aineistot",
+    "Kansalliskirjaston digitaaliset aineistot",
+    "Nationalbibliotekets digitala samlingar",
+    "National Library's Digital Collections",
+]
+
+
+@register(keywords=KANSALLISKIRJASTO_REPOS)
 def match_kansalliskirjasto2(line):
     # Kansalliskirjasto viite yhtenä pötkönä, esim.
     #
@@ -216,12 +314,7 @@ def match_kansalliskirjasto2(line):
     # https://digi.kansalliskirjasto.fi/sanomalehti/binding/1340877?page=4
     # Kansalliskirjaston Digitoidut aineistot
 
-    for reponame in [
-        "Kansalliskirjaston Digitoidut aineistot",
-        "Kansalliskirjaston digitaaliset aineistot",
-        "Nationalbibliotekets digitala samlingar",
-        "National Library's Digital Collections",
-    ]:
+    for reponame in KANSALLISKIRJASTO_REPOS:
         i = line.find(reponame)
         if i > 0:
             break
@@ -241,6 +334,7 @@ def match_kansalliskirjasto2(line):
     return Match(line, reponame, sourcetitle, citationpage, details, url)
 
 
+@register(prefixes=["https://www.geni.com/people/"])
 def match_geni(line):
     # Geni.com link
     #
@@ -259,7 +353,15 @@ def match_geni(line):
         return Match(line, reponame, sourcetitle, citationpage, details, url)
 
 
+# the first word of the line as shlex would split it: quoted and unquoted
+# segments up to the first space outside quotes (backslashes and single
+# quotes are taken literally); no match if a quote is not closed
+REGEX_FAMILYSEARCH_TITLE = re.compile(r'(?:"[^"]*"|[^\s"]+)+(?=\s|$)')
+REGEX_FAMILYSEARCH_SEGMENT = re.compile(r'"([^"]*)"|([^\s"]+)')
+
+
 # familysearch
+@register(prefixes=['"'], keywords=[" FamilySearch "])
 def match_familysearch(line):
     # "United States, Census, 1950", , FamilySearch (https://www.familysearch.org/ark:/61903/1:1:6X1G-K822 : Wed Mar 20 22:12:37 UTC 2024), Entry for Alfred L Kinney and Esther S Kinney, April 8, 1950.
 
@@ -268,10 +370,13 @@ def match_familysearch(line):
         return None
     if " FamilySearch " not in line:
         return None
-    line = line.replace("'", "''")
-    temp = shlex.split(line)
-    print(temp)
-    sourcetitle = temp[0].replace("''", "'")
+    m = REGEX_FAMILYSEARCH_TITLE.match(line)
+    if not m:
+        return None
+    sourcetitle = "".join(
+        quoted + unquoted
+        for quoted, unquoted in REGEX_FAMILYSEARCH_SEGMENT.findall(m.group(0))
+    )
     if sourcetitle.endswith(","):
         sourcetitle = sourcetitle[:-1]
     i = line.find("http")
@@ -281,12 +386,13 @@ def match_familysearch(line):
     j = line.find("),", i)
     if j < 0:
         return None
-    citationpage = line[j + 2 :].strip().replace("''", "'")
+    citationpage = line[j + 2 :].strip()
     reponame = "FamilySearch"
     details = line
     return Match(line, reponame, sourcetitle, citationpage, details, url)
 
 
+@register(prefixes=["https://hiski.genealogia.fi"], online=True)
 def match_hiski(line):
     #    https://hiski.genealogia.fi/hiski/5k2oqz?fi+0114+kastetut+21
     #
@@ -359,6 +465,7 @@ def match_hiski(line):
     return Match(line, reponame, sourcetitle, citationpage, details, url)
 
 
+@register(prefixes=["https://katiha.kansallisarkisto.fi"], online=True)
 def match_katiha(line):
     # https://katiha.kansallisarkisto.fi/henkilotieto.php?keyId=0617R006a0000020
     if not line.startswith("https://katiha.kansallisarkisto.fi"):
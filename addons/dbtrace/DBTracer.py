@@ -31,7 +31,7 @@ try:
 except:
     pass
  
-from gi.repository import Gtk
+from gi.repository import Gtk, GLib
 
 from gramps.gui.dialog import ErrorDialog
 from gramps.gui.plug import tool
@@ -46,6 +46,7 @@ except ValueError:
 _ = _trans.gettext
 
 import dbtrace
+import sqlprofiler
 
 # import sqlite3
 # sqlite3.enable_callback_tracebacks(True)
@@ -57,6 +58,7 @@ import dbtrace
 #######################################################################
 
 class Tool(tool.Tool):
+    PROFILE_ROWS = 100  # number of statement templates shown in the profile
 
     def __init__(self, dbstate, user, options_class, name, callback=None):
         # type: (Any, Any, Any, str, Callable) -> None
@@ -66,6 +68,8 @@ class Tool(tool.Tool):
         tool.Tool.__init__(self, dbstate, options_class, name)
 
         self.callback_active = False
+        self.profiler = None
+        self.profiler_key = None
 #        self.curdb = self.dbstate.db
         self.dbstate.connect("database-changed", self.db_changed)
         self.maindialog = self.createtracer()
@@ -74,7 +78,7 @@ class Tool(tool.Tool):
         print("db_changed", db, db.get_dbid())
         if db.get_dbid() == "":
             return
-        self.dbtrace_callback_key = dbtrace.enable_trace(db, self.tracer_callback)
+        self.dbtrace_callback_key = dbtrace.enable_trace(db, self.tracer_callback, queued=True, batch=True)
             
             
     def createtracer(self):
@@ -85,6 +89,9 @@ class Tool(tool.Tool):
         self.but_enable = tracer.add_button("Enable trace", 1)
         self.but_disable = tracer.add_button("Disable trace", 2)
         self.but_clear = tracer.add_button("Clear", 3)
+        self.but_profile = tracer.add_button("Start profiling", 5)
+        self.but_export = tracer.add_button("Export profile", 6)
+        self.but_export.set_sensitive(False)
         tracer.add_button("Exit", 4)
 
         self.but_disable.set_sensitive(False)
@@ -97,14 +104,18 @@ class Tool(tool.Tool):
         self.textview.set_wrap_mode(Gtk.WrapMode.WORD)
         sw.add(self.textview)
         self.textbuffer = self.textview.get_buffer()
+
+        self.notebook = Gtk.Notebook()
+        self.notebook.append_page(sw, Gtk.Label(label="Trace"))
+        self.notebook.append_page(self.create_profile_view(), Gtk.Label(label="Profile"))
         
         self.text = Gtk.Label()
-        c.pack_start(sw, True, True, 0)
+        c.pack_start(self.notebook, True, True, 0)
         c.add(self.text)
         self.count = 0
 
         db = self.dbstate.db            
-        self.dbtrace_callback_key = dbtrace.enable_trace(db, self.tracer_callback)
+        self.dbtrace_callback_key = dbtrace.enable_trace(db, self.tracer_callback, queued=True, batch=True)
         if self.dbtrace_callback_key is None:
             ErrorDialog("Error", "dbtrace.enable_trace failed")
             tracer.destroy()
@@ -116,11 +127,87 @@ class Tool(tool.Tool):
         tracer.show_all()
         return tracer
         
+    def create_profile_view(self):
+        # template, count, total, mean, p50, p99, max
+        self.profile_store = Gtk.ListStore(str, int, float, float, float, float, float)
+        view = Gtk.TreeView(model=self.profile_store)
+        titles = ["Statement template", "Count", "Total ms", "Mean ms", "p50 ms", "p99 ms", "Max ms"]
+        for col, title in enumerate(titles):
+            renderer = Gtk.CellRendererText()
+            column = Gtk.TreeViewColumn(title, renderer, text=col)
+            if col == 0:
+                renderer.set_property("ellipsize", 3)  # Pango.EllipsizeMode.END
+                column.set_expand(True)
+                column.set_resizable(True)
+            elif col > 1:
+                column.set_cell_data_func(renderer, self.format_ms, col)
+            column.set_sort_column_id(col)
+            view.append_column(column)
+        self.profile_store.set_sort_column_id(2, Gtk.SortType.DESCENDING)
+        view.set_tooltip_column(0)
+        sw = Gtk.ScrolledWindow()
+        sw.add(view)
+        return sw
+
+    def format_ms(self, column, renderer, model, treeiter, col):
+        renderer.set_property("text", "{:.2f}".format(model[treeiter][col]))
+
+    def start_profiling(self, db):
+        self.profiler = sqlprofiler.SqlProfiler()
+        self.profiler_key = dbtrace.enable_trace(db, self.profiler)
+        if self.profiler_key is None:
+            ErrorDialog("Error", "dbtrace.enable_trace failed")
+            self.profiler = None
+            return
+        self.profiler.attach(db)
+        self.but_profile.set_label("Stop profiling")
+        self.but_export.set_sensitive(True)
+        self.notebook.set_current_page(1)
+        GLib.timeout_add_seconds(1, self.refresh_profile)
+
+    def stop_profiling(self, db):
+        if self.profiler_key is not None:
+            dbtrace.disable_trace(db, self.profiler_key)
+            self.profiler_key = None
+        if self.profiler:
+            self.profiler.stop()
+            self.refresh_profile()
+        self.but_profile.set_label("Start profiling")
+
+    def refresh_profile(self):
+        if self.profiler is None:
+            return False
+        self.profile_store.clear()
+        for row in self.profiler.top(self.PROFILE_ROWS):
+            self.profile_store.append([row[name] for name in sqlprofiler.COLUMNS])
+        return self.profiler_key is not None  # continue while profiling
+
+    def export_profile(self):
+        dialog = Gtk.FileChooserDialog(
+            title="Export profile",
+            action=Gtk.FileChooserAction.SAVE,
+            buttons=("_Cancel", Gtk.ResponseType.CANCEL, "_Save", Gtk.ResponseType.OK),
+        )
+        dialog.set_do_overwrite_confirmation(True)
+        dialog.set_current_name("profile.csv")
+        for name, pattern in [("CSV", "*.csv"), ("JSON", "*.json")]:
+            filefilter = Gtk.FileFilter()
+            filefilter.set_name(name)
+            filefilter.add_pattern(pattern)
+            dialog.add_filter(filefilter)
+        if dialog.run() == Gtk.ResponseType.OK:
+            filename = dialog.get_filename()
+            try:
+                self.profiler.export(filename)
+            except Exception as e:
+                ErrorDialog("Error", str(e))
+        dialog.destroy()
+
     def tracer_handler(self, widget, resp):
         db = self.dbstate.db            
         
         if resp == 1:
-            self.dbtrace_callback_key = dbtrace.enable_trace(db, self.tracer_callback)
+            self.dbtrace_callback_key = dbtrace.enable_trace(db, self.tracer_callback, queued=True, batch=True)
             if self.dbtrace_callback_key is None:
                 ErrorDialog("Error", "dbtrace.enable_trace failed")
                 widget.destroy()
@@ -137,19 +224,33 @@ class Tool(tool.Tool):
             self.count = 0
             newlabel = f"Count = {self.count}"
             self.text.set_label(newlabel)
+            if self.profiler:
+                self.profiler.clear()
+                self.refresh_profile()
         if resp == 4:
             if self.callback_active:
                 dbtrace.disable_trace(db, self.dbtrace_callback_key)
+            self.stop_profiling(db)
             widget.destroy()
+        if resp == 5:
+            if self.profiler_key is None:
+                self.start_profiling(db)
+            else:
+                self.stop_profiling(db)
+        if resp == 6 and self.profiler:
+            self.export_profile()
 
-    def tracer_callback(self, sqlstring):
-        # print("sql", sqlstring)
-        self.count += 1
+    def tracer_callback(self, sqlstrings):
+        # called from the GTK main loop with the statements queued since the previous call
+        self.count += len(sqlstrings)
         newlabel = f"Count = {self.count}"
+        stats = dbtrace.get_stats(self.dbtrace_callback_key)
+        if stats and stats["dropped"]:
+            newlabel += ", dropped = {}".format(stats["dropped"])
         self.text.set_label(newlabel)
 
         end_iter = self.textbuffer.get_end_iter()
-        self.textbuffer.insert(end_iter, sqlstring + "\n")
+        self.textbuffer.insert(end_iter, "\n".join(sqlstrings) + "\n")
 
         # Scroll to the bottom
         mark = self.textbuffer.create_mark(None, end_iter, False)
@@ -18,21 +18,30 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
+import json
 import os
 import pickle
+import re
 import sys
+import threading
 import time
 import traceback
 import sqlite3
 import uuid
 
-from collections import defaultdict
+from collections import defaultdict, deque
 from contextlib import contextmanager 
 from pprint import pprint
 
+from gi.repository import GLib
+
 from gramps.gui.dialog import ErrorDialog
 
+DEFAULT_QUEUE_SIZE = 10000
+
 def load_on_reg(dbstate, uistate, plugin):
+    if not hasattr(sys, "dbtrace_change_callbacks"):
+        sys.dbtrace_change_callbacks = dict()
     if hasattr(sys, "dbtrace_callbacks"): # to avoid doing the dbstate.connect below multiple times if plugins are reloaded
         # print("dbtrace already loaded")
         return
@@ -43,16 +52,33 @@ def db_changed(db):
     dbid = db.get_dbid()
     if dbid == "":
         sys.dbtrace_callbacks = dict()
+        sys.dbtrace_change_callbacks = dict()
 
 @contextmanager 
-def tracing(db, callback):
-    key = enable_trace(db, callback)
+def tracing(db, callback, **kwargs):
+    key = enable_trace(db, callback, **kwargs)
     try:
         yield
     finally:
         disable_trace(db, key)
 
-def enable_trace(db, callback):
+@contextmanager 
+def tracking_changes(db, callback, **kwargs):
+    key = enable_changes(db, callback, **kwargs)
+    try:
+        yield
+    finally:
+        disable_changes(db, key)
+
+def enable_trace(db, callback, queued=False, maxsize=DEFAULT_QUEUE_SIZE, batch=False):
+    """
+    Calls 'callback' for every SQL statement. Returns a key for disable_trace.
+
+    By default the callback is called synchronously inside the SQLite trace
+    hook. With queued=True the statements are put in a ring buffer of
+    'maxsize' items and delivered later from the GTK main loop, see
+    QueuedCallback. With batch=True the callback gets a list of statements.
+    """
     try:
         import fulltext
         if not hasattr(fulltext, "dbtrace_version"):
@@ -66,6 +92,8 @@ def enable_trace(db, callback):
         return
     key = uuid.uuid4().hex
     activate_trace(db)
+    if queued:
+        callback = QueuedCallback(callback, maxsize, batch)
     sys.dbtrace_callbacks[key] = callback
     # pprint(sys.dbtrace_callbacks)
     return key
@@ -75,8 +103,49 @@ def disable_trace(db, key):
     if dbid == "":
         return
     if key in sys.dbtrace_callbacks:
-        del sys.dbtrace_callbacks[key]
-    if not sys.dbtrace_callbacks: # empty
+        cancel_callback(sys.dbtrace_callbacks.pop(key))
+    deactivate_trace_if_unused(db)
+
+def enable_changes(db, callback, queued=False, maxsize=DEFAULT_QUEUE_SIZE, batch=False):
+    """
+    Like enable_trace but the callback is called only for changes to the
+    primary object tables and for commits. The argument is a ChangeEvent.
+    """
+    dbid = db.get_dbid()
+    if dbid == "":
+        return
+    key = uuid.uuid4().hex
+    activate_trace(db)
+    if queued:
+        callback = QueuedCallback(callback, maxsize, batch)
+    sys.dbtrace_change_callbacks[key] = callback
+    return key
+
+def disable_changes(db, key):
+    dbid = db.get_dbid()
+    if dbid == "":
+        return
+    if key in sys.dbtrace_change_callbacks:
+        cancel_callback(sys.dbtrace_change_callbacks.pop(key))
+    deactivate_trace_if_unused(db)
+
+def get_stats(key):
+    """
+    Returns the statistics of a queued callback as a dict with the keys
+    'delivered', 'dropped' and 'pending', or None if the callback is not
+    queued.
+    """
+    callback = sys.dbtrace_callbacks.get(key) or sys.dbtrace_change_callbacks.get(key)
+    if isinstance(callback, QueuedCallback):
+        return callback.stats()
+    return None
+
+def cancel_callback(callback):
+    if isinstance(callback, QueuedCallback):
+        callback.cancel()
+
+def deactivate_trace_if_unused(db):
+    if not sys.dbtrace_callbacks and not sys.dbtrace_change_callbacks: # empty
         connection = db.dbapi._Connection__connection
         connection.set_trace_callback(None)  # disable any tracing
 
@@ -88,4 +157,151 @@ def activate_trace(db):
 def dbtrace_callback(dbid, sqlstring):
     for cb in sys.dbtrace_callbacks.values():
         cb(sqlstring) 
+    if sys.dbtrace_change_callbacks:
+        event = parse_change(sqlstring)
+        if event is not None:
+            for cb in sys.dbtrace_change_callbacks.values():
+                cb(event)
+
+
+class QueuedCallback:
+    """
+    Decouples a subscriber from the SQLite trace hook.
+
+    The trace hook only appends the item to a bounded ring buffer and
+    schedules an idle callback in the GTK main loop. The idle callback
+    delivers everything in the buffer to the subscriber, one item at a time
+    or as one list if 'batch' is set. If the subscriber cannot keep up (or
+    the main loop is not running during a long operation) the oldest items
+    are dropped and counted in 'dropped'.
+    """
+    def __init__(self, callback, maxsize=DEFAULT_QUEUE_SIZE, batch=False):
+        self.callback = callback
+        self.batch = batch
+        self.queue = deque(maxlen=maxsize)
+        self.lock = threading.Lock()
+        self.source_id = None
+        self.delivered = 0
+        self.dropped = 0
+
+    def __call__(self, item):
+        with self.lock:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(item)
+            if self.source_id is None:
+                self.source_id = GLib.idle_add(self.deliver)
+
+    def deliver(self):
+        with self.lock:
+            items = list(self.queue)
+            self.queue.clear()
+            self.source_id = None
+        if items:
+            self.delivered += len(items)
+            if self.batch:
+                self.callback(items)
+            else:
+                for item in items:
+                    self.callback(item)
+        return False
+
+    def cancel(self):
+        with self.lock:
+            if self.source_id is not None:
+                GLib.source_remove(self.source_id)
+                self.source_id = None
+            self.queue.clear()
+
+    def stats(self):
+        return dict(delivered=self.delivered, dropped=self.dropped, pending=len(self.queue))
+
+
+class ChangeEvent:
+    """
+    A change to a primary object table, built from one traced SQL statement.
+
+    op      "INSERT", "UPDATE", "DELETE" or "COMMIT"
+    table   the table/object type, e.g. "person" (None for COMMIT)
+    handle  the object handle (None for COMMIT)
+    format  "json" (Gramps 6.0+) or "blob" (pickled, Gramps 5.x) for INSERT
+            and UPDATE, otherwise None
+
+    The object data is extracted from the statement and decoded only when a
+    subscriber asks for it: 'data' is the serialized data (JSON text or hex
+    string) and 'payload' is the decoded data (a dict or the unpickled tuple).
+    """
+    __slots__ = ("op", "table", "handle", "format", "_sqlstring", "_start", "_end", "_data")
+
+    def __init__(self, op, table=None, handle=None, format=None, sqlstring=None, start=0, end=0):
+        self.op = op
+        self.table = table
+        self.handle = handle
+        self.format = format
+        self._sqlstring = sqlstring
+        self._start = start
+        self._end = end
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None and self._sqlstring is not None:
+            data = self._sqlstring[self._start:self._end]
+            if self.format == "json":
+                data = data.replace("''", "'")  # SQL string literal quoting
+            self._data = data
+        return self._data
+
+    @property
+    def payload(self):
+        data = self.data
+        if data is None:
+            return None
+        if self.format == "json":
+            return json.loads(data)
+        return pickle.loads(bytes.fromhex(data))
+
+    def __repr__(self):
+        return "ChangeEvent({}, {}, {})".format(self.op, self.table, self.handle)
+
+
+# INSERT INTO note (handle, blob_data) VALUES ('fa58e755a2176eb0842bba649f3', x'800495...')
+# INSERT INTO person (handle, json_data) VALUES ('ff35452da6668a80f91bb708dfb', '{"handle":...}')
+INSERT_RE = re.compile(r"INSERT INTO (\w+) \(handle, (blob|json)_data\) VALUES ?\('([^']*)', x?'")
+
+# UPDATE note SET blob_data = x'800495cd...' WHERE handle = 'f9e7c3ae9d734e31b1879b0bc4c'
+# UPDATE person SET json_data = '{"handle":...}' WHERE handle = '22WKQC0LKX6LZD83VP'
+UPDATE_RE = re.compile(r"UPDATE (\w+) SET (blob|json)_data = x?'")
+UPDATE_WHERE = "' WHERE handle = '"
+
+# DELETE FROM note WHERE handle = 'fa58e755a2176eb0842bba649f3'
+DELETE_RE = re.compile(r"DELETE FROM (\w+) WHERE handle = '([^']*)'")
+
+def parse_change(sqlstring):
+    """
+    Returns a ChangeEvent for a statement that changes a primary object or
+    commits a transaction, otherwise None. Reads are rejected by looking at
+    the first character only.
+    """
+    c = sqlstring[:1]
+    if c == "I":
+        m = INSERT_RE.match(sqlstring)
+        if m:
+            end = sqlstring.rfind("'")
+            return ChangeEvent("INSERT", m.group(1), m.group(3), m.group(2), sqlstring, m.end(), end)
+    elif c == "U":
+        m = UPDATE_RE.match(sqlstring)
+        if m:
+            i = sqlstring.rfind(UPDATE_WHERE)
+            if i > 0:
+                handle = sqlstring[i + len(UPDATE_WHERE):sqlstring.rfind("'")]
+                return ChangeEvent("UPDATE", m.group(1), handle, m.group(2), sqlstring, m.end(), i)
+    elif c == "D":
+        m = DELETE_RE.match(sqlstring)
+        if m:
+            return ChangeEvent("DELETE", m.group(1), m.group(2))
+    elif c == "C":
+        if sqlstring.startswith("COMMIT"):
+            return ChangeEvent("COMMIT")
+    return None
     
@@ -0,0 +1,305 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2024-2025      Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+#######################################################################
+#
+# SQL profiler built on dbtrace
+#
+# Usage:
+#
+#     import dbtrace, sqlprofiler
+#
+#     profiler = sqlprofiler.SqlProfiler()
+#     profiler.attach(db)
+#     with dbtrace.tracing(db, profiler):
+#         ...
+#     profiler.stop()
+#     for row in profiler.top(20):
+#         print(row)
+#
+#######################################################################
+
+import csv
+import json
+import random
+import re
+import time
+
+try:
+    from gi.repository import GLib
+except ImportError:
+    GLib = None
+
+# string and blob literals, numbers
+LITERAL_RE = re.compile(r"x?'(?:[^']|'')*'|(?<![\w.])-?\d+(?:\.\d+)?\b")
+# (?, ?, ?) -> (?, ...)
+LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+SPACE_RE = re.compile(r"\s+")
+
+COLUMNS = ["template", "count", "total", "mean", "p50", "p99", "max"]
+
+# methods of the Gramps connection wrapper (db.dbapi) that are timed;
+# the fetch methods are added to the time of the statement they belong to
+EXECUTE_METHODS = ["execute", "executemany"]
+FETCH_METHODS = ["fetchone", "fetchall"]
+
+MAX_CACHED = 1000   # longer statements are not kept in the template cache
+MAX_PENDING = 1000  # timings kept before they are aggregated
+
+def normalize(sqlstring):
+    """
+    Returns the template of an SQL statement: literals (including handles
+    and serialized objects) are replaced with '?' and lists of values with
+    '(?, ...)'.
+    """
+    template = LITERAL_RE.sub("?", sqlstring)
+    template = LIST_RE.sub("(?, ...)", template)
+    return SPACE_RE.sub(" ", template).strip()
+
+
+class TemplateStats:
+    """
+    Timing statistics for one statement template. The percentiles are
+    computed from a random sample of at most 'samples' timings.
+    """
+    def __init__(self, template, samples):
+        self.template = template
+        self.maxsamples = samples
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        if len(self.samples) < self.maxsamples:
+            self.samples.append(elapsed)
+        else:
+            i = random.randrange(self.count)
+            if i < self.maxsamples:
+                self.samples[i] = elapsed
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        values = sorted(self.samples)
+        i = min(len(values) - 1, int(p * len(values)))
+        return values[i]
+
+    def row(self):
+        # times in milliseconds
+        return dict(
+            template=self.template,
+            count=self.count,
+            total=self.total * 1000,
+            mean=self.total * 1000 / self.count,
+            p50=self.percentile(0.50) * 1000,
+            p99=self.percentile(0.99) * 1000,
+            max=self.max * 1000,
+        )
+
+
+class SqlProfiler:
+    """
+    Aggregates the times of SQL statements per statement template.
+
+    After attach(db) the statements are timed directly: the execute and
+    executemany methods of the database connection are wrapped, and the
+    time of the fetchone/fetchall calls that follow is added to the
+    statement. This is the time spent in SQLite, so the templates are
+    ranked by their real cost. Statements run through a separate cursor
+    (the iter_* methods) are counted by the dbtrace callback but not
+    timed.
+
+    Without attach (the 'gap' timing) the profiler only sees the SQLite
+    trace hook, which reports when a statement starts. A statement is then
+    considered finished when the next statement starts or when Gramps
+    returns to the GTK main loop, so the time is the gap from one statement
+    to the next and includes all Python and GUI work in between.
+
+    The templates are computed later, in the idle handler, when
+    MAX_PENDING timings have been collected or when the statistics are
+    read, and not for every statement inside the trace hook or the wrapped
+    methods.
+    """
+    def __init__(self, samples=1000):
+        self.samples = samples
+        self.stats = {}     # template -> TemplateStats
+        self.templates = {} # statement -> template, for short statements
+        self.pending = []   # (statement, elapsed) not yet aggregated
+        self.wrapped = []   # (object, method name) of the wrapped methods
+        self.current = None
+        self.start = 0.0
+        self.elapsed = 0.0
+        self.idle_id = None
+        self.statements = 0
+        self.started = time.time()
+
+    @property
+    def timing(self):
+        return "statement" if self.wrapped else "gap"
+
+    def attach(self, db):
+        """
+        Times the statements of 'db' directly. Returns False if the
+        connection cannot be wrapped; the gap timing is then used.
+        """
+        dbapi = db.dbapi
+        for name in EXECUTE_METHODS + FETCH_METHODS:
+            method = getattr(dbapi, name, None)
+            if method is None:
+                continue
+            setattr(dbapi, name, self.timed(name, method))
+            self.wrapped.append((dbapi, name))
+        return bool(self.wrapped)
+
+    def detach(self):
+        for obj, name in self.wrapped:
+            # the wrapper is an instance attribute hiding the method
+            obj.__dict__.pop(name, None)
+        self.wrapped = []
+
+    def timed(self, name, method):
+        execute = name in EXECUTE_METHODS
+
+        def wrapper(*args, **kwargs):
+            if execute:
+                self.finish()
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if execute:
+                    self.current = args[0] if args else kwargs.get("sql", "")
+                    self.elapsed = elapsed
+                    self.schedule()
+                elif self.current is not None:
+                    self.elapsed += elapsed
+        return wrapper
+
+    def __call__(self, sqlstring):
+        self.statements += 1
+        if self.wrapped:
+            return
+        now = time.perf_counter()
+        self.finish(now)
+        self.current = sqlstring
+        self.start = now
+        self.schedule()
+
+    def schedule(self):
+        if GLib and self.idle_id is None:
+            self.idle_id = GLib.idle_add(self.idle)
+
+    def idle(self):
+        self.idle_id = None
+        self.finish()
+        self.flush()
+        return False
+
+    def finish(self, now=None):
+        """
+        Records the time of the current statement.
+        """
+        if self.current is None:
+            return
+        if self.wrapped:
+            elapsed = self.elapsed
+        else:
+            if now is None:
+                now = time.perf_counter()
+            elapsed = now - self.start
+        self.pending.append((self.current, elapsed))
+        self.current = None
+        # also while the main loop is busy and the idle callback cannot run
+        if len(self.pending) >= MAX_PENDING:
+            self.flush()
+
+    def flush(self):
+        """
+        Aggregates the recorded timings per template.
+        """
+        templates = self.templates
+        for sqlstring, elapsed in self.pending:
+            template = templates.get(sqlstring)
+            if template is None:
+                template = normalize(sqlstring)
+                if len(sqlstring) <= MAX_CACHED:
+                    templates[sqlstring] = template
+            stats = self.stats.get(template)
+            if stats is None:
+                stats = TemplateStats(template, self.samples)
+                self.stats[template] = stats
+            stats.add(elapsed)
+        self.pending = []
+
+    def stop(self):
+        self.finish()
+        self.flush()
+        self.detach()
+        if GLib and self.idle_id is not None:
+            GLib.source_remove(self.idle_id)
+            self.idle_id = None
+
+    def clear(self):
+        self.finish()
+        self.pending = []
+        self.stats = {}
+        self.statements = 0
+        self.started = time.time()
+
+    def top(self, n=None, key="total"):
+        """
+        Returns the statistics as a list of dicts (times in milliseconds),
+        sorted by 'key' in descending order.
+        """
+        self.flush()
+        rows = [stats.row() for stats in self.stats.values()]
+        rows.sort(key=lambda row: row[key], reverse=True)
+        if n is not None:
+            rows = rows[:n]
+        return rows
+
+    def export_csv(self, filename):
+        with open(filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            for row in self.top():
+                writer.writerow(row)
+
+    def export_json(self, filename):
+        data = dict(
+            started=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            statements=self.statements,
+            timing=self.timing,
+            templates=self.top(),
+        )
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+    def export(self, filename):
+        if filename.lower().endswith(".json"):
+            self.export_json(filename)
+        else:
+            self.export_csv(filename)
@@ -0,0 +1,135 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2020-2025  Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+Memory use and comparison speed of the feature table (dupfeatures.py).
+
+This runs outside Gramps with synthetic people: every person has a birth
+date, a birth place and a main parents family, and half of the people have
+a death date and a spouse. It also compares the speed of the soundex
+comparison of name strings with the comparison of interned keys. Usage:
+
+    python bench_features.py [number of people]
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gramps.gen.soundex import compare
+
+from dupfeatures import DateKey, FeatureTable, PersonFeatures, Scorer
+
+FIRST_NAMES = ["Matti", "Maria", "Juho", "Anna", "Johan", "Liisa", "Erik", "Kaisa", "Antti", "Helena"]
+SURNAMES = ["Virtanen", "Korhonen", "Nieminen", "Johansson", "Mäkinen", "Hämäläinen", "Laine", "Heikkinen"]
+PLACES = 5000
+
+
+def random_name(rnd, keys):
+    first_name = rnd.choice(FIRST_NAMES) + " " + rnd.choice(FIRST_NAMES)
+    return keys.make_name(rnd.choice(SURNAMES), "", first_name, first_name.split())
+
+
+def random_date(rnd):
+    year = rnd.randint(1700, 1900)
+    dateval = (rnd.randint(1, 28), rnd.randint(1, 12), year, False)
+    return DateKey((0, 0, 0, dateval), False, dateval[0:3], (0, 0, 0))
+
+
+def build(count):
+    rnd = random.Random(1)
+    table = FeatureTable()
+    for i in range(count):
+        table.add("%027x" % i, random_name(rnd, table.keys), "F%d" % (i // 3))
+    families = {}
+    for i in range(1, count // 3):
+        # the parents are older than the children
+        families["F%d" % i] = ("%027x" % rnd.randrange(i * 3), "%027x" % rnd.randrange(i * 3))
+    for handle, i in table.index.items():
+        features = PersonFeatures(
+            handle,
+            "I%d" % i,
+            i,
+            i % 2,
+            (table.primary_names[i],),
+            random_date(rnd),
+            random_date(rnd) if i % 2 else None,
+            "P%d" % rnd.randrange(PLACES),
+            "",
+        )
+        table.people[handle] = features
+        table.families[handle] = ["F%d" % rnd.randrange(count // 3)] if i % 2 else []
+    table.link_families(families)
+    for i in range(PLACES):
+        table.add_place("P%d" % i, "Place %d, Parish, Country" % i)
+    return table
+
+
+def bench_name_compare(table, count=1000000):
+    rnd = random.Random(3)
+    names = [rnd.choice(FIRST_NAMES + SURNAMES) for _i in range(1000)]
+    pairs = [(rnd.choice(names), rnd.choice(names)) for _i in range(count)]
+    t1 = time.time()
+    for s1, s2 in pairs:
+        compare(s1, s2)
+    t2 = time.time()
+
+    scorer = Scorer(table, True, False, 0)
+    key = table.keys.key
+    keypairs = [(key(s1), key(s2)) for s1, s2 in pairs]
+    t3 = time.time()
+    for k1, k2 in keypairs:
+        scorer.name_compare(k1, k2)
+    t4 = time.time()
+    print("soundex compare of strings: {:.0f} /s".format(count / (t2 - t1)))
+    print("compare of interned keys:   {:.0f} /s".format(count / (t4 - t3)))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    tracemalloc.start()
+    t1 = time.time()
+    table = build(count)
+    t2 = time.time()
+    traced, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{} people, built in {:.1f}s".format(count, t2 - t1))
+    print("memory_size(): {:.0f} MB".format(table.memory_size() / 1e6))
+    print("tracemalloc:   {:.0f} MB".format(traced / 1e6))
+    print("per person:    {:.0f} bytes".format(traced / count))
+
+    scorer = Scorer(table, True, False, 0)
+    people = list(table.people.values())
+    pairs = 200000
+    rnd = random.Random(2)
+    t1 = time.time()
+    for _i in range(pairs):
+        scorer.compare_people(rnd.choice(people), rnd.choice(people))
+    t2 = time.time()
+    print("comparisons:   {:.0f} pairs/s".format(pairs / (t2 - t1)))
+    bench_name_compare(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2020-2025  Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+Batch mode of findduplicates2: the matches are written to a CSV or JSON
+file (or to the standard output) as soon as they are found, and the
+throughput of the search is reported at the end.
+
+Usage:
+
+    gramps -O "My tree" -a tool -p name=findduplicates2,format=csv,output=matches.csv
+
+The CSV file has the same columns as the file saved from the match list
+(rating, Gramps ids, handles, names) so it can be opened with "Load CSV".
+The JSON format writes one JSON object per line.
+"""
+
+import csv
+import json
+import sys
+import time
+
+from collections import Counter
+
+FORMATS = ["text", "csv", "json"]
+
+
+class MatchWriter:
+    """
+    Writes each pair once, in the order they are found. 'person_row' is a
+    function that returns (gramps_id, name) for a person handle.
+    """
+
+    def __init__(self, output, fmt, person_row):
+        if output:
+            self.file = open(output, "w", encoding="utf-8", newline="")
+        else:
+            self.file = sys.stdout
+        self.format = fmt
+        self.person_row = person_row
+        self.csv_writer = csv.writer(self.file) if fmt == "csv" else None
+        self.written = set()
+        self.count = 0
+
+    def write(self, p1key, p2key, chance):
+        if (p1key, p2key) in self.written or (p2key, p1key) in self.written:
+            return
+        self.written.add((p1key, p2key))
+        self.count += 1
+        gramps_id1, name1 = self.person_row(p1key)
+        gramps_id2, name2 = self.person_row(p2key)
+        if self.format == "csv":
+            self.csv_writer.writerow(
+                [round(chance, 2), gramps_id1, gramps_id2, p1key, p2key, name1, name2]
+            )
+        elif self.format == "json":
+            obj = dict(
+                chance=round(chance, 2),
+                gramps_id1=gramps_id1,
+                gramps_id2=gramps_id2,
+                handle1=p1key,
+                handle2=p2key,
+                name1=name1,
+                name2=name2,
+            )
+            self.file.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        else:
+            self.file.write(
+                f"{chance:2.2f} {gramps_id1:10.10} {name1:30.30} -  {gramps_id2:10.10} {name2:30.30}\n"
+            )
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class BatchStats:
+    """
+    Collects the timing of the passes and the number of candidates per
+    person and formats them as a report.
+    """
+
+    def __init__(self):
+        self.passes = []            # list of (pass name, seconds)
+        self.candidates = Counter() # number of candidates -> number of people
+        self.comparisons = 0
+        self.start = time.time()
+        self.pass_name = None
+        self.pass_start = None
+        self.score_seconds = 0.0
+
+    def set_pass(self, name):
+        now = time.time()
+        if self.pass_name is not None:
+            self.passes.append((self.pass_name, now - self.pass_start))
+        self.pass_name = name
+        self.pass_start = now
+
+    def done(self):
+        self.set_pass(None)
+        self.total = time.time() - self.start
+
+    def histogram(self):
+        """
+        Returns a list of (low, high, people) where 'people' have between
+        low and high candidates; the ranges are powers of two.
+        """
+        bins = Counter()
+        for count, people in self.candidates.items():
+            bins[count.bit_length()] += people
+        result = []
+        for bit in sorted(bins):
+            low = 0 if bit == 0 else 1 << (bit - 1)
+            high = 0 if bit == 0 else (1 << bit) - 1
+            result.append((low, high, bins[bit]))
+        return result
+
+    def report(self, matches):
+        lines = []
+        for name, seconds in self.passes:
+            lines.append("{:40} {:8.2f}s".format(name, seconds))
+        lines.append("{:40} {:8.2f}s".format("Total", self.total))
+        lines.append("Comparisons: {}".format(self.comparisons))
+        if self.score_seconds > 0:
+            lines.append("Pairs per second: {:.0f}".format(self.comparisons / self.score_seconds))
+        lines.append("Matches: {}".format(matches))
+        lines.append("Candidates per person:")
+        people = sum(self.candidates.values())
+        for low, high, count in self.histogram():
+            label = str(low) if low == high else "{}-{}".format(low, high)
+            bar = "#" * max(1, round(50 * count / people)) if count else ""
+            lines.append("{:>15} {:9} {}".format(label, count, bar))
+        return "\n".join(lines)
@@ -0,0 +1,222 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2020-2025  Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+Candidate generation ("blocking") for findduplicates2.
+
+A candidate generator is created from the list of all Records and returns,
+for each person, the people that the person should be compared with. Only
+these pairs are scored, so the generator decides how many comparisons are
+done and which matches can be found at all:
+
+surname     The original method: everybody with the same gender and the same
+            surname key (soundex). This is the exhaustive mode that the other
+            methods are measured against.
+multikey    Surname key plus birth year band, first name initial and
+            optionally the birth place (parish). Without the parish this
+            finds the same matches as "surname" because a pair that differs
+            in these keys always gets a negative score. A person with a name
+            without first names has the initial "" and is compared with
+            every initial, because name_match does not reject such names.
+sorted      Sorted neighbourhood: people are sorted by surname key, first
+            name and birth year and each person is compared with the
+            neighbours within a window.
+minhash     MinHash/LSH on the character n-grams of the full name. Finds
+            people with similar names even if the soundex codes differ.
+
+The attribute 'pairwise' of a generator class tells whether a pair is a
+candidate only because of the two people themselves. It is false for
+"sorted", where adding or removing anybody shifts the windows; an
+incremental search then compares everybody again.
+"""
+
+import zlib
+
+from collections import defaultdict
+
+BLOCKING_METHODS = ["surname", "multikey", "sorted", "minhash"]
+
+YEAR_BAND = 5           # years per birth year band in "multikey"
+WINDOW = 20             # window size for "sorted"
+MINHASH_BANDS = 8       # LSH bands for "minhash"
+MINHASH_ROWS = 2        # minhash values per band
+NGRAM = 3
+
+
+class Record:
+    """
+    The blocking keys of one person.
+
+    keys        surname keys of all names, the primary name first
+    initials    first letters of all first names of all names; "" matches
+                every initial (a name without first names or a non-ASCII
+                initial)
+    year        birth year or None
+    parish      birth place handle or None
+    name        full name for "sorted" and "minhash"
+    """
+    __slots__ = ("handle", "male", "keys", "initials", "year", "parish", "name")
+
+    def __init__(self, handle, male, keys, initials, year, parish, name):
+        self.handle = handle
+        self.male = male
+        self.keys = keys
+        self.initials = initials
+        self.year = year
+        self.parish = parish
+        self.name = name
+
+
+class SurnameBlocking:
+    pairwise = True
+
+    def __init__(self, records, date_tolerance=0, use_parish=False):
+        self.buckets = defaultdict(list)
+        for rec in records:
+            for key in rec.keys:
+                self.buckets[(rec.male, key)].append(rec.handle)
+
+    def candidates(self, rec):
+        return self.buckets[(rec.male, rec.keys[0])]
+
+
+class MultiKeyBlocking:
+    pairwise = True
+
+    def __init__(self, records, date_tolerance=0, use_parish=False):
+        self.use_parish = use_parish
+        # number of bands on either side that can contain years within the tolerance
+        self.band_range = date_tolerance // YEAR_BAND + 1
+        # (male, surname key) -> (initial, band, parish) -> handles
+        self.index = {}
+        for rec in records:
+            band = self.band(rec)
+            parish = rec.parish if use_parish else None
+            for key in rec.keys:
+                sub = self.index.setdefault((rec.male, key), defaultdict(list))
+                for initial in rec.initials or [""]:
+                    sub[(initial, band, parish)].append(rec.handle)
+
+    def band(self, rec):
+        if rec.year:
+            return rec.year // YEAR_BAND
+        return None
+
+    def candidates(self, rec):
+        band = self.band(rec)
+        result = []
+        seen = set()
+        sub = self.index.get((rec.male, rec.keys[0]), {})
+        for (initial, band2, parish), handles in sub.items():
+            if initial and "" not in rec.initials and initial not in rec.initials:
+                continue
+            if band is not None and band2 is not None and abs(band - band2) > self.band_range:
+                continue
+            if self.use_parish and rec.parish and parish and rec.parish != parish:
+                continue
+            for handle in handles:
+                if handle not in seen:
+                    seen.add(handle)
+                    result.append(handle)
+        return result
+
+
+class SortedNeighbourhood:
+    pairwise = False
+
+    def __init__(self, records, date_tolerance=0, use_parish=False, window=WINDOW):
+        self.window = window
+        self.position = {}
+        self.order = {True: [], False: []}
+        sortable = [((rec.keys[0], rec.name, rec.year or 0), rec) for rec in records]
+        for _key, rec in sorted(sortable, key=lambda item: item[0]):
+            order = self.order[rec.male]
+            self.position[rec.handle] = len(order)
+            order.append(rec.handle)
+
+    def candidates(self, rec):
+        order = self.order[rec.male]
+        i = self.position[rec.handle]
+        return order[max(0, i - self.window) : i + self.window + 1]
+
+
+class MinHashLSH:
+    pairwise = True
+
+    def __init__(self, records, date_tolerance=0, use_parish=False,
+                 bands=MINHASH_BANDS, rows=MINHASH_ROWS):
+        self.bands = bands
+        self.rows = rows
+        self.seeds = [(i * 0x9E3779B1) & 0xFFFFFFFF for i in range(bands * rows)]
+        self.buckets = defaultdict(list)
+        self.signatures = {}
+        for rec in records:
+            signature = self.bucket_keys(rec)
+            self.signatures[rec.handle] = signature
+            for key in signature:
+                self.buckets[key].append(rec.handle)
+
+    def bucket_keys(self, rec):
+        name = " " + rec.name.lower() + " "
+        grams = set(name[i : i + NGRAM] for i in range(len(name) - NGRAM + 1))
+        if not grams:
+            return []
+        hashes = [zlib.crc32(gram.encode("utf-8")) for gram in grams]
+        minhashes = [min(h ^ seed for h in hashes) for seed in self.seeds]
+        return [
+            (rec.male, band, tuple(minhashes[band * self.rows : (band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def candidates(self, rec):
+        result = []
+        seen = set()
+        for key in self.signatures[rec.handle]:
+            for handle in self.buckets[key]:
+                if handle not in seen:
+                    seen.add(handle)
+                    result.append(handle)
+        return result
+
+
+GENERATORS = {
+    "surname": SurnameBlocking,
+    "multikey": MultiKeyBlocking,
+    "sorted": SortedNeighbourhood,
+    "minhash": MinHashLSH,
+}
+
+
+def create(method, records, date_tolerance=0, use_parish=False):
+    generator_class = GENERATORS.get(method, SurnameBlocking)
+    return generator_class(records, date_tolerance=date_tolerance, use_parish=use_parish)
+
+
+def recall(found_map, exhaustive_map):
+    """
+    Returns the share of the matches in exhaustive_map that are also in
+    found_map. Both are maps p1 -> (p2, chance); the direction of a match
+    does not matter.
+    """
+    exhaustive = set(frozenset((p1, p2)) for p1, (p2, _chance) in exhaustive_map.items())
+    if not exhaustive:
+        return 1.0
+    found = set(frozenset((p1, p2)) for p1, (p2, _chance) in found_map.items())
+    return len(found & exhaustive) / len(exhaustive)
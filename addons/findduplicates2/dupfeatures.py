@@ -0,0 +1,768 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2000-2007  Donald N. Allingham
+# Copyright (C) 2020-2025  Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+Per-person comparison features for findduplicates2.
+
+FeatureTable collects, in one pass over the people and one pass over the
+families, everything that the comparison needs: the names, the birth and
+death dates and places, the names of the parents and spouses, and the main
+parents of everybody for the ancestor check. Scorer then compares two
+people using only the table, so the comparison loop does no database
+access.
+
+All names, name parts and place name tokens are interned in a KeyTable:
+each distinct string is stored once and is represented by a small integer
+whose soundex code, first letter and initial flag are computed only once.
+
+The scoring rules are the same as in the original Find Duplicates tool.
+"""
+
+import itertools
+import sys
+
+from array import array
+from collections import namedtuple
+
+from gramps.gen.soundex import soundex
+
+# the parts of a Name that name_match uses, as KeyTable ids; first_names is
+# the tuple of the first name tokens
+NameKey = namedtuple("NameKey", "surnames suffix first_name first_names")
+
+# the parts of a Date that date_match uses; eq is used for Date.is_equal,
+# start and stop are (day, month, year) like in Date.get_start_date
+DateKey = namedtuple("DateKey", "eq compound start stop")
+
+FEMALE = 0      # Person.FEMALE
+NO_PARENT = -1
+
+MOD_RANGE = 4       # Date.MOD_RANGE
+MOD_SPAN = 5        # Date.MOD_SPAN
+MOD_TEXTONLY = 6    # Date.MOD_TEXTONLY
+
+
+def get_surnames(name):
+    """Construct a full surname of the surnames"""
+    return " ".join([surn.get_surname() for surn in name.get_surname_list()])
+
+
+class KeyTable:
+    """
+    Interned strings. Comparing two ids is the same as comparing the
+    strings and comparing their codes is the same as comparing the soundex
+    codes of the strings.
+    """
+
+    def __init__(self):
+        self.ids = {}               # string -> id
+        self.strings = []           # id -> string
+        self.codes = array("i")     # id -> soundex code number
+        self.initials = array("i")  # id -> first character as a number
+        self.is_initial = bytearray()  # id -> 1 if the string is an initial like "J."
+        self.code_numbers = {}      # soundex code -> number
+        self.names = {}             # NameKey -> the same NameKey (interned)
+
+    def key(self, string):
+        i = self.ids.get(string)
+        if i is None:
+            i = len(self.strings)
+            self.ids[string] = i
+            self.strings.append(string)
+            try:
+                code = soundex(string)
+            except UnicodeEncodeError:
+                code = "=" + string  # compare the strings themselves
+            self.codes.append(self.code_numbers.setdefault(code, len(self.code_numbers)))
+            self.initials.append(ord(string[0]) if string else 0)
+            self.is_initial.append(1 if string and is_initial(string) else 0)
+        return i
+
+    def name_key(self, name):
+        if name is None:
+            return None
+        first_name = name.get_first_name()
+        return self.make_name(
+            get_surnames(name),
+            name.get_suffix(),
+            first_name,
+            first_name.replace("-", " ").split(),
+        )
+
+    def make_name(self, surnames, suffix, first_name, first_names):
+        key = self.key
+        namekey = NameKey(
+            key(surnames), key(suffix), key(first_name), tuple(key(n) for n in first_names)
+        )
+        return self.names.setdefault(namekey, namekey)
+
+    def name_text(self, namekey):
+        if namekey is None:
+            return None
+        strings = self.strings
+        return (
+            strings[namekey.surnames],
+            strings[namekey.suffix],
+            strings[namekey.first_name],
+        )
+
+
+def date_key(date):
+    if date is None or date.is_empty():
+        return None
+    modifier = date.get_modifier()
+    if modifier == MOD_TEXTONLY:
+        eq = (date.get_text(),)
+    else:
+        eq = (date.get_calendar(), modifier, date.get_quality(), tuple(date.get_dateval()))
+    return DateKey(
+        eq,
+        modifier in (MOD_RANGE, MOD_SPAN),
+        tuple(date.get_start_date()[0:3]),
+        tuple(date.get_stop_date()[0:3]),
+    )
+
+
+class PersonFeatures:
+    """
+    The comparison features of one person.
+
+    names       NameKeys of the primary and alternate names
+    birth       DateKey or None
+    death       DateKey or None
+    parents     (father NameKey, mother NameKey) of the main parents family
+                or None if there is no such family
+    fathers     (handle, NameKey) of the father of each own family
+    mothers     (handle, NameKey) of the mother of each own family
+    ancestry_change
+                the newest change timestamp of the person, the ancestors and
+                all their parent families (see ancestry_changes)
+    """
+    __slots__ = (
+        "handle",
+        "gramps_id",
+        "index",
+        "gender",
+        "names",
+        "birth",
+        "death",
+        "birth_place",
+        "death_place",
+        "parents",
+        "fathers",
+        "mothers",
+        "ancestry_change",
+    )
+
+    def __init__(self, handle, gramps_id, index, gender, names, birth, death,
+                 birth_place, death_place):
+        self.handle = handle
+        self.gramps_id = gramps_id
+        self.index = index
+        self.gender = gender
+        self.names = names
+        self.birth = birth
+        self.death = death
+        self.birth_place = birth_place
+        self.death_place = death_place
+        self.parents = None
+        self.fathers = ()
+        self.mothers = ()
+        self.ancestry_change = 0
+
+
+class FeatureTable:
+    """
+    Usage:
+
+        table = FeatureTable()
+        for person in db.iter_people():
+            table.add_person(person)
+            if <person is compared>:
+                table.add_features(db, person)
+        table.finish(db)
+
+    All people are added with add_person because the ancestor check and
+    the parent and spouse names need also the people that are not compared.
+    """
+
+    def __init__(self):
+        self.people = {}            # handle -> PersonFeatures
+        self.index = {}             # handle -> index to the arrays below
+        self.primary_names = []     # index -> NameKey
+        self.father = array("i")    # index -> index of the father or NO_PARENT
+        self.mother = array("i")    # index -> index of the mother or NO_PARENT
+        self.level = array("i")     # index -> number of generations of ancestors
+        self.loops = False          # True if somebody is his own ancestor
+        self.places = {}            # place handle -> (title id, token ids) or None
+        self.keys = KeyTable()
+        self.main_family = []       # index -> main parents family handle
+        self.parent_families = []   # index -> all parent family handles
+        self.changes = array("q")   # index -> change timestamp
+        self.families = {}          # handle -> own family handles
+        self.ancestry = None        # ancestryindex.AncestryIndex if available
+
+    def add_person(self, person):
+        self.add(
+            person.handle,
+            self.keys.name_key(person.get_primary_name()),
+            person.get_main_parents_family_handle(),
+            person.get_parent_family_handle_list(),
+            person.change,
+        )
+
+    def add(self, handle, primary_name, main_family, parent_families=(), change=0):
+        self.index[handle] = len(self.primary_names)
+        self.primary_names.append(primary_name)
+        self.main_family.append(main_family)
+        self.parent_families.append(tuple(parent_families))
+        self.changes.append(change)
+
+    def add_features(self, db, person):
+        birth = None
+        ref = person.get_birth_ref()
+        if ref:
+            birth = db.get_event_from_handle(ref.ref)
+        death = None
+        ref = person.get_death_ref()
+        if ref:
+            death = db.get_event_from_handle(ref.ref)
+        features = PersonFeatures(
+            person.handle,
+            person.gramps_id,
+            self.index[person.handle],
+            person.get_gender(),
+            tuple(
+                self.keys.name_key(name)
+                for name in [person.get_primary_name()] + person.get_alternate_names()
+            ),
+            date_key(birth.get_date_object()) if birth else None,
+            date_key(death.get_date_object()) if death else None,
+            birth.get_place_handle() if birth else "",
+            death.get_place_handle() if death else "",
+        )
+        self.people[person.handle] = features
+        self.families[person.handle] = person.get_family_handle_list()
+        return features
+
+    def finish(self, db, progress=None):
+        """
+        Reads the families and the birth and death places.
+        """
+        families = {}
+        family_changes = {}
+        for family in db.iter_families():
+            if progress and progress.step():
+                break
+            families[family.handle] = (family.get_father_handle(), family.get_mother_handle())
+            family_changes[family.handle] = family.change
+        self.link_families(families, family_changes)
+        for features in self.people.values():
+            for place_handle in (features.birth_place, features.death_place):
+                if place_handle and place_handle not in self.places:
+                    place = db.get_place_from_handle(place_handle)
+                    self.add_place(place_handle, place.get_title() if place else "")
+
+    def add_place(self, handle, title):
+        if title:
+            tokens = title.replace(",", " ").split()
+            self.places[handle] = (self.keys.key(title), tuple(self.keys.key(t) for t in tokens))
+        else:
+            self.places[handle] = None
+
+    def place_title(self, handle):
+        place = self.places.get(handle)
+        return self.keys.strings[place[0]] if place else ""
+
+    def link_families(self, families, family_changes=None):
+        """
+        Fills in the parents, spouses and the ancestor arrays. 'families' is
+        a map family handle -> (father handle, mother handle) and
+        'family_changes' a map family handle -> change timestamp.
+        """
+        index = self.index
+        names = self.primary_names
+
+        def parent(handle):
+            if handle and handle in index:
+                return index[handle]
+            return NO_PARENT
+
+        def name_of(handle):
+            if handle and handle in index:
+                return names[index[handle]]
+            return None
+
+        for family_handle in self.main_family:
+            father, mother = families.get(family_handle, (None, None))
+            self.father.append(parent(father))
+            self.mother.append(parent(mother))
+        self.compute_levels()
+
+        for handle, features in self.people.items():
+            family_handle = self.main_family[features.index]
+            if family_handle in families:
+                father, mother = families[family_handle]
+                features.parents = (name_of(father), name_of(mother))
+            fathers = []
+            mothers = []
+            for family_handle in self.families[handle]:
+                father, mother = families.get(family_handle, (None, None))
+                if father:
+                    fathers.append((father, name_of(father)))
+                if mother:
+                    mothers.append((mother, name_of(mother)))
+            features.fathers = tuple(fathers)
+            features.mothers = tuple(mothers)
+        if family_changes is not None:
+            ancestry_changes = self.ancestry_changes(families, family_changes)
+            for features in self.people.values():
+                features.ancestry_change = ancestry_changes[features.index]
+        self.main_family = []
+        self.parent_families = []
+        self.changes = array("q")
+        self.families = {}
+
+    def ancestry_changes(self, families, family_changes):
+        """
+        Returns for each person the newest change timestamp of the person,
+        the ancestors and all their parent families (not only the main
+        ones). Any edit that can change the answer of the ancestor check for
+        a person (a parent added to or removed from a family, a child added
+        to or removed from a family, a family deleted) changes a family or a
+        person in the chain and so gives a newer timestamp.
+        """
+        index = self.index
+        count = len(self.changes)
+        parents = []
+        own = array("q", self.changes)
+        for i, family_handles in enumerate(self.parent_families):
+            indexes = []
+            for family_handle in family_handles:
+                if family_handle not in families:
+                    continue
+                own[i] = max(own[i], family_changes[family_handle])
+                for handle in families[family_handle]:
+                    if handle and handle in index:
+                        indexes.append(index[handle])
+            parents.append(indexes)
+
+        result = array("q", own)
+        state = bytearray(count)    # 0 = not visited, 1 = on the path, 2 = done
+        loops = False
+        for start in range(count):
+            if state[start]:
+                continue
+            stack = [(start, False)]
+            while stack:
+                i, expanded = stack.pop()
+                if not expanded:
+                    if state[i]:
+                        continue
+                    state[i] = 1
+                    stack.append((i, True))
+                    for p in parents[i]:
+                        if not state[p]:
+                            stack.append((p, False))
+                    continue
+                value = result[i]
+                for p in parents[i]:
+                    if state[p] == 1:
+                        loops = True
+                    elif result[p] > value:
+                        value = result[p]
+                result[i] = value
+                state[i] = 2
+        while loops:
+            # a loop in the data: the people on it were done before some of
+            # their ancestors, so propagate until nothing changes
+            loops = False
+            for i in range(count):
+                for p in parents[i]:
+                    if result[p] > result[i]:
+                        result[i] = result[p]
+                        loops = True
+        return result
+
+    def compute_levels(self):
+        """
+        level[i] is the length of the longest chain of ancestors of person i,
+        so every ancestor of a person has a smaller level than the person.
+        If the data has a loop (somebody is his own ancestor) the levels are
+        not used in is_ancestor.
+        """
+        father = self.father
+        mother = self.mother
+        count = len(father)
+        level = array("i", [-1]) * count
+        self.loops = False
+        for start in range(count):
+            if level[start] >= 0:
+                continue
+            stack = [(start, False)]
+            while stack:
+                i, expanded = stack.pop()
+                if not expanded:
+                    if level[i] != -1:
+                        continue
+                    level[i] = -2   # on the current path
+                    stack.append((i, True))
+                    for p in (father[i], mother[i]):
+                        if p != NO_PARENT and level[p] == -1:
+                            stack.append((p, False))
+                    continue
+                value = 0
+                for p in (father[i], mother[i]):
+                    if p == NO_PARENT:
+                        continue
+                    if level[p] == -2:
+                        self.loops = True
+                    else:
+                        value = max(value, level[p] + 1)
+                level[i] = value
+        self.level = level
+
+    def is_ancestor(self, ancestor, person):
+        """
+        True if 'ancestor' is 'person' or one of the ancestors of 'person'
+        through the main parents families. Arguments are indexes.
+        """
+        father = self.father
+        mother = self.mother
+        level = self.level
+        target_level = -1 if self.loops else level[ancestor]
+        stack = [person]
+        seen = set()
+        while stack:
+            i = stack.pop()
+            if i == ancestor:
+                return True
+            if i in seen or level[i] <= target_level:
+                # the ancestors of i are on lower levels than 'ancestor'
+                continue
+            seen.add(i)
+            if father[i] != NO_PARENT:
+                stack.append(father[i])
+            if mother[i] != NO_PARENT:
+                stack.append(mother[i])
+        return False
+
+    def is_related_by_descent(self, p1, p2):
+        """
+        True if either person is an ancestor of the other. The shared
+        ancestry index (the ancestryindex addon) follows all parent
+        families; without it only the main parents families are followed.
+        """
+        if self.ancestry is not None:
+            return self.ancestry.is_related_by_descent(p1.handle, p2.handle)
+        return self.is_ancestor(p2.index, p1.index) or self.is_ancestor(p1.index, p2.index)
+
+    def memory_size(self, samples=1000):
+        """
+        Returns the approximate memory use of the table in bytes. The size of
+        the per-person data is estimated from a sample of people.
+        """
+        size = deep_getsizeof(
+            [self.father, self.mother, self.level, self.places, self.keys.ids,
+             self.keys.strings, self.keys.codes, self.keys.initials,
+             self.keys.is_initial, self.keys.code_numbers],
+            set(),
+        )
+        size += sys.getsizeof(self.keys.names)
+        for container in (self.people, self.index, self.primary_names):
+            size += sys.getsizeof(container)
+        seen = set()
+        people = list(itertools.islice(self.people.values(), samples))
+        if people:
+            sample_size = sum(deep_getsizeof(features, seen) for features in people)
+            size += sample_size * len(self.people) // len(people)
+        handles = list(itertools.islice(self.index, samples))
+        if handles:
+            sample_size = sum(
+                deep_getsizeof(handle, seen) + deep_getsizeof(self.primary_names[self.index[handle]], seen)
+                for handle in handles
+            )
+            size += sample_size * len(self.index) // len(handles)
+        return size
+
+
+def deep_getsizeof(obj, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, array)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_getsizeof(key, seen) + deep_getsizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_getsizeof(item, seen)
+    elif hasattr(obj, "__slots__"):
+        for attr in obj.__slots__:
+            size += deep_getsizeof(getattr(obj, attr, None), seen)
+    return size
+
+
+class Scorer:
+    """
+    Compares two people using the features in a FeatureTable.
+    """
+
+    def __init__(self, table, use_soundex, all_first_names, date_tolerance):
+        self.table = table
+        self.keys = table.keys
+        # without soundex the ids themselves are compared
+        self.codes = table.keys.codes if use_soundex else None
+        self.empty = table.keys.key("")
+        self.use_soundex = use_soundex
+        self.all_first_names = all_first_names
+        self.date_tolerance = date_tolerance
+        self.compared = {}
+
+    def compare_names(self, p1, p2):
+        # compare all alternate names
+        chance = max(
+            self.name_match(name1, name2)
+            for name1, name2 in itertools.product(p1.names, p2.names)
+        )
+        return chance
+
+    def compare_people(self, p1, p2):
+        if (p2.handle, p1.handle) in self.compared:
+            return self.compared[(p2.handle, p1.handle)]
+
+        chance = self.compare_names(p1, p2)
+        if chance == -1:
+            return -1
+
+        value = self.date_match(p1.birth, p2.birth)
+        if value == -1:
+            return -1
+        chance += value
+
+        value = self.place_match(p1.birth_place, p2.birth_place)
+        if value == -1:
+            return -1
+        chance += value
+
+        value = self.place_match(p1.death_place, p2.death_place)
+        if value == -1:
+            return -1
+        chance += value
+
+        if self.table.is_related_by_descent(p1, p2):
+            return -1
+
+        if p1.parents and p2.parents:
+            dad1, mom1 = p1.parents
+            dad2, mom2 = p2.parents
+
+            value = self.name_match(dad1, dad2)
+            if value == -1:
+                return -1
+            chance += value
+
+            value = self.name_match(mom1, mom2)
+            if value == -1:
+                return -1
+            chance += value
+
+        if p1.gender == FEMALE:
+            spouses1 = p1.fathers
+            spouses2 = p2.fathers
+        else:
+            spouses1 = p1.mothers
+            spouses2 = p2.mothers
+        for spouse1_id, spouse1 in spouses1:
+            for spouse2_id, spouse2 in spouses2:
+                if spouse1_id == spouse2_id:
+                    chance += 1
+                else:
+                    value = self.name_match(spouse1, spouse2)
+                    if value != -1:
+                        chance += value
+
+        self.compared[(p1.handle, p2.handle)] = chance
+        return chance
+
+    def name_compare(self, s1, s2):
+        # s1 and s2 are KeyTable ids
+        if self.codes is not None:
+            return self.codes[s1] == self.codes[s2]
+        else:
+            return s1 == s2
+
+    def date_match(self, date1, date2):
+        if date1 is None or date2 is None:
+            return 0
+        if date1.eq == date2.eq:
+            return 1
+
+        if date1.compound or date2.compound:
+            return self.range_compare(date1, date2)
+
+        year1 = date1.start[2]
+        year2 = date2.start[2]
+        if year1 == year2:
+            month1 = date1.start[1]
+            month2 = date2.start[1]
+            if month1 == month2:
+                return 0.75
+            if not month1 or not month2:
+                return 0.75
+            else:
+                return 0.25
+        elif abs(year1 - year2) <= self.date_tolerance:
+            return 0.5
+        else:
+            return -1
+
+    def range_compare(self, date1, date2):
+        # fix the order of dd,mm,yyyy => yyyy,mm,dd
+        start_date_1 = list(reversed(date1.start))
+        start_date_2 = list(reversed(date2.start))
+        stop_date_1 = list(reversed(date1.stop))
+        stop_date_2 = list(reversed(date2.stop))
+
+        # stop date is [0,0,0] if not compound; this makes the code below more simple
+        if not date1.compound:
+            stop_date_1 = start_date_1
+        if not date2.compound:
+            stop_date_2 = start_date_2
+
+        if stop_date_1[1] == 0:
+            stop_date_1[1] = 12
+        if stop_date_1[2] == 0:
+            stop_date_1[2] = 31
+        if stop_date_2[1] == 0:
+            stop_date_2[1] = 12
+        if stop_date_2[2] == 0:
+            stop_date_2[2] = 31
+
+        min_start = min(start_date_1[0], start_date_2[0])
+        max_stop = max(stop_date_1[0], stop_date_2[0])
+        if max_stop - min_start <= self.date_tolerance:
+            if date1.compound and date2.compound:
+                if (
+                    stop_date_1 >= start_date_2 and stop_date_2 >= start_date_1
+                ):  # overlapping ranges
+                    return 0.25
+            elif date1.compound:
+                if (
+                    start_date_1 <= start_date_2 <= stop_date_1
+                ):  # date2 within date1 range
+                    return 0.5
+            elif date2.compound:
+                if (
+                    start_date_2 <= start_date_1 <= stop_date_2
+                ):  # date1 within date2 range
+                    return 0.5
+
+            # no overlap
+            return 0.2
+        return -1
+
+    def name_match(self, name, name1):
+        if not name1 or not name:
+            return 0
+
+        if not self.name_compare(name.surnames, name1.surnames):
+            return -1
+        sfx1 = name.suffix
+        sfx2 = name1.suffix
+        if sfx1 != sfx2:
+            if sfx1 != self.empty and sfx2 != self.empty:
+                return -1
+
+        list1 = name.first_names
+        list2 = name1.first_names
+        if len(list1) == 0 or len(list2) == 0:
+            if self.all_first_names:
+                return -1
+            else:
+                return 0.1
+        if name.first_name == name1.first_name:
+            return 1
+        else:
+            if self.all_first_names:
+                if len(list1) != len(list2):
+                    return -1
+                for n1 in list1:
+                    if all(not self.name_compare(n1, n2) for n2 in list2):
+                        return -1
+                for n2 in list2:
+                    if all(not self.name_compare(n1, n2) for n1 in list1):
+                        return -1
+                return 1
+            if len(list1) < len(list2):
+                return self.list_reduce(list1, list2)
+            else:
+                return self.list_reduce(list2, list1)
+
+    def place_match(self, p1_id, p2_id):
+        if p1_id == p2_id:
+            return 1
+
+        place1 = self.table.places.get(p1_id) if p1_id else None
+        place2 = self.table.places.get(p2_id) if p2_id else None
+
+        if not (place1 and place2):
+            return 0
+        if place1[0] == place2[0]:
+            return 1
+
+        initials = self.keys.initials
+        value = 0
+        for name in place1[1]:
+            for name2 in place2[1]:
+                if name == name2:
+                    value += 0.5
+                elif initials[name] == initials[name2] and self.name_compare(name, name2):
+                    value += 0.25
+        return min(value, 1) if value else -1
+
+    def list_reduce(self, list1, list2):
+        initials = self.keys.initials
+        is_initial = self.keys.is_initial
+        value = 0
+        for name in list1:
+            for name2 in list2:
+                if is_initial[name] and initials[name] == initials[name2]:
+                    value += 0.25
+                elif is_initial[name2] and initials[name2] == initials[name]:
+                    value += 0.25
+                elif name == name2:
+                    value += 0.5
+                elif initials[name] == initials[name2] and self.name_compare(name, name2):
+                    value += 0.25
+        return min(value, 1) if value else -1
+
+
+def is_initial(name):
+    if len(name) > 2:
+        return 0
+    elif len(name) == 2:
+        if name[0] == name[0].upper() and name[1] == ".":
+            return 1
+    else:
+        return name[0] == name[0].upper()
@@ -0,0 +1,345 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2020-2025  Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+The match list of findduplicates2 as a virtual list.
+
+The model keeps only the (chance, handle1, handle2) triples. The texts of
+a row (the names and years of the people and their Gramps ids) are formatted
+only when the tree view needs them, i.e. when the row becomes visible, and
+the texts of the most recently used people are kept in an LRU cache. The
+tree view uses fixed height mode so that it does not need to measure every
+row.
+
+After a merge or a delete only the rows of the affected people are removed
+or refreshed; the rest of the list is not touched.
+"""
+
+from collections import OrderedDict
+
+from gi.repository import GObject
+from gi.repository import Gdk
+from gi.repository import Gtk
+from gi.repository import Pango
+
+from gramps.gui.utils import is_right_click
+
+CACHE_SIZE = 2000  # people whose texts are cached
+
+# model columns, the same as in the earlier ListModel
+COL_RATING = 0
+COL_NAME1 = 1
+COL_NAME2 = 2
+COL_SORT = 3    # 100 - rating, the sort key of the rating column
+COL_ID1 = 4
+COL_ID2 = 5
+COL_OBJECT = 6  # (handle1, handle2)
+
+COLUMN_TYPES = [str, str, str, str, str, str, object]
+
+
+class MatchListModel(GObject.GObject, Gtk.TreeModel):
+    """
+    A Gtk.TreeModel over a list of (chance, handle1, handle2).
+
+    'person_text' is a function that returns (text, gramps_id) for a person
+    handle or None if the person does not exist.
+    """
+
+    def __init__(self, person_text, cache_size=CACHE_SIZE):
+        GObject.GObject.__init__(self)
+        self.person_text = person_text
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # handle -> (text, gramps_id) or None
+        self.rows = []
+        self.stamp = 0
+
+    def set_rows(self, rows):
+        """
+        Replaces all rows. Does not emit signals; detach the model from the
+        view while doing this.
+        """
+        self.rows = list(rows)
+        self.stamp += 1
+
+    def get_texts(self, handle):
+        texts = self.cache.get(handle)
+        if texts is not None or handle in self.cache:
+            self.cache.move_to_end(handle)
+            return texts
+        texts = self.person_text(handle)
+        self.cache[handle] = texts
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return texts
+
+    def row_values(self, index):
+        chance, handle1, handle2 = self.rows[index]
+        texts1 = self.get_texts(handle1) or ("", "")
+        texts2 = self.get_texts(handle2) or ("", "")
+        return [
+            "%5.2f" % chance,
+            texts1[0],
+            texts2[0],
+            "%5.2f" % (100 - chance),
+            texts1[1],
+            texts2[1],
+            (handle1, handle2),
+        ]
+
+    def get_row(self, iter):
+        return self.rows[self.get_index(iter)]
+
+    def get_index(self, iter):
+        index = iter.user_data
+        if index is None:
+            # pygobject stores 0 as None
+            index = 0
+        return index
+
+    def new_iter(self, index):
+        iter = Gtk.TreeIter()
+        iter.stamp = self.stamp
+        iter.user_data = index
+        return iter
+
+    def remove(self, iter):
+        self.remove_rows([self.get_index(iter)])
+
+    def remove_rows(self, indexes):
+        """
+        Removes the rows at 'indexes' and tells the view about each of them.
+        """
+        indexes = sorted(set(indexes), reverse=True)
+        if not indexes:
+            return
+        self.stamp += 1
+        for index in indexes:
+            del self.rows[index]
+            self.row_deleted(Gtk.TreePath.new_from_indices([index]))
+
+    def remove_handles(self, handles):
+        """
+        Removes the rows that contain any of 'handles'.
+        """
+        handles = set(handles)
+        self.remove_rows(
+            index
+            for index, (_chance, handle1, handle2) in enumerate(self.rows)
+            if handle1 in handles or handle2 in handles
+        )
+        for handle in handles:
+            self.cache.pop(handle, None)
+
+    def remove_pairs(self, pairs):
+        """
+        Removes the rows of the (handle1, handle2) pairs in 'pairs'.
+        """
+        pairs = set(pairs)
+        self.remove_rows(
+            index
+            for index, (_chance, handle1, handle2) in enumerate(self.rows)
+            if (handle1, handle2) in pairs
+        )
+
+    def refresh_handles(self, handles):
+        """
+        Formats the rows of 'handles' again, e.g. after the people were
+        merged or edited.
+        """
+        handles = set(handles)
+        for handle in handles:
+            self.cache.pop(handle, None)
+        for index, (_chance, handle1, handle2) in enumerate(self.rows):
+            if handle1 in handles or handle2 in handles:
+                self.row_changed(Gtk.TreePath.new_from_indices([index]), self.new_iter(index))
+
+    def sort(self, column, reverse):
+        """
+        Sorts the rows by a model column. Sorting by a name needs the texts
+        of all people.
+        """
+        if column in (COL_RATING, COL_SORT):
+            reverse = reverse if column == COL_RATING else not reverse
+            self.rows.sort(key=lambda row: row[0], reverse=reverse)
+        else:
+            handle_pos = 1 if column in (COL_NAME1, COL_ID1) else 2
+            text_pos = 0 if column in (COL_NAME1, COL_NAME2) else 1
+
+            def key(row):
+                texts = self.person_text(row[handle_pos])
+                return texts[text_pos] if texts else ""
+
+            self.rows.sort(key=key, reverse=reverse)
+        self.stamp += 1
+
+    # Gtk.TreeModel interface
+
+    def do_get_flags(self):
+        return Gtk.TreeModelFlags.LIST_ONLY
+
+    def do_get_n_columns(self):
+        return len(COLUMN_TYPES)
+
+    def do_get_column_type(self, column):
+        return COLUMN_TYPES[column]
+
+    def do_get_iter(self, path):
+        indices = path.get_indices()
+        if len(indices) != 1 or indices[0] >= len(self.rows):
+            return False, Gtk.TreeIter()
+        return True, self.new_iter(indices[0])
+
+    def do_get_path(self, iter):
+        return Gtk.TreePath.new_from_indices([self.get_index(iter)])
+
+    def do_get_value(self, iter, column):
+        index = self.get_index(iter)
+        if index >= len(self.rows):
+            return None
+        return self.row_values(index)[column]
+
+    def do_iter_next(self, iter):
+        index = self.get_index(iter) + 1
+        if index >= len(self.rows):
+            return False
+        iter.user_data = index
+        return True
+
+    def do_iter_previous(self, iter):
+        index = self.get_index(iter) - 1
+        if index < 0:
+            return False
+        iter.user_data = index
+        return True
+
+    def do_iter_children(self, parent):
+        if parent is None and self.rows:
+            return True, self.new_iter(0)
+        return False, None
+
+    def do_iter_has_child(self, iter):
+        return False
+
+    def do_iter_n_children(self, iter):
+        if iter is None:
+            return len(self.rows)
+        return 0
+
+    def do_iter_nth_child(self, parent, n):
+        if parent is None and n < len(self.rows):
+            return True, self.new_iter(n)
+        return False, None
+
+    def do_iter_parent(self, child):
+        return False, None
+
+
+class MatchList:
+    """
+    Replaces gramps.gui.listmodel.ListModel for the match list: the same
+    columns and the methods that the match window uses, but with a
+    MatchListModel.
+
+    columns:     list of (title, sort column, width); a column without
+                 title is not shown
+    event_func:  called when a row is double-clicked
+    right_click: called when a row is right-clicked
+    """
+
+    def __init__(self, tree, columns, person_text, event_func=None, right_click=None):
+        self.tree = tree
+        self.tree.set_fixed_height_mode(True)
+        self.model = MatchListModel(person_text)
+        self.selection = self.tree.get_selection()
+        self.selection.set_mode(Gtk.SelectionMode.MULTIPLE)
+        self.double_click = event_func
+        self.right_click = right_click
+        self.sort_column = None
+        self.sort_order = Gtk.SortType.ASCENDING
+        self.columns = []
+
+        for cnum, (title, sort_id, width) in enumerate(columns):
+            if not title:
+                continue
+            renderer = Gtk.CellRendererText()
+            renderer.set_fixed_height_from_font(True)
+            renderer.set_property("ellipsize", Pango.EllipsizeMode.END)
+            column = Gtk.TreeViewColumn(title, renderer, text=cnum)
+            column.set_min_width(width)
+            column.set_resizable(True)
+            column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+            if sort_id >= 0:
+                column.set_clickable(True)
+                column.connect("clicked", self.__column_clicked, sort_id)
+            self.columns.append(column)
+            self.tree.append_column(column)
+
+        self.tree.set_model(self.model)
+        self.tree.connect("button-press-event", self.__button_press)
+
+    def set_rows(self, rows):
+        """
+        Replaces the contents of the list. 'rows' is a list of
+        (chance, handle1, handle2) in the order of decreasing chance.
+        """
+        self.tree.set_model(None)
+        self.model.set_rows(rows)
+        if self.sort_column is not None:
+            self.model.sort(self.sort_column, self.sort_order == Gtk.SortType.DESCENDING)
+        self.tree.set_model(self.model)
+
+    def __column_clicked(self, column, sort_id):
+        if self.sort_column == sort_id and self.sort_order == Gtk.SortType.ASCENDING:
+            self.sort_order = Gtk.SortType.DESCENDING
+        else:
+            self.sort_order = Gtk.SortType.ASCENDING
+        self.sort_column = sort_id
+        for col in self.columns:
+            col.set_sort_indicator(col is column)
+        column.set_sort_order(self.sort_order)
+        self.tree.set_model(None)
+        self.model.sort(sort_id, self.sort_order == Gtk.SortType.DESCENDING)
+        self.tree.set_model(self.model)
+
+    def __button_press(self, obj, event):
+        if event.type == Gdk.EventType.DOUBLE_BUTTON_PRESS and event.button == 1:
+            if self.double_click:
+                self.double_click(obj)
+                return True
+        elif is_right_click(event):
+            if self.right_click:
+                self.right_click(obj, event)
+                return True
+        return False
+
+    def get_object(self, iter):
+        _chance, handle1, handle2 = self.model.get_row(iter)
+        return (handle1, handle2)
+
+    def get_selected_objects(self):
+        (model, paths) = self.selection.get_selected_rows()
+        return [self.get_object(model.get_iter(path)) for path in paths]
+
+    def remove_handles(self, handles):
+        self.model.remove_handles(handles)
+
+    def refresh_handles(self, handles):
+        self.model.refresh_handles(handles)
@@ -0,0 +1,298 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2020-2025  Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+Bulk merge of many people for findduplicates2.
+
+MergePersonQuery merges one pair at a time: it commits the primary person,
+every family of the person and every person or note that refers to the
+merged person. When the same people or families are involved in many
+pairs they are read and written again for every pair.
+
+BulkMerge does the same in phases for all merge sets (see
+DuplicatePeopleToolMatches.genmerges) at once:
+
+load        read all people of the merge sets and the families they belong to
+merge       merge the person data into the primary persons (in memory)
+references  replace the references to the merged people; every family,
+            person and note is written once even if it refers to many
+            merged people
+commit      write the primary persons
+remove      remove the merged people
+complex     merge sets that need a family merge (the primary person would
+            have two families with the same spouse) or that are not allowed
+            are handled with MergePersonQuery, one pair at a time
+
+A merge set is not merged at all if some other object than a person, a
+family or a note refers to a merged person; MergePersonQuery raises
+MergeError for such references. The set is reported in 'errors'.
+
+The caller gives the transaction so that the whole merge is one undo step.
+"""
+
+import time
+
+from gramps.gen.const import GRAMPS_LOCALE as glocale
+from gramps.gen.errors import MergeError
+from gramps.gen.merge import MergePersonQuery
+
+_ = glocale.translation.sgettext
+
+
+class BulkMerge:
+    """
+    Usage:
+
+        merger = BulkMerge(db, mergesets, prepare)
+        with DbTxn(...) as trans:
+            merger.execute(trans)
+        print(merger.timings_text())
+
+    'mergesets' is a list of handle lists, the first handle in each list is
+    the primary person. 'prepare' is an optional function that is called for
+    every person before the merge; it can modify the person and must return
+    True if it did so.
+    """
+
+    def __init__(self, db, mergesets, prepare=None):
+        self.db = db
+        self.mergesets = [list(mergeset) for mergeset in mergesets]
+        self.prepare = prepare
+        self.timings = []   # list of (phase, seconds)
+        self.errors = []    # list of (phoenix handle, titanic handle, message)
+        self.merged = 0     # number of people merged away
+        self.complex = 0    # number of merge sets handled with MergePersonQuery
+        self.start = None
+
+    def phase(self, name):
+        now = time.time()
+        if self.start is not None:
+            self.timings.append((self.phase_name, now - self.start))
+        self.phase_name = name
+        self.start = now
+
+    def execute(self, trans):
+        self.phase("load")
+        remap = {}  # titanic handle -> phoenix handle
+        for mergeset in self.mergesets:
+            for titanic_handle in mergeset[1:]:
+                remap[titanic_handle] = mergeset[0]
+
+        people = {}
+        for mergeset in self.mergesets:
+            for handle in mergeset:
+                person = self.db.get_person_from_handle(handle)
+                if person is None:
+                    continue
+                if self.prepare and self.prepare(person):
+                    self.db.commit_person(person, trans)
+                people[handle] = person
+        families = {}
+        for person in people.values():
+            for family_handle in person.get_family_handle_list() + person.get_parent_family_handle_list():
+                if family_handle not in families:
+                    families[family_handle] = self.db.get_family_from_handle(family_handle)
+
+        backlinks = {
+            titanic_handle: list(self.db.find_backlink_handles(titanic_handle))
+            for titanic_handle in remap
+            if titanic_handle in people
+        }
+
+        simple = []
+        family_merges = []
+        for mergeset in self.mergesets:
+            mergeset = [handle for handle in mergeset if handle in people]
+            if len(mergeset) < 2:
+                continue
+            if not self.check_references(mergeset, backlinks):
+                continue
+            if self.needs_family_merge(mergeset, people, families, remap):
+                family_merges.append(mergeset)
+            elif self.check(mergeset, people):
+                simple.append(mergeset)
+        # only the simple merge sets are merged here
+        remap = {
+            titanic_handle: mergeset[0] for mergeset in simple for titanic_handle in mergeset[1:]
+        }
+
+        self.phase("merge")
+        phoenixes = {}
+        for mergeset in simple:
+            phoenix = people[mergeset[0]]
+            for titanic_handle in mergeset[1:]:
+                phoenix.merge(people[titanic_handle])
+                self.merged += 1
+            phoenixes[phoenix.handle] = phoenix
+
+        self.phase("references")
+        self.replace_family_references(phoenixes, families, remap, trans)
+        self.replace_other_references(phoenixes, remap, backlinks, trans)
+
+        self.phase("commit")
+        for phoenix in phoenixes.values():
+            self.db.commit_person(phoenix, trans)
+
+        self.phase("remove")
+        default_handle = self.db.get_default_handle()
+        if default_handle in remap:
+            self.db.set_default_person_handle(remap[default_handle])
+        for titanic_handle in remap:
+            self.db.remove_person(titanic_handle, trans)
+
+        self.phase("complex")
+        for mergeset in family_merges:
+            self.merge_one_by_one(mergeset, trans)
+        self.phase(None)
+
+    def check(self, mergeset, people):
+        """
+        The checks of MergePersonQuery: spouses or a parent and a child
+        cannot be merged. The families of the earlier people in the set are
+        included because the merges are done one after the other.
+        """
+        phoenix = people[mergeset[0]]
+        own = set(phoenix.get_family_handle_list())
+        parents = set(phoenix.get_parent_family_handle_list())
+        for titanic_handle in mergeset[1:]:
+            titanic = people[titanic_handle]
+            own2 = set(titanic.get_family_handle_list())
+            parents2 = set(titanic.get_parent_family_handle_list())
+            if own & own2:
+                message = _(
+                    "Spouses cannot be merged. To merge these "
+                    "people, you must first break the relationship"
+                    " between them."
+                )
+            elif own & parents2 or own2 & parents:
+                message = _(
+                    "A parent and child cannot be merged. To merge "
+                    "these people, you must first break the relatio"
+                    "nship between them."
+                )
+            else:
+                own |= own2
+                parents |= parents2
+                continue
+            self.errors.append((phoenix.handle, titanic_handle, message))
+            return False
+        return True
+
+    def check_references(self, mergeset, backlinks):
+        """
+        The reference check of MergePersonQuery: only persons, families and
+        notes can refer to a merged person.
+        """
+        for titanic_handle in mergeset[1:]:
+            for classname, _handle in backlinks[titanic_handle]:
+                if classname not in ("Person", "Family", "Note"):
+                    message = _(
+                        "Encounter an object of type %s that has "
+                        "a person reference."
+                    ) % classname
+                    self.errors.append((mergeset[0], titanic_handle, message))
+                    return False
+        return True
+
+    def needs_family_merge(self, mergeset, people, families, remap):
+        """
+        True if the primary person would get two families with the same
+        parents; MergePersonQuery merges such families.
+        """
+        seen = set()
+        for handle in mergeset:
+            for family_handle in people[handle].get_family_handle_list():
+                family = families[family_handle]
+                if family is None:
+                    continue
+                father = family.get_father_handle()
+                mother = family.get_mother_handle()
+                parents = (remap.get(father, father), remap.get(mother, mother))
+                if parents in seen:
+                    return True
+                seen.add(parents)
+        return False
+
+    def replace_family_references(self, phoenixes, families, remap, trans):
+        for family_handle in {
+            family_handle
+            for phoenix in phoenixes.values()
+            for family_handle in phoenix.get_family_handle_list() + phoenix.get_parent_family_handle_list()
+        }:
+            family = families.get(family_handle)
+            if family is None:
+                continue
+            handles = [family.get_father_handle(), family.get_mother_handle()]
+            handles += [ref.ref for ref in family.get_child_ref_list()]
+            titanics = [handle for handle in handles if handle in remap]
+            if not titanics:
+                continue
+            for titanic_handle in titanics:
+                family.replace_handle_reference("Person", titanic_handle, remap[titanic_handle])
+            self.db.commit_family(family, trans)
+
+    def replace_other_references(self, phoenixes, remap, backlinks, trans):
+        """
+        Persons (associations) and notes (links) that refer to the merged
+        people. If the referring person was itself merged then its
+        references are now in the primary person. 'backlinks' maps a merged
+        person to the (class name, handle) of the objects referring to it;
+        check_references has made sure there are no other classes than
+        these and families.
+        """
+        objects = {}  # (class name, handle) -> (object, [titanic handles])
+        for titanic_handle in remap:
+            for classname, handle in backlinks[titanic_handle]:
+                if classname == "Family":
+                    continue  # see replace_family_references
+                if classname == "Person":
+                    handle = remap.get(handle, handle)
+                key = (classname, handle)
+                if key not in objects:
+                    if classname == "Person" and handle in phoenixes:
+                        obj = phoenixes[handle]
+                    else:
+                        obj = self.db.method("get_%s_from_handle", classname)(handle)
+                    objects[key] = (obj, [])
+                objects[key][1].append(titanic_handle)
+        for (classname, handle), (obj, titanics) in objects.items():
+            if obj is None:
+                continue
+            for titanic_handle in titanics:
+                obj.replace_handle_reference("Person", titanic_handle, remap[titanic_handle])
+            if not (classname == "Person" and handle in phoenixes):
+                self.db.method("commit_%s", classname)(obj, trans)
+
+    def merge_one_by_one(self, mergeset, trans):
+        phoenix_handle = mergeset[0]
+        for titanic_handle in mergeset[1:]:
+            phoenix = self.db.get_person_from_handle(phoenix_handle)
+            titanic = self.db.get_person_from_handle(titanic_handle)
+            try:
+                query = MergePersonQuery(self.db, phoenix, titanic)
+            except MergeError as err:
+                self.errors.append((phoenix_handle, titanic_handle, str(err)))
+                continue
+            query.execute(trans=trans)
+            self.merged += 1
+        self.complex += 1
+
+    def timings_text(self):
+        return ", ".join("{} {:.2f}s".format(name, seconds) for name, seconds in self.timings)
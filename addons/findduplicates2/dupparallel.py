@@ -0,0 +1,146 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2020-2025  Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+Parallel scoring for findduplicates2.
+
+The feature table, the candidate generator and the exclusions are given to
+each worker process once, when the pool is created. After that a task is
+just a list of person handles from one surname bucket and the worker sends
+back the (p1, p2, chance) triples that reach the threshold.
+"""
+
+import multiprocessing
+
+from collections import Counter
+from collections import defaultdict
+
+import dupfeatures
+
+CHUNK_SIZE = 200    # maximum number of people in one task
+POLL_INTERVAL = 0.1
+
+_worker = None  # the state of a worker process, set in init_worker
+
+
+def init_worker(table, generator, records, options, excluded, thresh, only):
+    global _worker
+    _worker = (
+        dupfeatures.Scorer(table, *options),
+        table.people,
+        generator,
+        records,
+        excluded,
+        thresh,
+        only,
+    )
+
+
+def score_bucket(p1keys):
+    scorer, people, generator, records, excluded, thresh, only = _worker
+    results = []
+    comparisons = 0
+    candidate_counts = Counter()
+    for p1key in p1keys:
+        p1 = people[p1key]
+        p1_changed = only is None or p1key in only
+        candidates = generator.candidates(records[p1key])
+        candidate_counts[len(candidates) - 1] += 1
+        for p2key in candidates:
+            if p1key == p2key:
+                continue
+            if not p1_changed and p2key not in only:
+                continue
+            if (p1key, p2key) in excluded or (p2key, p1key) in excluded:
+                continue
+            comparisons += 1
+            chance = scorer.compare_people(p1, people[p2key])
+            if chance >= thresh:
+                results.append((p1key, p2key, chance))
+    return p1keys, results, comparisons, candidate_counts
+
+
+def buckets(p1keys, records, chunk_size=CHUNK_SIZE):
+    """
+    Groups the people by gender and primary surname key. Large buckets are
+    split so that the progress is updated often enough and the work is
+    spread evenly over the processes.
+    """
+    groups = defaultdict(list)
+    for p1key in p1keys:
+        rec = records[p1key]
+        groups[(rec.male, rec.keys[0])].append(p1key)
+    for group in sorted(groups.values(), key=len, reverse=True):
+        for i in range(0, len(group), chunk_size):
+            yield group[i : i + chunk_size]
+
+
+class ScoringPool:
+    """
+    Usage:
+
+        with ScoringPool(procs, table, generator, records, options, excluded, thresh, only) as pool:
+            for p1keys, results, comparisons, candidate_counts in pool.imap(tasks, poll):
+                ...
+
+    'poll' is called about ten times a second while waiting for results;
+    if it returns True then the remaining tasks are canceled. If 'only' is
+    given then only pairs with at least one person in 'only' are compared.
+    """
+
+    def __init__(self, procs, table, generator, records, options, excluded, thresh, only=None):
+        # fork does not need to pickle the table and does not run the main
+        # module of Gramps again in the workers
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        self.pool = context.Pool(
+            procs,
+            initializer=init_worker,
+            initargs=(table, generator, records, options, excluded, thresh, only),
+        )
+        self.canceled = False
+
+    def imap(self, tasks, poll=None):
+        results = self.pool.imap_unordered(score_bucket, tasks)
+        while True:
+            try:
+                if poll is None:
+                    yield results.next()
+                else:
+                    yield results.next(timeout=POLL_INTERVAL)
+            except StopIteration:
+                return
+            except multiprocessing.TimeoutError:
+                if poll():
+                    self.cancel()
+                    return
+
+    def cancel(self):
+        self.canceled = True
+        self.pool.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.pool.terminate()
+        self.pool.join()
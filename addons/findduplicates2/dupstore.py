@@ -0,0 +1,142 @@
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2020-2025  Kari Kujansuu
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""
+Persistent results for incremental searches in findduplicates2.
+
+The store lives in the same exclusions.db file as the exclusions. It keeps
+
+features    the comparison features of every person from the previous run
+            and the change timestamp of the person
+pairs       all scored pairs that reached the threshold
+settings    the options that the pairs were computed with
+
+A person is "dirty" if the person was changed (the change timestamp
+differs) or if the features differ from the stored ones. The features
+contain the birth and death dates, the place titles and the names of the
+parents and spouses, so editing an event, a place or a relative also makes
+the person dirty. They also contain the newest change timestamp of the
+ancestors and their parent families (FeatureTable.ancestry_changes), so
+any edit that can change the ancestor check, however many generations up,
+makes the person dirty too. Only pairs with at least one dirty person are
+scored again; the other pairs are taken from the store.
+"""
+
+import json
+import pickle
+
+SCHEMA = [
+    "create table if not exists features (handle varchar primary key, change integer, data blob)",
+    "create table if not exists pairs (handle1 varchar, handle2 varchar, chance real, primary key(handle1, handle2))",
+    "create index if not exists pairs_handle2 on pairs(handle2)",
+    "create table if not exists settings (key varchar primary key, value varchar)",
+]
+
+
+def feature_data(features, table):
+    """
+    Returns the features of a person as bytes that can be compared with
+    the stored ones. The names and places are converted back to strings
+    because the ids and the index change between runs.
+    """
+    name_text = table.keys.name_text
+    return pickle.dumps(
+        (
+            features.gramps_id,
+            features.gender,
+            tuple(name_text(name) for name in features.names),
+            features.birth,
+            features.death,
+            table.place_title(features.birth_place),
+            table.place_title(features.death_place),
+            tuple(name_text(name) for name in features.parents) if features.parents else None,
+            tuple((handle, name_text(name)) for handle, name in features.fathers),
+            tuple((handle, name_text(name)) for handle, name in features.mothers),
+            features.ancestry_change,
+        ),
+        protocol=4,
+    )
+
+
+class CandidateStore:
+    def __init__(self, conn):
+        self.conn = conn
+        for sql in SCHEMA:
+            self.conn.execute(sql)
+        self.conn.commit()
+
+    def changed_people(self, table, changes, settings):
+        """
+        Returns the set of dirty handles, or None if everything must be
+        scored (first run or the options changed). 'changes' maps handle ->
+        change timestamp. Nothing is written before save() is called, so an
+        interrupted search does not leave the store in a partial state.
+        """
+        self.settings = json.dumps(settings, sort_keys=True)
+        cursor = self.conn.cursor()
+        row = cursor.execute("select value from settings where key = 'options'").fetchone()
+        self.reset = row is None or row[0] != self.settings
+        stored = {}
+        if not self.reset:
+            stored = {
+                handle: (change, data)
+                for handle, change, data in cursor.execute("select handle, change, data from features")
+            }
+        cursor.close()
+
+        dirty = set()
+        self.rows = []
+        for handle, features in table.people.items():
+            change = changes[handle]
+            data = feature_data(features, table)
+            if stored.get(handle) != (change, data):
+                dirty.add(handle)
+                self.rows.append((handle, change, data))
+        self.removed = [handle for handle in stored if handle not in table.people]
+        if self.reset or not stored:
+            return None
+        return dirty | set(self.removed)
+
+    def save(self, pairs, dirty):
+        """
+        Stores the features found by changed_people() and replaces the
+        stored pairs of the dirty people with 'pairs' (a list of (handle1,
+        handle2, chance)). Returns all stored pairs.
+        """
+        cursor = self.conn.cursor()
+        if self.reset:
+            cursor.execute("delete from features")
+            cursor.execute("insert or replace into settings (key, value) values ('options', ?)", [self.settings])
+        cursor.executemany("insert or replace into features (handle, change, data) values (?, ?, ?)", self.rows)
+        cursor.executemany("delete from features where handle = ?", [(handle,) for handle in self.removed])
+        if dirty is None:
+            cursor.execute("delete from pairs")
+        else:
+            handles = [(handle,) for handle in dirty]
+            cursor.executemany("delete from pairs where handle1 = ?", handles)
+            cursor.executemany("delete from pairs where handle2 = ?", handles)
+        cursor.executemany(
+            "insert or replace into pairs (handle1, handle2, chance) values (?, ?, ?)", pairs
+        )
+        self.conn.commit()
+        result = list(cursor.execute("select handle1, handle2, chance from pairs order by rowid"))
+        cursor.close()
+        self.rows = []
+        return result
@@ -29,10 +29,10 @@ from gramps.gui.editors.editperson import EditPerson
 """Tools/Database Processing/Find Possible Duplicate People"""
 
 import csv
-import itertools
 import os
 import random
 import sqlite3
+import sys
 import time
 import traceback
 
@@ -59,23 +59,31 @@ from gramps.gen.display.name import displayer as name_displayer
 from gramps.gen.display.place import displayer as place_displayer
 from gramps.gen.errors import MergeError
 from gramps.gen.errors import WindowActiveError
-from gramps.gen.lib import Event, Person, Span
+from gramps.gen.lib import Person, Span
 from gramps.gen.merge import MergePersonQuery
 from gramps.gen.plug.report import utils
-from gramps.gen.soundex import soundex, compare
+from gramps.gen.soundex import soundex
 
 from gramps.gui.dialog import ErrorDialog, WarningDialog
 from gramps.gui.dialog import RunDatabaseRepair
 from gramps.gui.dialog import OkDialog
 from gramps.gui.display import display_help
 from gramps.gui.glade import Glade
-from gramps.gui.listmodel import ListModel
 from gramps.gui.managedwindow import ManagedWindow
 
 # from gramps.gui.merge import MergePerson
 from gramps.gui.plug import tool
 from gramps.gui.utils import ProgressMeter
 
+import dupbatch
+import dupblocking
+import dupfeatures
+import dupmatchlist
+import dupmerge
+import dupparallel
+import dupstore
+from dupfeatures import get_surnames
+
 _ = glocale.translation.sgettext
 
 
@@ -90,6 +98,13 @@ _val2label = {
     2.0: _("High"),
 }
 
+_blocking2label = {
+    "surname": _("Same surname (all pairs)"),
+    "multikey": _("Surname, birth year and first name initial"),
+    "sorted": _("Sorted neighbourhood"),
+    "minhash": _("Similar names (MinHash)"),
+}
+
 WIKI_HELP_PAGE = "%s_-_Tools" % URL_MANUAL_PAGE
 WIKI_HELP_SEC = _("manual|Find_Possible_Duplicate_People")
 
@@ -107,16 +122,6 @@ config.register("defaults.last_filename", "")
 #
 #
 # -------------------------------------------------------------------------
-def is_initial(name):
-    if len(name) > 2:
-        return 0
-    elif len(name) == 2:
-        if name[0] == name[0].upper() and name[1] == ".":
-            return 1
-    else:
-        return name[0] == name[0].upper()
-
-
 class NumberEntry(Gtk.Entry):
     def __init__(self):
         Gtk.Entry.__init__(self)
@@ -160,6 +165,8 @@ class Tool(tool.Tool, ManagedWindow):
         ManagedWindow.__init__(self, user.uistate, [], self.__class__)
         self.dbstate = dbstate
         self.db = dbstate.db
+        self.writer = None
+        self.stats = None
 
         if not user.uistate:
             self.run_cli()
@@ -177,7 +184,7 @@ class Tool(tool.Tool, ManagedWindow):
         dbstate.connect("database-changed", self.db_changed)
 
         top = Glade(
-            toplevel="finddupes", also_load=["liststore1", "adjustment1", "adjustment2"]
+            toplevel="finddupes", also_load=["liststore1", "adjustment1", "adjustment2", "adjustment3"]
         )
 
         # retrieve options
@@ -189,6 +196,11 @@ class Tool(tool.Tool, ManagedWindow):
         self.date_tolerance = self.options.handler.options_dict["date_tolerance"]
         self.random_percent = self.options.handler.options_dict["random_percent"]
         self.use_exclusions = self.options.handler.options_dict["use_exclusions"]
+        self.blocking = self.options.handler.options_dict["blocking"]
+        self.use_parish = self.options.handler.options_dict["use_parish"]
+        self.measure_recall = self.options.handler.options_dict["measure_recall"]
+        self.procs = self.options.handler.options_dict["procs"]
+        self.incremental = self.options.handler.options_dict["incremental"]
 
         my_menu = Gtk.ListStore(str, object)
         for val in sorted(_val2label):
@@ -221,6 +233,24 @@ class Tool(tool.Tool, ManagedWindow):
         self.random_percent_obj = top.get_object("random_percent")
         self.random_percent_obj.set_value(self.random_percent)
 
+        self.blocking_obj = top.get_object("blocking")
+        for method in dupblocking.BLOCKING_METHODS:
+            self.blocking_obj.append(method, _blocking2label[method])
+        if not self.blocking_obj.set_active_id(self.blocking):
+            self.blocking_obj.set_active_id("surname")
+
+        self.use_parish_obj = top.get_object("use_parish")
+        self.use_parish_obj.set_active(self.use_parish)
+
+        self.measure_recall_obj = top.get_object("measure_recall")
+        self.measure_recall_obj.set_active(self.measure_recall)
+
+        self.procs_obj = top.get_object("procs")
+        self.procs_obj.set_value(self.procs)
+
+        self.incremental_obj = top.get_object("incremental")
+        self.incremental_obj.set_active(self.incremental)
+
         window = top.toplevel
         self.set_window(
             window, top.get_object("title"), _("Find Possible Duplicate People")
@@ -254,16 +284,63 @@ class Tool(tool.Tool, ManagedWindow):
         self.skip_no_surname = self.options.handler.options_dict["skip_no_surname"]
         self.skip_no_birth_date = self.options.handler.options_dict["skip_no_birth_date"]
         self.use_exclusions = self.options.handler.options_dict["use_exclusions"]
+        self.blocking = self.options.handler.options_dict["blocking"]
+        self.use_parish = self.options.handler.options_dict["use_parish"]
+        self.measure_recall = self.options.handler.options_dict["measure_recall"]
+        self.procs = self.options.handler.options_dict["procs"]
+        self.incremental = self.options.handler.options_dict["incremental"]
+        output = self.options.handler.options_dict["output"]
+        fmt = self.options.handler.options_dict["format"]
         self.progress = None
+        self.setup_db()
+
+        self.stats = dupbatch.BatchStats()
+        if output or fmt != "text":
+            self.run_batch(output, fmt)
+            return
 
         self.find_potentials(self.threshold, self.random_percent)
+        self.stats.done()
+        print(self.blocking_stats_text())
+        print(self.stats.report(len(self.map)))
         for p1key, (p2key, chance) in sorted(self.map.items(), key=lambda item: item[1][1] ,reverse=True):
             p1 = self.db.get_person_from_handle(p1key)
             p2 = self.db.get_person_from_handle(p2key)
             name1 = name_displayer.display(p1)
             name2 = name_displayer.display(p2)
             print(f"{chance:2.2f} {p1.gramps_id:10.10} {name1:30.30} -  {p2.gramps_id:10.10} {name2:30.30}")
-            
+
+    def run_batch(self, output, fmt):
+        """
+        Headless batch mode: every pair that reaches the threshold is written
+        to 'output' (or the standard output) as soon as it is found, not
+        only the best match of each person. The statistics go to the
+        standard error so that they do not mix with the matches.
+        """
+        self.writer = dupbatch.MatchWriter(output, fmt, self.person_row)
+        try:
+            self.find_potentials(self.threshold, self.random_percent)
+        finally:
+            self.writer.close()
+        self.stats.done()
+        print(self.blocking_stats_text(), file=sys.stderr)
+        print(self.stats.report(self.writer.count), file=sys.stderr)
+
+    def person_row(self, handle):
+        person = self.db.get_person_from_handle(handle)
+        name = name_displayer.display(person) + " " + get_years(self.dbstate, person)
+        return (person.gramps_id, name)
+
+    def set_pass(self, text, count):
+        if self.progress:
+            self.progress.set_pass(text, count)
+        if self.stats:
+            self.stats.set_pass(text)
+
+    def found(self, p1key, p2key, chance):
+        if self.writer:
+            self.writer.write(p1key, p2key, chance)
+
     def db_changed(self, db):
         self.close()
 
@@ -295,17 +372,6 @@ class Tool(tool.Tool, ManagedWindow):
         self.conn.commit()
                 
 
-    def ancestors_of(self, p1_id, id_list):
-        if (not p1_id) or (p1_id in id_list):
-            return
-        id_list.append(p1_id)
-        p1 = self.db.get_person_from_handle(p1_id)
-        f1_id = p1.get_main_parents_family_handle()
-        if f1_id:
-            f1 = self.db.get_family_from_handle(f1_id)
-            self.ancestors_of(f1.get_father_handle(), id_list)
-            self.ancestors_of(f1.get_mother_handle(), id_list)
-
     def on_merge_ok_clicked(self, obj):
         if self.matches_list and self.matches_list.opened:
             self.matches_list.close()
@@ -316,6 +382,11 @@ class Tool(tool.Tool, ManagedWindow):
         self.skip_no_birth_date = int(self.skip_no_birth_date_obj.get_active())
         self.use_exclusions = int(self.use_exclusions_obj.get_active())
         self.random_percent = int(self.random_percent_obj.get_value())
+        self.blocking = self.blocking_obj.get_active_id() or "surname"
+        self.use_parish = int(self.use_parish_obj.get_active())
+        self.measure_recall = int(self.measure_recall_obj.get_active())
+        self.procs = int(self.procs_obj.get_value())
+        self.incremental = int(self.incremental_obj.get_active())
         try:
             self.date_tolerance = int(self.date_tolerance_obj.get_value())
         except:
@@ -352,6 +423,11 @@ class Tool(tool.Tool, ManagedWindow):
         self.options.handler.options_dict["skip_no_birth_date"] = self.skip_no_birth_date
         self.options.handler.options_dict["use_exclusions"] = self.use_exclusions
         self.options.handler.options_dict["random_percent"] = self.random_percent
+        self.options.handler.options_dict["blocking"] = self.blocking
+        self.options.handler.options_dict["use_parish"] = self.use_parish
+        self.options.handler.options_dict["measure_recall"] = self.measure_recall
+        self.options.handler.options_dict["procs"] = self.procs
+        self.options.handler.options_dict["incremental"] = self.incremental
         # Save options
         self.options.handler.save_options()
 
@@ -373,6 +449,7 @@ class Tool(tool.Tool, ManagedWindow):
                     self.excluded,
                     self.update,
                     time_elapsed=t2 - t1,
+                    blocking_stats=self.blocking_stats_text(),
                 )
             except WindowActiveError:
                 pass
@@ -441,21 +518,21 @@ class Tool(tool.Tool, ManagedWindow):
             pass
 
     def find_potentials(self, thresh, random_percent):
-        index = 0
-        males = {}
-        females = {}
         self.map = {}
-        self.compared = {}
+        self.recall = None
 
         length = self.db.get_number_of_people()
 
-        if self.progress: self.progress.set_pass(_("Pass 1: Building preliminary lists"), length)
+        self.set_pass(_("Pass 1: Building preliminary lists"), length)
 
-        pmap = {}  # build a cache of all Person objects
-        for p1_id in self.db.iter_person_handles():
+        table = dupfeatures.FeatureTable()
+        records = {}
+        changes = {}
+        for p1 in self.db.iter_people():
             if self.progress and self.progress.step():
                 break  # canceled
-            p1 = self.db.get_person_from_handle(p1_id)
+            p1_id = p1.handle
+            table.add_person(p1)
             if p1.get_primary_name().get_regular_name() == "N N":
                 continue
 
@@ -474,77 +551,244 @@ class Tool(tool.Tool, ManagedWindow):
                 if surnames == "":
                     continue
 
-            if self.skip_no_birth_date:
-                ref = p1.get_birth_ref()
-                if not ref:
-                    continue
-                birth = self.dbstate.db.get_event_from_handle(ref.ref)
-                if not birth.get_date_object().is_valid():
-                    continue
+            features = table.add_features(self.db, p1)
+            changes[p1_id] = p1.change
+            records[p1_id] = self.make_record(p1, features)
 
-            for name in self.getnames(p1):
-                surnames = get_surnames(name)
-                key = self.gen_key(surnames)
-                if p1.get_gender() == Person.MALE:
-                    if key in males:
-                        males[key].append(p1_id)
-                    else:
-                        males[key] = [p1_id]
-                else:
-                    if key in females:
-                        females[key].append(p1_id)
-                    else:
-                        females[key] = [p1_id]
-            pmap[p1_id] = p1
+        self.set_pass(_("Pass 2: Reading families"), self.db.get_number_of_families())
+        table.finish(self.db, self.progress)
+        table.ancestry = get_ancestry_index(self.db)
+        self.table = table
+        self.scorer = dupfeatures.Scorer(
+            table, self.use_soundex, self.all_first_names, self.date_tolerance
+        )
 
-        if self.progress: self.progress.set_pass(_("Pass 2: Calculating potential matches"), length)
+        exhaustive = dupblocking.SurnameBlocking(records.values())
+        if self.blocking == "surname":
+            generator = exhaustive
+        else:
+            generator = dupblocking.create(
+                self.blocking, records.values(), self.date_tolerance, self.use_parish
+            )
 
-        for i, p1 in enumerate(pmap.values()):
-            t1 = time.time()
+        # the stored results are only valid for complete runs
+        store = None
+        dirty = None
+        self.dirty_count = None
+        if self.incremental and random_percent >= 100:
+            store = dupstore.CandidateStore(self.conn)
+            dirty = store.changed_people(table, changes, self.search_settings(thresh))
+            if not generator.pairwise:
+                # the candidates of the unchanged people can change too
+                dirty = None
+            self.dirty_count = len(table.people) if dirty is None else len(dirty)
+
+        # decide the random sample first so that the recall run uses the same people
+        sample = [p1 for p1 in table.people.values() if random.random() < random_percent / 100]
+        # the comparisons that the generator skips compared to the original
+        # method; the original method itself skips nothing
+        self.exhaustive_comparisons = None
+        if generator is not exhaustive:
+            self.exhaustive_comparisons = sum(
+                len(exhaustive.candidates(records[p1.handle])) - 1 for p1 in sample
+            )
+            self.generated_comparisons = sum(
+                len(generator.candidates(records[p1.handle])) - 1 for p1 in sample
+            )
+
+        self.set_pass(_("Pass 3: Calculating potential matches"), len(sample))
+        t1 = time.time()
+        pairs, self.comparisons = self.score_candidates(
+            sample, records, generator, thresh, only=dirty, all_pairs=store is not None, stream=True
+        )
+        if self.stats:
+            self.stats.comparisons = self.comparisons
+            self.stats.score_seconds = time.time() - t1
+        if store and not (self.progress and self.progress.get_cancelled()):
+            pairs = store.save(pairs, dirty)
+            # the unchanged pairs from the store
+            for p1key, p2key, chance in pairs:
+                self.found(p1key, p2key, chance)
+        self.map = self.best_matches(pairs)
+
+        if self.measure_recall and generator is not exhaustive:
+            self.set_pass(_("Pass 4: Measuring recall"), len(sample))
+            exhaustive_pairs, _count = self.score_candidates(
+                sample, records, exhaustive, thresh
+            )
+            self.recall = dupblocking.recall(self.map, self.best_matches(exhaustive_pairs))
+
+        self.table_size = table.memory_size()
+        self.list = sorted(self.map)
+        self.length = len(self.list)
+
+    def make_record(self, p1, features):
+        names = self.getnames(p1)
+        keys = []
+        for name in names:
+            key = self.gen_key(get_surnames(name))
+            if key not in keys:
+                keys.append(key)
+
+        # name_match never accepts names that have no common first letter;
+        # a name without first names and non-ASCII initials match everything
+        # ("") because name_match does not reject a name without first names
+        # and soundex does not distinguish non-ASCII letters
+        initials = set()
+        for name in names:
+            first_names = name.get_first_name().replace("-", " ").split()
+            if not first_names:
+                initials.add("")
+            for first_name in first_names:
+                initial = first_name[0].upper()
+                initials.add(initial if "A" <= initial <= "Z" else "")
+
+        year = None
+        if features.birth:
+            year = features.birth.start[2] or None
+        parish = features.birth_place or None
+
+        primary = p1.get_primary_name()
+        fullname = get_surnames(primary) + " " + primary.get_first_name()
+        return dupblocking.Record(
+            p1.handle,
+            p1.get_gender() == Person.MALE,
+            keys,
+            initials,
+            year,
+            parish,
+            fullname,
+        )
+
+    def search_settings(self, thresh):
+        """
+        The options that affect the stored pairs of an incremental search.
+        """
+        return dict(
+            threshold=thresh,
+            soundex=self.use_soundex,
+            all_first_names=self.all_first_names,
+            date_tolerance=self.date_tolerance,
+            skip_no_surname=self.skip_no_surname,
+            skip_no_birth_date=self.skip_no_birth_date,
+            use_exclusions=self.use_exclusions,
+            blocking=self.blocking,
+            use_parish=self.use_parish,
+            all_parent_families=self.table.ancestry is not None,
+        )
+
+    def score_candidates(self, sample, records, generator, thresh, only=None, all_pairs=False, stream=False):
+        """
+        Returns the list of (p1, p2, chance) with chance >= thresh and the
+        number of comparisons. If 'only' is given then only the pairs where
+        at least one person is in 'only' are compared. If 'all_pairs' is
+        false then a pair is not compared if p2 has already been matched
+        with p1. If 'stream' is true then the pairs are also given to
+        found() as they are found and the candidates are counted in the
+        batch statistics.
+        """
+        if self.procs > 1:
+            return self.score_candidates_parallel(sample, records, generator, thresh, only, stream)
+        pairs = []
+        matches = {}
+        comparisons = 0
+        for p1 in sample:
             p1key = p1.handle
             if self.progress and self.progress.step():
                 break  # canceled
-            #p1 = self.db.get_person_from_handle(p1key)
-            if random.random() >= random_percent / 100:
-                continue
-
-            surnames = get_surnames(p1.get_primary_name())
-            key = self.gen_key(surnames)
-            if p1.get_gender() == Person.MALE:
-                remaining = males[key]
-            else:
-                remaining = females[key]
 
-            # index = 0
-            for p2key in remaining:
-                # index += 1
+            p1_changed = only is None or p1key in only
+            candidates = generator.candidates(records[p1key])
+            if stream and self.stats:
+                self.stats.candidates[len(candidates) - 1] += 1
+            for p2key in candidates:
                 if p1key == p2key:
                     continue
+                if not p1_changed and p2key not in only:
+                    continue
                 if self.use_exclusions:
                     if (p1key, p2key) in self.excluded:
                         continue
                     if (p2key, p1key) in self.excluded:
                         continue
-                if p2key in self.map:
-                    (v, c) = self.map[p2key]
+                if not all_pairs and p2key in matches:
+                    (v, c) = matches[p2key]
                     if v == p1key:
                         continue
 
-                # p2 = self.db.get_person_from_handle(p2key)
-                p2 = pmap[p2key]
+                p2 = self.table.people[p2key]
 
-                chance = self.compare_people(p1, p2)
+                comparisons += 1
+                chance = self.scorer.compare_people(p1, p2)
                 if chance >= thresh:
-                    if p1key in self.map:  # already found a match for p1
-                        val = self.map[p1key]
-                        if chance > val[1]:  # this is a better match
-                            self.map[p1key] = (p2key, chance)
-                    else:
-                        self.map[p1key] = (p2key, chance)
-            t2 = time.time()
-
-        self.list = sorted(self.map)
-        self.length = len(self.list)
+                    pairs.append((p1key, p2key, chance))
+                    if stream:
+                        self.found(p1key, p2key, chance)
+                    if not all_pairs:
+                        add_match(matches, p1key, p2key, chance)
+        return pairs, comparisons
+
+    def score_candidates_parallel(self, sample, records, generator, thresh, only=None, stream=False):
+        pairs = []
+        comparisons = 0
+        excluded = self.excluded if self.use_exclusions else set()
+        options = (self.use_soundex, self.all_first_names, self.date_tolerance)
+        tasks = dupparallel.buckets([p1.handle for p1 in sample], records)
+        poll = self.poll_progress if self.progress else None
+        with dupparallel.ScoringPool(
+            self.procs, self.table, generator, records, options, excluded, thresh, only
+        ) as pool:
+            for p1keys, results, count, candidates in pool.imap(tasks, poll):
+                comparisons += count
+                pairs.extend(results)
+                if stream:
+                    for p1key, p2key, chance in results:
+                        self.found(p1key, p2key, chance)
+                    if self.stats:
+                        self.stats.candidates.update(candidates)
+                if self.progress and any([self.progress.step() for _p1key in p1keys]):
+                    pool.cancel()
+                    break  # canceled
+        return pairs, comparisons
+
+    def best_matches(self, pairs):
+        """
+        Returns the best match for each person: a map p1 -> (p2, chance).
+        """
+        matches = {}
+        for p1key, p2key, chance in pairs:
+            if self.use_exclusions:
+                if (p1key, p2key) in self.excluded:
+                    continue
+                if (p2key, p1key) in self.excluded:
+                    continue
+            if p2key in matches:
+                (v, c) = matches[p2key]
+                if v == p1key:
+                    continue
+            add_match(matches, p1key, p2key, chance)
+        return matches
+
+    def poll_progress(self):
+        while Gtk.events_pending():
+            Gtk.main_iteration()
+        return self.progress.get_cancelled()
+
+    def blocking_stats_text(self):
+        text = _("Comparisons: {}").format(self.comparisons)
+        if self.exhaustive_comparisons:
+            skipped = max(0, self.exhaustive_comparisons - self.generated_comparisons)
+            text += _("; skipped: {} ({:1.1f}%)").format(
+                skipped, 100 * skipped / self.exhaustive_comparisons
+            )
+        if self.recall is not None:
+            text += _("; recall: {:1.1f}%").format(100 * self.recall)
+        if self.dirty_count is not None:
+            text += _("; changed people: {}").format(self.dirty_count)
+        text += _("; feature table: {} people, {:1.1f} MB").format(
+            len(self.table.people), self.table_size / 1e6
+        )
+        return text
 
     def gen_key(self, val):
         if self.use_soundex:
@@ -558,334 +802,6 @@ class Tool(tool.Tool, ManagedWindow):
     def getnames(self, p):
         return [p.get_primary_name()] + p.get_alternate_names()
 
-    def compare_names(self, p1, p2):
-        # compare all alternate names
-        chance = max(
-            self.name_match(name1, name2)
-            for name1, name2 in itertools.product(self.getnames(p1), self.getnames(p2))
-        )
-        return chance
-
-    def compare_people(self, p1, p2):
-        if (p2.gramps_id, p1.gramps_id) in self.compared:
-            return self.compared[(p2.gramps_id, p1.gramps_id)]
-        self.p1 = p1
-        self.p2 = p2
-
-        chance = self.compare_names(p1, p2)
-        if chance == -1:
-            return -1
-
-        birth1_ref = p1.get_birth_ref()
-        if birth1_ref:
-            birth1 = self.db.get_event_from_handle(birth1_ref.ref)
-        else:
-            birth1 = Event()
-
-        death1_ref = p1.get_death_ref()
-        if death1_ref:
-            death1 = self.db.get_event_from_handle(death1_ref.ref)
-        else:
-            death1 = Event()
-
-        birth2_ref = p2.get_birth_ref()
-        if birth2_ref:
-            birth2 = self.db.get_event_from_handle(birth2_ref.ref)
-        else:
-            birth2 = Event()
-
-        death2_ref = p2.get_death_ref()
-        if death2_ref:
-            death2 = self.db.get_event_from_handle(death2_ref.ref)
-        else:
-            death2 = Event()
-
-        value = self.date_match(birth1.get_date_object(), birth2.get_date_object())
-        if value == -1:
-            return -1
-        chance += value
-        #        value = self.date_match(death1.get_date_object(),
-        #                                death2.get_date_object())
-        #        if value == -1 :
-        #            return -1
-        #        chance += value
-
-        value = self.place_match(birth1.get_place_handle(), birth2.get_place_handle())
-        if value == -1:
-            return -1
-        chance += value
-
-        value = self.place_match(death1.get_place_handle(), death2.get_place_handle())
-        if value == -1:
-            return -1
-        chance += value
-
-        ancestors = []
-        self.ancestors_of(p1.get_handle(), ancestors)
-        if p2.get_handle() in ancestors:
-            return -1
-
-        ancestors = []
-        self.ancestors_of(p2.get_handle(), ancestors)
-        if p1.get_handle() in ancestors:
-            return -1
-
-        f1_id = p1.get_main_parents_family_handle()
-        f2_id = p2.get_main_parents_family_handle()
-
-        if f1_id and f2_id:
-            f1 = self.db.get_family_from_handle(f1_id)
-            f2 = self.db.get_family_from_handle(f2_id)
-            dad1_id = f1.get_father_handle()
-            if dad1_id:
-                dad1 = get_name_obj(self.db.get_person_from_handle(dad1_id))
-            else:
-                dad1 = None
-            dad2_id = f2.get_father_handle()
-            if dad2_id:
-                dad2 = get_name_obj(self.db.get_person_from_handle(dad2_id))
-            else:
-                dad2 = None
-
-            value = self.name_match(dad1, dad2)
-
-            if value == -1:
-                return -1
-
-            chance += value
-
-            mom1_id = f1.get_mother_handle()
-            if mom1_id:
-                mom1 = get_name_obj(self.db.get_person_from_handle(mom1_id))
-            else:
-                mom1 = None
-            mom2_id = f2.get_mother_handle()
-            if mom2_id:
-                mom2 = get_name_obj(self.db.get_person_from_handle(mom2_id))
-            else:
-                mom2 = None
-
-            value = self.name_match(mom1, mom2)
-            if value == -1:
-                return -1
-
-            chance += value
-
-        for f1_id in p1.get_family_handle_list():
-            f1 = self.db.get_family_from_handle(f1_id)
-            for f2_id in p2.get_family_handle_list():
-                f2 = self.db.get_family_from_handle(f2_id)
-                if p1.get_gender() == Person.FEMALE:
-                    father1_id = f1.get_father_handle()
-                    father2_id = f2.get_father_handle()
-                    if father1_id and father2_id:
-                        if father1_id == father2_id:
-                            chance += 1
-                        else:
-                            father1 = self.db.get_person_from_handle(father1_id)
-                            father2 = self.db.get_person_from_handle(father2_id)
-                            fname1 = get_name_obj(father1)
-                            fname2 = get_name_obj(father2)
-                            value = self.name_match(fname1, fname2)
-                            if value != -1:
-                                chance += value
-                else:
-                    mother1_id = f1.get_mother_handle()
-                    mother2_id = f2.get_mother_handle()
-                    if mother1_id and mother2_id:
-                        if mother1_id == mother2_id:
-                            chance += 1
-                        else:
-                            mother1 = self.db.get_person_from_handle(mother1_id)
-                            mother2 = self.db.get_person_from_handle(mother2_id)
-                            mname1 = get_name_obj(mother1)
-                            mname2 = get_name_obj(mother2)
-                            value = self.name_match(mname1, mname2)
-                            if value != -1:
-                                chance += value
-
-        self.compared[(p1.gramps_id, p2.gramps_id)] = chance
-        return chance
-
-    def name_compare(self, s1, s2):
-        if self.use_soundex:
-            try:
-                return compare(s1, s2)
-            except UnicodeEncodeError:
-                return s1 == s2
-        else:
-            return s1 == s2
-
-# -------------------------------------------------------------------------
-    def compare(str1, str2):
-        "1 if strings are close. 0 otherwise."
-        sdx1 = soundex(str1)
-        sdx2 = soundex(str2)
-        if sdx1 == "Z000":      # non-ascii string  
-            return str1 == str2
-        else:
-            return sdx1 == sdx2
-    
-    def date_match(self, date1, date2):
-        if date1.is_empty() or date2.is_empty():
-#            return -1
-            return 0
-        if date1.is_equal(date2):
-            return 1
-
-        if date1.is_compound() or date2.is_compound():
-            return self.range_compare(date1, date2)
-
-        if date1.get_year() == date2.get_year():
-            if date1.get_month() == date2.get_month():
-                return 0.75
-            if not date1.get_month_valid() or not date2.get_month_valid():
-                return 0.75
-            else:
-                return 0.25
-        elif abs(date1.get_year() - date2.get_year()) <= self.date_tolerance:
-            return 0.5
-        else:
-            return -1
-
-    def range_compare(self, date1, date2):
-        start_date_1 = date1.get_start_date()[0:3]
-        start_date_2 = date2.get_start_date()[0:3]
-        stop_date_1 = date1.get_stop_date()[0:3]
-        stop_date_2 = date2.get_stop_date()[0:3]
-
-        # fix the order of dd,mm,yyyy => yyyy,mm,dd
-        start_date_1 = list(reversed(start_date_1))
-        start_date_2 = list(reversed(start_date_2))
-        stop_date_1 = list(reversed(stop_date_1))
-        stop_date_2 = list(reversed(stop_date_2))
-
-        # stop date is [0,0,0] if not compound; this makes the code below more simple
-        if not date1.is_compound():
-            stop_date_1 = start_date_1
-        if not date2.is_compound():
-            stop_date_2 = start_date_2
-
-        if stop_date_1[1] == 0:
-            stop_date_1[1] = 12
-        if stop_date_1[2] == 0:
-            stop_date_1[2] = 31
-        if stop_date_2[1] == 0:
-            stop_date_2[1] = 12
-        if stop_date_2[2] == 0:
-            stop_date_2[2] = 31
-
-        min_start = min(start_date_1[0], start_date_2[0])
-        max_stop = max(stop_date_1[0], stop_date_2[0])
-        if max_stop - min_start <= self.date_tolerance:
-            if date1.is_compound() and date2.is_compound():
-                if (
-                    stop_date_1 >= start_date_2 and stop_date_2 >= start_date_1
-                ):  # overlapping ranges
-                    return 0.25
-            elif date1.is_compound():
-                if (
-                    start_date_1 <= start_date_2 <= stop_date_1
-                ):  # date2 within date1 range
-                    return 0.5
-            elif date2.is_compound():
-                if (
-                    start_date_2 <= start_date_1 <= stop_date_2
-                ):  # date1 within date2 range
-                    return 0.5
-
-            # no overlap
-            return 0.2
-        return -1
-
-    def name_match(self, name, name1):
-
-        if not name1 or not name:
-            return 0
-
-        srn1 = get_surnames(name)
-        sfx1 = name.get_suffix()
-        srn2 = get_surnames(name1)
-        sfx2 = name1.get_suffix()
-
-        if not self.name_compare(srn1, srn2):
-            return -1
-        if sfx1 != sfx2:
-            if sfx1 != "" and sfx2 != "":
-                return -1
-
-        list1 = name.get_first_name().replace("-", " ").split()
-        list2 = name1.get_first_name().replace("-", " ").split()
-        if len(list1) == 0 or len(list2) == 0:
-            if self.all_first_names:
-                return -1
-            else:
-                return 0.1
-        if name.get_first_name() == name1.get_first_name():
-            return 1
-        else:
-            if self.all_first_names:
-                if len(list1) != len(list2):
-                    return -1
-                for n1 in list1:
-                    if all(not self.name_compare(n1, n2) for n2 in list2):
-                        return -1
-                for n2 in list2:
-                    if all(not self.name_compare(n1, n2) for n1 in list1):
-                        return -1
-                return 1
-            if len(list1) < len(list2):
-                return self.list_reduce(list1, list2)
-            else:
-                return self.list_reduce(list2, list1)
-
-    def place_match(self, p1_id, p2_id):
-        if p1_id == p2_id:
-            return 1
-
-        if not p1_id:
-            name1 = ""
-        else:
-            p1 = self.db.get_place_from_handle(p1_id)
-            name1 = p1.get_title()
-
-        if not p2_id:
-            name2 = ""
-        else:
-            p2 = self.db.get_place_from_handle(p2_id)
-            name2 = p2.get_title()
-
-        if not (name1 and name2):
-            return 0
-        if name1 == name2:
-            return 1
-
-        list1 = name1.replace(",", " ").split()
-        list2 = name2.replace(",", " ").split()
-
-        value = 0
-        for name in list1:
-            for name2 in list2:
-                if name == name2:
-                    value += 0.5
-                elif name[0] == name2[0] and self.name_compare(name, name2):
-                    value += 0.25
-        return min(value, 1) if value else -1
-
-    def list_reduce(self, list1, list2):
-        value = 0
-        for name in list1:
-            for name2 in list2:
-                if is_initial(name) and name[0] == name2[0]:
-                    value += 0.25
-                elif is_initial(name2) and name2[0] == name[0]:
-                    value += 0.25
-                elif name == name2:
-                    value += 0.5
-                elif name[0] == name2[0] and self.name_compare(name, name2):
-                    value += 0.25
-        return min(value, 1) if value else -1
-
     def __dummy(self, obj):
         """dummy callback, needed because a shared glade file is used for
         both toplevel windows and all signals must be handled.
@@ -893,6 +809,30 @@ class Tool(tool.Tool, ManagedWindow):
         pass
 
 
+def get_ancestry_index(db):
+    """
+    Returns the shared ancestry index of the ancestryindex addon or None if
+    the addon is not installed; then the feature table checks the ancestors
+    through the main parents families itself.
+    """
+    try:
+        import ancestryindex
+    except ImportError:
+        return None
+    index = ancestryindex.get_index(db)
+    index.prepare()  # before the worker processes get a copy
+    return index
+
+
+def add_match(matches, p1key, p2key, chance):
+    if p1key in matches:  # already found a match for p1
+        val = matches[p1key]
+        if chance > val[1]:  # this is a better match
+            matches[p1key] = (p2key, chance)
+    else:
+        matches[p1key] = (p2key, chance)
+
+
 def get_year(dbstate, ref):
     y = ""
     if ref:
@@ -929,7 +869,8 @@ def get_years(dbstate, person):
 class DuplicatePeopleToolMatches(ManagedWindow):
 
     def __init__(
-        self, dbstate, uistate, track, the_list, the_map, dbconnection, excluded, callback, time_elapsed=None
+        self, dbstate, uistate, track, the_list, the_map, dbconnection, excluded, callback, time_elapsed=None,
+        blocking_stats=None,
     ):
         ManagedWindow.__init__(self, uistate, track, self.__class__)
 
@@ -979,11 +920,10 @@ class DuplicatePeopleToolMatches(ManagedWindow):
             ("", -1, 0),  # gramps id 1
             ("", -1, 0),  # gramps id 2
         ]
-        self.list = ListModel(
+        self.list = dupmatchlist.MatchList(
             self.mlist,
             mtitles,
-            mode=Gtk.SelectionMode.MULTIPLE,
-            # mode=Gtk.SelectionMode.SINGLE,
+            self.person_text,
             event_func=self.on_do_compare_clicked,
             right_click=self.on_right_click,
         )
@@ -991,8 +931,11 @@ class DuplicatePeopleToolMatches(ManagedWindow):
         stats_text = _("Number of matches: {}").format(len(the_map))
         if time_elapsed is not None:
             stats_text += _("; elapsed time: {:1.2f}s").format(time_elapsed)
-        label_stats = top.get_child_object("label_stats")
-        label_stats.set_text(stats_text)
+        if blocking_stats:
+            stats_text += "\n" + blocking_stats
+        self.stats_text = stats_text
+        self.label_stats = top.get_child_object("label_stats")
+        self.label_stats.set_text(stats_text)
         self.redraw()
         self.show()
 
@@ -1052,27 +995,19 @@ class DuplicatePeopleToolMatches(ManagedWindow):
                 continue
             list.append((c, p1key, p2key))
 
-        self.list.clear()
-        self.download_list = []
-        for c, p1key, p2key in sorted(list, reverse=True):
-            c1 = "%5.2f" % c
-            c2 = "%5.2f" % (100 - c)
-            p1 = self.db.get_person_from_handle(p1key)
-            p2 = self.db.get_person_from_handle(p2key)
-            if not p1 or not p2:
-                continue
-            pn1 = name_displayer.display(p1)
-            pn2 = name_displayer.display(p2)
-            years1 = get_years(self.dbstate, p1)
-            years2 = get_years(self.dbstate, p2)
-            name1 = pn1 + " " + years1
-            name2 = pn2 + " " + years2
-            self.list.add(
-                [c1, name1, name2, c2, p1.gramps_id, p2.gramps_id], (p1key, p2key)
-            )
-            self.download_list.append(
-                [c1, p1.gramps_id, p2.gramps_id, p1key, p2key, name1, name2]
-            )
+        # the rows are formatted only when they are shown
+        self.list.set_rows(sorted(list, reverse=True))
+
+    def person_text(self, handle):
+        """
+        Returns the name and years and the Gramps id of a person for the
+        match list, or None if the person does not exist any more.
+        """
+        person = self.db.get_person_from_handle(handle)
+        if not person:
+            return None
+        name = name_displayer.display(person) + " " + get_years(self.dbstate, person)
+        return (name, person.gramps_id)
 
     def on_do_compare_clicked(self, obj):
 
@@ -1093,34 +1028,61 @@ class DuplicatePeopleToolMatches(ManagedWindow):
             True,
         )
 
-    def remove_estimated_birth(self, person, trans):
+    def remove_estimated_birth(self, person):
+        """
+        Removes the birth event of a person tagged "deceased" (the birth
+        was only estimated). Returns True if the person was changed.
+        """
         deceased_tag = self.db.get_tag_from_name("deceased")
         if deceased_tag is None:
-            return
+            return False
         taglist = person.get_tag_list()
         if deceased_tag.handle in taglist:
             birth_event_ref = person.get_birth_ref()
             person._remove_handle_references("Event", [birth_event_ref.ref])
-            self.db.commit_person(person, trans)
+            return True
+        return False
 
     def on_do_merge_clicked(self, obj):
         import gramps.gen.merge.mergepersonquery as mergemodule
 
+        handlepairlist = self.list.get_selected_objects()
+        mergesets = self.genmerges(handlepairlist)  # set of ((i1,handle1),...)
+        merger = dupmerge.BulkMerge(
+            self.db,
+            [[handle for _i, handle in mergeset] for mergeset in sorted(mergesets)],
+            self.remove_estimated_birth,
+        )
+        # the person-delete signals of the merge are handled here
+        self.dellist3.update(handle for mergeset in mergesets for _i, handle in mergeset[1:])
+        self.uistate.set_busy_cursor(True)
         with self.nested_txn("Merging people", self.dbstate.db, mergemodule) as trans:
-            handlepairlist = self.list.get_selected_objects()
-            mergesets = self.genmerges(handlepairlist)  # set of ((i1,handle1),...)
-            for mergeset in mergesets:
-                phoenix_handle = mergeset[0][1]
-                for _, titanic_handle in mergeset[1:]:
-                    p1 = self.db.get_person_from_handle(phoenix_handle)
-                    p2 = self.db.get_person_from_handle(titanic_handle)
-                    self.remove_estimated_birth(p1, trans)
-                    self.remove_estimated_birth(p2, trans)
-                    query = mergemodule.MergePersonQuery(self.dbstate.db, p1, p2)
-                    self.dellist.add(titanic_handle)
-                    self.dellist3.add(titanic_handle)
-                    query.execute()
-        self.redraw()
+            merger.execute(trans)
+            t1 = time.time()
+        merger.timings.append(("commit", time.time() - t1))
+        self.uistate.set_busy_cursor(False)
+
+        # the people that could not be merged are still in the database
+        titanics = set()
+        for mergeset in mergesets:
+            for _i, titanic_handle in mergeset[1:]:
+                if not self.db.has_person_handle(titanic_handle):
+                    titanics.add(titanic_handle)
+        self.dellist.update(titanics)
+        self.list.remove_handles(titanics)
+        self.list.refresh_handles(mergeset[0][1] for mergeset in mergesets)
+
+        self.label_stats.set_text(
+            self.stats_text
+            + "\n"
+            + _("Merged {} people: {}").format(merger.merged, merger.timings_text())
+        )
+        if merger.errors:
+            WarningDialog(
+                _("Some people were not merged"),
+                "\n".join(message for _p1, _p2, message in merger.errors[:10]),
+                parent=self.window,
+            )
 
     @contextmanager
     def nested_txn(self, title, db, mergemodule):
@@ -1171,12 +1133,13 @@ class DuplicatePeopleToolMatches(ManagedWindow):
 
     def on_update(self):
         if self.db.has_person_handle(self.p1):
-            titanic = self.p2
+            phoenix, titanic = self.p1, self.p2
         else:
-            titanic = self.p1
+            phoenix, titanic = self.p2, self.p1
         self.dellist.add(titanic)
         self.update()
-        self.redraw()
+        self.list.remove_handles([titanic])
+        self.list.refresh_handles([phoenix])
         self.uistate.set_active(self.p1, "Person")
 
     def update_and_destroy(self, obj):
@@ -1188,7 +1151,7 @@ class DuplicatePeopleToolMatches(ManagedWindow):
         if all(h in self.dellist3 for h in handle_list):
             return
         self.dellist.update(handle_list)
-        self.redraw()
+        self.list.remove_handles(handle_list)
 
     def __dummy(self, obj):
         """dummy callback, needed because a shared glade file is used for
@@ -1264,9 +1227,10 @@ class DuplicatePeopleToolMatches(ManagedWindow):
                 #                     if (p1key,p2key) in self.dellist2: continue
                 #                     writer.writerow(row)
 
-                for row in self.list.model:
+                model = self.list.model
+                for index in range(len(model.rows)):
                     [c, name1, name2, pct, grampsid1, grampsid2, (handle1, handle2)] = (
-                        list(row)
+                        model.row_values(index)
                     )
                     csvrow = [
                         float(c.strip()),
@@ -1419,11 +1383,6 @@ def get_name_obj(person):
         return None
 
 
-def get_surnames(name):
-    """Construct a full surname of the surnames"""
-    return " ".join([surn.get_surname() for surn in name.get_surname_list()])
-
-
 # copied from gramps/gui/merge/mergeperson.py:
 
 # -------------------------------------------------------------------------
@@ -1839,6 +1798,13 @@ class Options(tool.ToolOptions):
             "skip_no_birth_date": 0,
             "use_exclusions": 1,
             "random_percent": 100,
+            "blocking": "surname",
+            "use_parish": 0,
+            "measure_recall": 0,
+            "procs": 1,
+            "incremental": 0,
+            "output": "",
+            "format": "text",
         }
         self.options_help = {
             "soundex": (
@@ -1882,5 +1848,44 @@ class Options(tool.ToolOptions):
                 "Process randomly only a part of the database",
                 "Integer",
             ),
-            
+            "blocking": (
+                "=str",
+                "Candidate generation method",
+                dupblocking.BLOCKING_METHODS,
+                False,
+            ),
+            "use_parish": (
+                "=0/1",
+                "Compare only people born in the same place (multikey)",
+                ["Do not use", "Use"],
+                True,
+            ),
+            "measure_recall": (
+                "=0/1",
+                "Measure recall against the surname method",
+                ["Do not measure", "Measure"],
+                True,
+            ),
+            "procs": (
+                "=num",
+                "Number of processes that compare people in parallel",
+                "Integer",
+            ),
+            "incremental": (
+                "=0/1",
+                "Compare only people changed since the previous search",
+                ["Compare everybody", "Compare changed people"],
+                True,
+            ),
+            "output": (
+                "=str",
+                "File for the matches; they are written as soon as they are found",
+                "File name",
+            ),
+            "format": (
+                "=str",
+                "Format of the matches (text, csv or json)",
+                dupbatch.FORMATS,
+                False,
+            ),
         }
@@ -0,0 +1,141 @@
+# test_dupfeatures.py
+#
+# Unit tests for dupfeatures.py
+#
+# Run with:
+#   pytest test_dupfeatures.py -v
+#
+# Gramps is not available in plain pytest environments, so the one module
+# that dupfeatures imports (gramps.gen.soundex) is stubbed out at the top of
+# this file before the module is imported.
+
+from __future__ import annotations
+
+import itertools
+import os
+import sys
+import types
+
+# ---------------------------------------------------------------------------
+# Stub gramps.gen.soundex so dupfeatures can be imported without Gramps
+# ---------------------------------------------------------------------------
+
+def _build_stubs() -> None:
+    soundex = types.ModuleType("gramps.gen.soundex")
+    soundex.soundex = lambda name: (name[:1].upper() + "000") if name else "Z000"
+    soundex.compare = lambda name1, name2: soundex.soundex(name1) == soundex.soundex(name2)
+    for name in ("gramps", "gramps.gen"):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules["gramps.gen.soundex"] = soundex
+
+
+_build_stubs()
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dupfeatures import FeatureTable  # noqa: E402
+
+
+def _table(parents: dict[str, tuple]) -> FeatureTable:
+    """
+    A FeatureTable of the people in 'parents' (handle -> (father, mother)),
+    each person with his own main parents family.
+    """
+    table = FeatureTable()
+    families = {}
+    for handle, (father, mother) in parents.items():
+        family_handle = "F" + handle
+        table.add(handle, None, family_handle)
+        families[family_handle] = (father, mother)
+    table.link_families(families)
+    return table
+
+
+def _ancestors(parents: dict[str, tuple], handle: str) -> set[str]:
+    result = set()
+    stack = [handle]
+    while stack:
+        for parent in parents[stack.pop()]:
+            if parent and parent not in result:
+                result.add(parent)
+                stack.append(parent)
+    return result
+
+
+def _check_all_pairs(parents: dict[str, tuple]) -> None:
+    table = _table(parents)
+    for ancestor, person in itertools.product(parents, parents):
+        expected = ancestor == person or ancestor in _ancestors(parents, person)
+        got = table.is_ancestor(table.index[ancestor], table.index[person])
+        assert got == expected, (ancestor, person)
+
+
+class TestLevels:
+    def test_chain(self):
+        table = _table({"C": ("B", None), "B": ("A", None), "A": (None, None)})
+        assert [table.level[table.index[h]] for h in "ABC"] == [0, 1, 2]
+        assert not table.loops
+
+    def test_shared_parent(self):
+        # A is the father of both X and B, and B is the mother of X: when X
+        # is expanded both A and B are queued and A must not be ignored
+        # when the level of B is computed
+        parents = {"X": ("A", "B"), "A": (None, None), "B": ("A", None)}
+        table = _table(parents)
+        level = {h: table.level[table.index[h]] for h in parents}
+        assert level == {"A": 0, "B": 1, "X": 2}
+        _check_all_pairs(parents)
+
+    def test_shared_parent_many_children(self):
+        parents = {"P": (None, None)}
+        previous = "P"
+        for i in range(20):
+            parents[f"C{i}"] = ("P", previous)
+            previous = f"C{i}"
+        _check_all_pairs(parents)
+
+    def test_loop(self):
+        # P and Q are each other's parents; R is a child of P and S a child
+        # of R
+        parents = {
+            "S": ("R", None),
+            "R": ("P", None),
+            "P": ("Q", None),
+            "Q": ("P", None),
+            "T": (None, None),
+        }
+        table = _table(parents)
+        assert table.loops
+        _check_all_pairs(parents)
+
+    def test_self_parent(self):
+        parents = {"A": ("A", None), "B": ("A", None)}
+        table = _table(parents)
+        assert table.loops
+        _check_all_pairs(parents)
+
+
+class TestAncestryChanges:
+    def _changes(self, parents, changes, family_changes):
+        table = FeatureTable()
+        families = {}
+        for handle, (father, mother) in parents.items():
+            family_handle = "F" + handle
+            table.add(handle, None, family_handle, [family_handle], changes.get(handle, 1))
+            families[family_handle] = (father, mother)
+        result = table.ancestry_changes(families, {f: family_changes.get(f, 1) for f in families})
+        return {handle: result[table.index[handle]] for handle in parents}
+
+    def test_grandparent_family(self):
+        parents = {"C": ("B", None), "B": ("A", None), "A": (None, None), "D": (None, None)}
+        result = self._changes(parents, {}, {"FA": 5})
+        assert result == {"A": 5, "B": 5, "C": 5, "D": 1}
+
+    def test_shared_parent(self):
+        parents = {"X": ("A", "B"), "A": (None, None), "B": ("A", None)}
+        result = self._changes(parents, {"A": 7}, {})
+        assert result == {"X": 7, "A": 7, "B": 7}
+
+    def test_loop(self):
+        parents = {"S": ("R", None), "R": ("P", None), "P": ("Q", None), "Q": ("P", None)}
+        result = self._changes(parents, {"Q": 9}, {})
+        assert result == {"S": 9, "R": 9, "P": 9, "Q": 9}
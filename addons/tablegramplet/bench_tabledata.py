@@ -0,0 +1,178 @@
+# bench_tabledata.py
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2024  (your name)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Import and load throughput of the tabledata.db storage.
+
+Compares the old layout (one database row per cell, one INSERT per cell)
+with the current one (one JSON row per table row, executemany), measures
+loading with the prefetch of neighbouring objects, and times the automatic
+migration from the old layout.  Runs outside Gramps in a
+temporary directory.
+
+Usage:
+
+    python bench_tabledata.py [rows] [columns] [objects]
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tabledata_db import COL_TYPE_STRING, _DB, _PREFETCH  # noqa: E402
+
+_CELL_SCHEMA = """
+    CREATE TABLE tables (
+        id          INTEGER PRIMARY KEY AUTOINCREMENT,
+        object_type TEXT    NOT NULL,
+        tab_order   INTEGER NOT NULL DEFAULT 0,
+        name        TEXT    NOT NULL
+    );
+    CREATE TABLE columns (
+        table_id  INTEGER NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
+        col_order INTEGER NOT NULL,
+        name      TEXT    NOT NULL,
+        col_type  TEXT    NOT NULL DEFAULT 'String',
+        PRIMARY KEY (table_id, col_order)
+    );
+    CREATE TABLE rows (
+        table_id      INTEGER NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
+        object_handle TEXT    NOT NULL,
+        row_order     INTEGER NOT NULL,
+        col_order     INTEGER NOT NULL,
+        value         TEXT    NOT NULL DEFAULT '',
+        PRIMARY KEY (table_id, object_handle, row_order, col_order)
+    );
+    CREATE INDEX idx_rows_obj ON rows (table_id, object_handle);
+"""
+
+
+def _data(n_rows: int, n_cols: int) -> list[list[str]]:
+    return [[f"value {r}/{c}" for c in range(n_cols)] for r in range(n_rows)]
+
+
+def _handles(n_objects: int) -> list[str]:
+    return [f"H{i:08d}" for i in range(n_objects)]
+
+
+def bench_cells(path: str, data: list[list[str]], n_cols: int,
+                handles: list[str]) -> tuple[float, float]:
+    """The old layout, written the way the old add_row() did."""
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript(_CELL_SCHEMA)
+    con.execute("INSERT INTO tables (object_type, name) VALUES ('Person', 'T')")
+    for c in range(n_cols):
+        con.execute("INSERT INTO columns VALUES (1, ?, ?, ?)",
+                    (c, f"Col {c}", COL_TYPE_STRING))
+    con.commit()
+
+    t0 = time.perf_counter()
+    for i, values in enumerate(data):
+        handle = handles[i % len(handles)]
+        ro = con.execute(
+            "SELECT COALESCE(MAX(row_order)+1,0) FROM rows "
+            "WHERE table_id=1 AND object_handle=?", (handle,)).fetchone()[0]
+        with con:
+            for c, val in enumerate(values):
+                con.execute(
+                    "INSERT OR REPLACE INTO rows "
+                    "(table_id, object_handle, row_order, col_order, value) "
+                    "VALUES (1,?,?,?,?)", (handle, ro, c, val))
+    t1 = time.perf_counter()
+    for handle in handles:
+        raw: dict[int, dict[int, str]] = {}
+        for ro, co, value in con.execute(
+                "SELECT row_order, col_order, value FROM rows "
+                "WHERE table_id=1 AND object_handle=? "
+                "ORDER BY row_order, col_order", (handle,)):
+            raw.setdefault(ro, {})[co] = value
+        [[raw[ro].get(c, "") for c in range(n_cols)] for ro in sorted(raw)]
+    t2 = time.perf_counter()
+    con.close()
+    return t1 - t0, t2 - t1
+
+
+def bench_json(path: str, data: list[list[str]], n_cols: int,
+               handles: list[str]) -> tuple[float, float, float]:
+    db = _DB(path)
+    tid = db.add_table("Person", "T")
+    for c in range(n_cols):
+        db.add_column(tid, f"Col {c}", COL_TYPE_STRING)
+    cols = db.get_columns(tid)
+
+    t0 = time.perf_counter()
+    per_handle: dict[str, list[list[str]]] = {}
+    for i, values in enumerate(data):
+        per_handle.setdefault(handles[i % len(handles)], []).append(values)
+    for handle, rows in per_handle.items():
+        db.add_rows(tid, handle, cols, rows)
+    t1 = time.perf_counter()
+    for handle in handles:
+        db.get_rows(tid, handle, cols)
+    t2 = time.perf_counter()
+    # the way the gramplet moves through a list: each load after the first
+    # is served by a prefetch of the neighbours
+    db._objects.clear()
+    t3 = time.perf_counter()
+    for i, handle in enumerate(handles):
+        if not db.is_cached(handle):
+            db.prefetch(handles[i:i + 2 * _PREFETCH + 1])
+        db.get_rows(tid, handle, cols)
+    t4 = time.perf_counter()
+    db._con.close()
+    return t1 - t0, t2 - t1, t4 - t3
+
+
+def main() -> None:
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_cols = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    n_objects = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    data = _data(n_rows, n_cols)
+    handles = _handles(n_objects)
+    print(f"{n_rows} rows x {n_cols} columns over {n_objects} objects")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cells = os.path.join(tmp, "cells.db")
+        imp, load = bench_cells(cells, data, n_cols, handles)
+        print(f"cell per row  import {n_rows / imp:10.0f} rows/s   "
+              f"load {n_objects / load:8.0f} objects/s")
+
+        imp, load, prefetched = bench_json(os.path.join(tmp, "json.db"),
+                                           data, n_cols, handles)
+        print(f"JSON per row  import {n_rows / imp:10.0f} rows/s   "
+              f"load {n_objects / load:8.0f} objects/s")
+        print(f"with prefetch                           "
+              f"load {n_objects / prefetched:8.0f} objects/s")
+
+        t0 = time.perf_counter()
+        _DB(cells)._con.close()
+        t1 = time.perf_counter()
+        print(f"migration     {n_rows / (t1 - t0):10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -35,6 +35,18 @@ Data storage
 All data is kept in  <family-tree-folder>/tabledata.db  (SQLite).
 The column schema is shared across all objects of the same type.
 Each object stores its own independent set of rows, keyed by its Gramps handle.
+
+Deleted objects
+---------------
+tabledata_db.py is also loaded at registration (GENERAL plugin
+"TableDataJournal"): it journals the objects deleted from every tree that is
+opened, and removes their rows when the tree is opened again.
+
+Filter rules
+------------
+tabledata_rules.py adds the custom filter rule
+"<Objects> with table data <table> <column> <operator> <value>" for every
+object type, so the table data can be used in custom filters.
 """
 
 from gramps.version import major_version
@@ -198,3 +210,128 @@ register(
     detached_height = 400,
     navtypes        = ["Media"],
 )
+
+register(
+    RULE,
+    id              = "PersonHasTableData",
+    name            = _("People with table data <table> <column> <operator> <value>"),
+    description     = _("Matches person objects with a TableData row whose value in the "
+                        "column satisfies the condition"),
+    version         = "1.0.0",
+    gramps_target_version = major_version,
+    status          = STABLE,
+    fname           = "tabledata_rules.py",
+    ruleclass       = "PersonHasTableData",
+    namespace       = "Person",
+)
+
+register(
+    RULE,
+    id              = "FamilyHasTableData",
+    name            = _("Families with table data <table> <column> <operator> <value>"),
+    description     = _("Matches family objects with a TableData row whose value in the "
+                        "column satisfies the condition"),
+    version         = "1.0.0",
+    gramps_target_version = major_version,
+    status          = STABLE,
+    fname           = "tabledata_rules.py",
+    ruleclass       = "FamilyHasTableData",
+    namespace       = "Family",
+)
+
+register(
+    RULE,
+    id              = "EventHasTableData",
+    name            = _("Events with table data <table> <column> <operator> <value>"),
+    description     = _("Matches event objects with a TableData row whose value in the "
+                        "column satisfies the condition"),
+    version         = "1.0.0",
+    gramps_target_version = major_version,
+    status          = STABLE,
+    fname           = "tabledata_rules.py",
+    ruleclass       = "EventHasTableData",
+    namespace       = "Event",
+)
+
+register(
+    RULE,
+    id              = "PlaceHasTableData",
+    name            = _("Places with table data <table> <column> <operator> <value>"),
+    description     = _("Matches place objects with a TableData row whose value in the "
+                        "column satisfies the condition"),
+    version         = "1.0.0",
+    gramps_target_version = major_version,
+    status          = STABLE,
+    fname           = "tabledata_rules.py",
+    ruleclass       = "PlaceHasTableData",
+    namespace       = "Place",
+)
+
+register(
+    RULE,
+    id              = "SourceHasTableData",
+    name            = _("Sources with table data <table> <column> <operator> <value>"),
+    description     = _("Matches source objects with a TableData row whose value in the "
+                        "column satisfies the condition"),
+    version         = "1.0.0",
+    gramps_target_version = major_version,
+    status          = STABLE,
+    fname           = "tabledata_rules.py",
+    ruleclass       = "SourceHasTableData",
+    namespace       = "Source",
+)
+
+register(
+    RULE,
+    id              = "CitationHasTableData",
+    name            = _("Citations with table data <table> <column> <operator> <value>"),
+    description     = _("Matches citation objects with a TableData row whose value in the "
+                        "column satisfies the condition"),
+    version         = "1.0.0",
+    gramps_target_version = major_version,
+    status          = STABLE,
+    fname           = "tabledata_rules.py",
+    ruleclass       = "CitationHasTableData",
+    namespace       = "Citation",
+)
+
+register(
+    RULE,
+    id              = "RepositoryHasTableData",
+    name            = _("Repositories with table data <table> <column> <operator> <value>"),
+    description     = _("Matches repository objects with a TableData row whose value in the "
+                        "column satisfies the condition"),
+    version         = "1.0.0",
+    gramps_target_version = major_version,
+    status          = STABLE,
+    fname           = "tabledata_rules.py",
+    ruleclass       = "RepositoryHasTableData",
+    namespace       = "Repository",
+)
+
+register(
+    RULE,
+    id              = "MediaHasTableData",
+    name            = _("Media with table data <table> <column> <operator> <value>"),
+    description     = _("Matches media objects with a TableData row whose value in the "
+                        "column satisfies the condition"),
+    version         = "1.0.0",
+    gramps_target_version = major_version,
+    status          = STABLE,
+    fname           = "tabledata_rules.py",
+    ruleclass       = "MediaHasTableData",
+    namespace       = "Media",
+)
+
+register(
+    GENERAL,
+    id              = "TableDataJournal",
+    name            = _("TableData delete journal"),
+    description     = _("Removes the table data of deleted objects when the "
+                        "family tree is opened again"),
+    version         = "1.0.0",
+    gramps_target_version = major_version,
+    status          = STABLE,
+    fname           = "tabledata_db.py",
+    load_on_reg     = True,
+)
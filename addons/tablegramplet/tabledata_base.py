@@ -34,39 +34,10 @@ UI layout
 
 Each tab owns its own TreeView, ListStore, column list and sort state.
 
-Database schema
-===============
-One SQLite file per family tree:  <tree_dir>/tabledata.db
-
-  tables  (id INTEGER PK, object_type TEXT, tab_order INTEGER, name TEXT)
-
-  columns (table_id INTEGER → tables.id,
-           col_order INTEGER, name TEXT, col_type TEXT,
-           PRIMARY KEY (table_id, col_order))
-
-  rows    (table_id INTEGER → tables.id,
-           object_handle TEXT,
-           row_order INTEGER, col_order INTEGER, value TEXT,
-           PRIMARY KEY (table_id, object_handle, row_order, col_order))
-
-Column schema is per-table and shared across all objects.
-Row data is per-table AND per-object (keyed by Gramps handle).
-
-Stale-data strategy (Option B — startup purge only)
-====================================================
-When a Gramps object is deleted, its rows in tabledata.db are left alone
-during that session.  This is deliberate: Gramps' undo stack is still live,
-and hard-deleting rows immediately would lose data that the user could still
-recover with Ctrl-Z.
-
-At the start of the next session, post_init() calls _purge_orphaned_rows(),
-which compares every stored handle against the set of handles that actually
-exist in Gramps and permanently removes any that are gone.  By startup time
-the previous session's undo stack has been discarded, so it is safe to do so.
-
-Orphaned rows accumulate only within a single session and are invisible to
-the user (there is no handle to select them by), so this is purely a storage
-concern rather than a correctness concern.
+Storage
+=======
+The tabledata.db storage (schema, caching, purging of the rows of deleted
+objects) is in tabledata_db.py, which has no GUI dependencies.
 
 Active-object tracking
 =======================
@@ -78,18 +49,23 @@ connect_signal() is called in post_init() for non-Person nav types.
 from __future__ import annotations
 
 import csv
+import logging
 import os
-import sqlite3
+import re
 import subprocess
 import sys
-from typing import TYPE_CHECKING, Any, ClassVar, Optional, Union
+import time
+import zipfile
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional, Union
+from xml.etree.ElementTree import iterparse
 
 import gi
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, Pango
+from gi.repository import GLib, Gtk, Pango
 
 from gramps.gen.plug import Gramplet
 from gramps.gui.dialog import OkDialog
+from gramps.gui.utils import ProgressMeter
 
 if TYPE_CHECKING:
     # These are GTK / Gramps types used only in annotations.
@@ -106,333 +82,21 @@ try:
 except ImportError:
     _HAVE_ODF = False
 
-# ---------------------------------------------------------------------------
-# Type aliases
-# ---------------------------------------------------------------------------
-# A column definition dict, e.g. {"col_order": 0, "name": "Height", "type": "Number"}
-ColDef = dict[str, Any]
-# A row dict, e.g. {"row_order": 0, "values": ["72.5", "kg"]}
-RowData = dict[str, Any]
-# A table definition dict, e.g. {"id": 1, "name": "Measurements"}
-TableDef = dict[str, Any]
+from tabledata_db import (COL_TYPES, COL_TYPE_NUMBER, COL_TYPE_STRING,
+                         COL_TYPE_URL, ColDef, RowData, TableDef, _DB,
+                         _PREFETCH, _is_number, _to_number,
+                         track_deletes)
+
+LOG = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
-# Column-type constants
+# GUI constants
 # ---------------------------------------------------------------------------
-COL_TYPE_NUMBER: str = "Number"
-COL_TYPE_STRING: str = "String"
-COL_TYPE_URL: str    = "URL"
-COL_TYPES: list[str] = [COL_TYPE_NUMBER, COL_TYPE_STRING, COL_TYPE_URL]
-
 # GTK ListStore layout: col 0 = row_order (int, hidden), then one str per col
 _META: int = 1
 
-
-# ---------------------------------------------------------------------------
-# Helpers
-# ---------------------------------------------------------------------------
-def _to_number(text: str) -> Union[int, float]:
-    """Parse *text* as an int, falling back to float.  Raises ValueError."""
-    text = text.strip()
-    try:
-        return int(text)
-    except ValueError:
-        return float(text)
-
-
-def _db_path(dbstate: Any) -> str:
-    """Return the absolute path to tabledata.db for the currently open tree."""
-    return os.path.join(dbstate.db.get_save_path(), "tabledata.db")
-
-
-# ---------------------------------------------------------------------------
-# Database access layer
-# ---------------------------------------------------------------------------
-class _DB:
-    """Thin sqlite3 wrapper; one instance is cached per tree path."""
-
-    _cache: ClassVar[dict[str, _DB]] = {}
-
-    # ------------------------------------------------------------------ cache
-    @classmethod
-    def get(cls, dbstate: Any) -> _DB:
-        """Return the cached _DB for the current tree, creating it if needed."""
-        path = _db_path(dbstate)
-        if path not in cls._cache:
-            cls._cache[path] = cls(path)
-        return cls._cache[path]
-
-    @classmethod
-    def invalidate(cls, dbstate: Any) -> None:
-        """Close and remove the cached connection for the current tree."""
-        try:
-            path = _db_path(dbstate)
-        except Exception:
-            return
-        inst = cls._cache.pop(path, None)
-        if inst is not None:
-            try:
-                inst._con.close()
-            except Exception:
-                pass
-
-    # ------------------------------------------------------------------- init
-    def __init__(self, path: str) -> None:
-        self._con: sqlite3.Connection = sqlite3.connect(
-            path, check_same_thread=False)
-        self._con.row_factory = sqlite3.Row
-        # Must be set per-connection, outside executescript
-        self._con.execute("PRAGMA journal_mode=WAL")
-        self._con.execute("PRAGMA foreign_keys=ON")
-        self._migrate()
-
-    def _schema_has_table_id(self) -> bool:
-        """Return True if the *columns* table already has a *table_id* column."""
-        cur = self._con.execute(
-            "SELECT name FROM sqlite_master "
-            "WHERE type='table' AND name='columns'")
-        if cur.fetchone() is None:
-            return True   # fresh install — no old schema to worry about
-        cur = self._con.execute("PRAGMA table_info(columns)")
-        return any(row["name"] == "table_id" for row in cur)
-
-    def _migrate(self) -> None:
-        """Create or upgrade the database schema."""
-        # Drop old single-table schema (columns keyed by object_type) if present.
-        if not self._schema_has_table_id():
-            self._con.executescript("""
-                DROP TABLE IF EXISTS rows;
-                DROP TABLE IF EXISTS columns;
-            """)
-
-        self._con.executescript("""
-            CREATE TABLE IF NOT EXISTS tables (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                object_type TEXT    NOT NULL,
-                tab_order   INTEGER NOT NULL DEFAULT 0,
-                name        TEXT    NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS columns (
-                table_id  INTEGER NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
-                col_order INTEGER NOT NULL,
-                name      TEXT    NOT NULL,
-                col_type  TEXT    NOT NULL DEFAULT 'String',
-                PRIMARY KEY (table_id, col_order)
-            );
-            CREATE TABLE IF NOT EXISTS rows (
-                table_id      INTEGER NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
-                object_handle TEXT    NOT NULL,
-                row_order     INTEGER NOT NULL,
-                col_order     INTEGER NOT NULL,
-                value         TEXT    NOT NULL DEFAULT '',
-                PRIMARY KEY (table_id, object_handle, row_order, col_order)
-            );
-            CREATE INDEX IF NOT EXISTS idx_rows_obj
-                ON rows (table_id, object_handle);
-        """)
-        self._con.commit()
-        # Re-enable after executescript (which resets per-connection PRAGMAs)
-        self._con.execute("PRAGMA foreign_keys=ON")
-    # ── tables ──────────────────────────────────────────────────────────────
-    def get_tables(self, object_type: str) -> list[TableDef]:
-        """Return all tables for *object_type*, ordered by tab_order then id."""
-        cur = self._con.execute(
-            "SELECT id, name FROM tables "
-            "WHERE object_type=? ORDER BY tab_order, id",
-            (object_type,))
-        return [{"id": r["id"], "name": r["name"]} for r in cur]
-
-    def add_table(self, object_type: str, name: str) -> int:
-        """Insert a new table row and return its new id."""
-        cur = self._con.execute(
-            "SELECT COALESCE(MAX(tab_order)+1,0) FROM tables "
-            "WHERE object_type=?", (object_type,))
-        order: int = cur.fetchone()[0]
-        cur = self._con.execute(
-            "INSERT INTO tables (object_type, tab_order, name) VALUES (?,?,?)",
-            (object_type, order, name))
-        self._con.commit()
-        return cur.lastrowid  # type: ignore[return-value]
-
-    def rename_table(self, table_id: int, name: str) -> None:
-        self._con.execute("UPDATE tables SET name=? WHERE id=?",
-                          (name, table_id))
-        self._con.commit()
-
-    def delete_table(self, table_id: int) -> None:
-        """Delete a table; CASCADE removes its columns and rows automatically."""
-        self._con.execute("DELETE FROM tables WHERE id=?", (table_id,))
-        self._con.commit()
-
-    # ── columns ─────────────────────────────────────────────────────────────
-    def get_columns(self, table_id: int) -> list[ColDef]:
-        """Return all column definitions for *table_id*, ordered by col_order."""
-        cur = self._con.execute(
-            "SELECT col_order, name, col_type FROM columns "
-            "WHERE table_id=? ORDER BY col_order", (table_id,))
-        return [{"col_order": r["col_order"],
-                 "name":      r["name"],
-                 "type":      r["col_type"]} for r in cur]
-
-    def add_column(self, table_id: int, name: str, col_type: str) -> None:
-        cur = self._con.execute(
-            "SELECT COALESCE(MAX(col_order)+1,0) FROM columns "
-            "WHERE table_id=?", (table_id,))
-        order: int = cur.fetchone()[0]
-        self._con.execute(
-            "INSERT INTO columns (table_id, col_order, name, col_type) "
-            "VALUES (?,?,?,?)", (table_id, order, name, col_type))
-        self._con.commit()
-
-    def update_column(self, table_id: int, col_order: int,
-                      name: str, col_type: str) -> None:
-        self._con.execute(
-            "UPDATE columns SET name=?, col_type=? "
-            "WHERE table_id=? AND col_order=?",
-            (name, col_type, table_id, col_order))
-        self._con.commit()
-
-    def swap_columns(self, table_id: int, col_a: int, col_b: int) -> None:
-        """Swap the positions of two columns (and their row data)."""
-        TEMP: int = -1
-        with self._con:
-            for tbl in ("columns", "rows"):
-                self._con.execute(
-                    f"UPDATE {tbl} SET col_order=? "
-                    "WHERE table_id=? AND col_order=?",
-                    (TEMP, table_id, col_a))
-                self._con.execute(
-                    f"UPDATE {tbl} SET col_order=? "
-                    "WHERE table_id=? AND col_order=?",
-                    (col_a, table_id, col_b))
-                self._con.execute(
-                    f"UPDATE {tbl} SET col_order=? "
-                    "WHERE table_id=? AND col_order=?",
-                    (col_b, table_id, TEMP))
-
-    def delete_column(self, table_id: int, col_order: int) -> None:
-        """Delete a column and renumber the remaining columns."""
-        with self._con:
-            self._con.execute(
-                "DELETE FROM columns WHERE table_id=? AND col_order=?",
-                (table_id, col_order))
-            self._con.execute(
-                "DELETE FROM rows WHERE table_id=? AND col_order=?",
-                (table_id, col_order))
-            self._con.execute(
-                "UPDATE columns SET col_order=col_order-1 "
-                "WHERE table_id=? AND col_order>?",
-                (table_id, col_order))
-            self._con.execute(
-                "UPDATE rows SET col_order=col_order-1 "
-                "WHERE table_id=? AND col_order>?",
-                (table_id, col_order))
-
-    # ── rows ────────────────────────────────────────────────────────────────
-    def get_rows(self, table_id: int, object_handle: str,
-                 columns: list[ColDef]) -> list[RowData]:
-        """Return all rows for *(table_id, object_handle)*, ordered by row_order."""
-        if not columns:
-            return []
-        col_orders: list[int] = [c["col_order"] for c in columns]
-        cur = self._con.execute(
-            "SELECT row_order, col_order, value FROM rows "
-            "WHERE table_id=? AND object_handle=? "
-            "ORDER BY row_order, col_order",
-            (table_id, object_handle))
-        raw: dict[int, dict[int, str]] = {}
-        for r in cur:
-            raw.setdefault(r["row_order"], {})[r["col_order"]] = r["value"]
-        return [{"row_order": ro,
-                 "values": [raw[ro].get(co, "") for co in col_orders]}
-                for ro in sorted(raw)]
-
-    def purge_orphaned_rows(self, object_type: str,
-                             live_handles: set[str]) -> int:
-        """
-        Hard-delete rows whose object_handle no longer exists in Gramps.
-
-        Called once at startup, after the previous session's undo stack has
-        been discarded, so it is safe to permanently remove data for any
-        handle that Gramps no longer knows about.
-
-        *live_handles* must be the complete set of handles that currently
-        exist in Gramps for this object type.  As a safety guard, the method
-        does nothing when *live_handles* is empty — an empty set passed by
-        mistake would otherwise wipe all stored data.
-
-        Returns the number of row-cells permanently removed.
-        """
-        if not live_handles:
-            return 0
-
-        cur = self._con.execute(
-            "SELECT DISTINCT object_handle FROM rows "
-            "WHERE table_id IN "
-            "  (SELECT id FROM tables WHERE object_type=?)",
-            (object_type,))
-        stored: set[str] = {r[0] for r in cur}
-        orphans: set[str] = stored - live_handles
-
-        if not orphans:
-            return 0
-
-        ph = ",".join("?" * len(orphans))
-        cur2 = self._con.execute(
-            "SELECT COUNT(*) FROM rows "
-            f"WHERE object_handle IN ({ph}) "
-            "AND table_id IN "
-            "  (SELECT id FROM tables WHERE object_type=?)",
-            list(orphans) + [object_type])
-        count: int = cur2.fetchone()[0]
-
-        with self._con:
-            self._con.execute(
-                f"DELETE FROM rows WHERE object_handle IN ({ph}) "
-                "AND table_id IN "
-                "  (SELECT id FROM tables WHERE object_type=?)",
-                list(orphans) + [object_type])
-
-        return count
-
-
-    def add_row(self, table_id: int, object_handle: str,
-                columns: list[ColDef], values: list[str]) -> None:
-        cur = self._con.execute(
-            "SELECT COALESCE(MAX(row_order)+1,0) FROM rows "
-            "WHERE table_id=? AND object_handle=?",
-            (table_id, object_handle))
-        ro: int = cur.fetchone()[0]
-        with self._con:
-            for col, val in zip(columns, values):
-                self._con.execute(
-                    "INSERT OR REPLACE INTO rows "
-                    "(table_id, object_handle, row_order, col_order, value) "
-                    "VALUES (?,?,?,?,?)",
-                    (table_id, object_handle, ro, col["col_order"], val))
-
-    def update_row(self, table_id: int, object_handle: str, row_order: int,
-                   columns: list[ColDef], values: list[str]) -> None:
-        with self._con:
-            for col, val in zip(columns, values):
-                self._con.execute(
-                    "INSERT OR REPLACE INTO rows "
-                    "(table_id, object_handle, row_order, col_order, value) "
-                    "VALUES (?,?,?,?,?)",
-                    (table_id, object_handle, row_order, col["col_order"], val))
-
-    def delete_row(self, table_id: int, object_handle: str,
-                   row_order: int) -> None:
-        """Delete a row and compact row_order for the same object."""
-        with self._con:
-            self._con.execute(
-                "DELETE FROM rows "
-                "WHERE table_id=? AND object_handle=? AND row_order=?",
-                (table_id, object_handle, row_order))
-            self._con.execute(
-                "UPDATE rows SET row_order=row_order-1 "
-                "WHERE table_id=? AND object_handle=? AND row_order>?",
-                (table_id, object_handle, row_order))
+# Rows per executemany() batch when importing a file
+_IMPORT_CHUNK: int = 5000
 
 
 # ---------------------------------------------------------------------------
@@ -490,14 +154,38 @@ def _export_csv(path: str, columns: list[ColDef], rows: list[RowData]) -> None:
 
 def _import_csv(path: str) -> tuple[list[str], list[list[str]]]:
     """Return *(header, data_rows)* parsed from a CSV file."""
-    with open(path, newline="", encoding="utf-8-sig") as fh:
-        reader = csv.reader(fh)
-        all_rows: list[list[str]] = list(reader)
+    with _CsvReader(path) as reader:
+        all_rows: list[list[str]] = list(reader.rows)
     if not all_rows:
         return [], []
     return all_rows[0], all_rows[1:]
 
 
+class _CsvReader:
+    """
+    Iterate over the rows of a CSV file without reading it into memory.
+    *rows* yields lists of strings; the first one is the header.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._size: int = os.path.getsize(path) or 1
+        self._fh = open(path, newline="", encoding="utf-8-sig")
+        self.rows: Iterator[list[str]] = csv.reader(self._fh)
+
+    def fraction(self) -> float:
+        """Return the part of the file read so far (0.0 – 1.0)."""
+        return min(1.0, self._fh.buffer.tell() / self._size)
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def __enter__(self) -> _CsvReader:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+
 def _export_ods(path: str, table_name: str,
                 columns: list[ColDef], rows: list[RowData]) -> None:
     """Write *columns* and *rows* to an ODS spreadsheet at *path*."""
@@ -526,30 +214,172 @@ def _export_ods(path: str, table_name: str,
 
 def _import_ods(path: str) -> tuple[list[str], list[list[str]]]:
     """Return *(header, data_rows)* parsed from the first sheet of an ODS file."""
-    doc = _ods_load(path)
-    sheets = doc.spreadsheet.getElementsByType(_OdsTable)
-    if not sheets:
-        return [], []
-    sheet = sheets[0]
-    result: list[list[str]] = []
-    for tr in sheet.getElementsByType(_OdsRow):
-        cells = tr.getElementsByType(_OdsCell)
-        row_vals: list[str] = []
-        for tc in cells:
-            ps = tc.getElementsByType(_OdsP)
-            text = "".join(
-                str(n) for p in ps
-                for n in p.childNodes
-                if n.nodeType == n.TEXT_NODE
-            )
-            row_vals.append(text)
-        if any(row_vals):
-            result.append(row_vals)
+    with _OdsReader(path) as reader:
+        result: list[list[str]] = list(reader.rows)
     if not result:
         return [], []
     return result[0], result[1:]
 
 
+_ODS_TABLE: str = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+_ODS_TEXT: str  = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+
+
+class _OdsReader:
+    """
+    Iterate over the rows of the first sheet of an ODS file.
+
+    content.xml is parsed incrementally with iterparse() straight from the
+    zip archive, and every row element is discarded once its values have
+    been read, so memory use does not grow with the size of the sheet.
+    This does not need odfpy.  Empty rows are skipped; trailing empty cells
+    (spreadsheets often store a row as a few values plus one empty cell
+    repeated a thousand times) are dropped.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._zip = zipfile.ZipFile(path)
+        info = self._zip.getinfo("content.xml")
+        self._size: int = info.file_size or 1
+        self._fh = self._zip.open(info)
+        self.rows: Iterator[list[str]] = self._iter_rows()
+
+    def _iter_rows(self) -> Iterator[list[str]]:
+        row_tag = _ODS_TABLE + "table-row"
+        cell_tags = (_ODS_TABLE + "table-cell",
+                     _ODS_TABLE + "covered-table-cell")
+        table_tag = _ODS_TABLE + "table"
+        repeated_cols = _ODS_TABLE + "number-columns-repeated"
+        repeated_rows = _ODS_TABLE + "number-rows-repeated"
+
+        parents: list[Any] = []
+        values: list[str] = []
+        empty: int = 0      # empty cells not yet added to *values*
+        depth: int = 0      # nesting of table:table elements
+        for event, elem in iterparse(self._fh, events=("start", "end")):
+            if event == "start":
+                parents.append(elem)
+                if elem.tag == table_tag:
+                    depth += 1
+                elif elem.tag == row_tag and depth == 1:
+                    values, empty = [], 0
+                continue
+            parents.pop()
+            if depth != 1 and elem.tag != table_tag:
+                continue
+            if elem.tag in cell_tags:
+                if parents[-1].tag != row_tag:
+                    continue
+                count = int(elem.get(repeated_cols, "1"))
+                text = _ods_cell_text(elem)
+                if text:
+                    values.extend([""] * empty)
+                    values.extend([text] * count)
+                    empty = 0
+                else:
+                    empty += count
+                elem.clear()
+            elif elem.tag == row_tag:
+                if any(values):
+                    for _ in range(int(elem.get(repeated_rows, "1"))):
+                        yield list(values)
+                elem.clear()
+                if parents:
+                    parents[-1].remove(elem)
+            elif elem.tag == table_tag:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def fraction(self) -> float:
+        """Return the part of content.xml read so far (0.0 – 1.0)."""
+        return min(1.0, self._fh.tell() / self._size)
+
+    def close(self) -> None:
+        self._fh.close()
+        self._zip.close()
+
+    def __enter__(self) -> _OdsReader:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+
+def _ods_cell_text(cell: Any) -> str:
+    """Return the text of an ODS table cell; paragraphs are joined with ''."""
+    parts: list[str] = []
+
+    def walk(elem: Any) -> None:
+        if elem.tag == _ODS_TEXT + "s":
+            parts.append(" " * int(elem.get(_ODS_TEXT + "c", "1")))
+        elif elem.tag == _ODS_TEXT + "tab":
+            parts.append("\t")
+        elif elem.tag == _ODS_TEXT + "line-break":
+            parts.append("\n")
+        elif elem.text:
+            parts.append(elem.text)
+        for child in elem:
+            walk(child)
+            if child.tail:
+                parts.append(child.tail)
+
+    for p in cell.iter(_ODS_TEXT + "p"):
+        walk(p)
+    return "".join(parts)
+
+
+def _open_import(path: str) -> Union[_CsvReader, _OdsReader]:
+    """Return a streaming reader for a .csv or .ods file."""
+    if os.path.splitext(path)[1].lower() == ".ods":
+        return _OdsReader(path)
+    return _CsvReader(path)
+
+
+class _RowCleaner:
+    """
+    Turns the data rows of an imported file into chunks of rows that are
+    ready for _DB.import_rows(): every row is padded or cut to the number of
+    *columns* and stripped, and rows with an invalid value in a Number column
+    are dropped (and counted in *errors*).  Number columns are checked one
+    column at a time over the whole chunk.
+    """
+
+    def __init__(self, columns: list[ColDef],
+                 chunk_size: int = _IMPORT_CHUNK) -> None:
+        self.width: int = len(columns)
+        self.numbers: list[int] = [i for i, c in enumerate(columns)
+                                   if c["type"] == COL_TYPE_NUMBER]
+        self.chunk_size: int = chunk_size
+        self.rows_read: int = 0
+        self.errors: int = 0
+
+    def chunks(self, rows: Iterable[list[str]]) -> Iterator[list[list[str]]]:
+        chunk: list[list[str]] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield self.clean(chunk)
+                chunk = []
+        if chunk:
+            yield self.clean(chunk)
+
+    def clean(self, chunk: list[list[str]]) -> list[list[str]]:
+        width = self.width
+        pad: list[str] = [""] * width
+        cleaned: list[list[str]] = [
+            [v.strip() for v in (list(row) + pad)[:width]] for row in chunk]
+        self.rows_read += len(chunk)
+        bad: set[int] = set()
+        for ci in self.numbers:
+            bad.update(i for i, row in enumerate(cleaned)
+                       if row[ci] and not _is_number(row[ci]))
+        if bad:
+            self.errors += len(bad)
+            cleaned = [row for i, row in enumerate(cleaned) if i not in bad]
+        return cleaned
+
+
 # ---------------------------------------------------------------------------
 # Dialog: name a table (add or rename)
 # ---------------------------------------------------------------------------
@@ -1094,27 +924,30 @@ class _TableWidget(Gtk.Box):
         if not self._gramplet._require_handle():
             return
 
-        filters: list[tuple[str, str]] = [("CSV files", "*.csv")]
-        if _HAVE_ODF:
-            filters.append(("ODS spreadsheet", "*.ods"))
-        filters.append(("All files", "*"))
+        filters: list[tuple[str, str]] = [
+            ("CSV files", "*.csv"),
+            ("ODS spreadsheet", "*.ods"),
+            ("All files", "*"),
+        ]
 
         path = _ask_file_open(self._window(), "Import table", filters)
         if not path:
             return
 
-        ext: str = os.path.splitext(path)[1].lower()
+        # The file is read row by row while importing; only the header is
+        # read here.
+        try:
+            reader = _open_import(path)
+        except Exception as exc:
+            OkDialog("Import failed", str(exc))
+            return
+        with reader:
+            self._import_rows(path, reader)
 
+    def _import_rows(self, path: str,
+                     reader: Union[_CsvReader, _OdsReader]) -> None:
         try:
-            if ext == ".ods":
-                if not _HAVE_ODF:
-                    OkDialog("ODS not available",
-                             "The 'odfpy' package is not installed.\n"
-                             "Install it with:  pip install odfpy")
-                    return
-                header, data_rows = _import_ods(path)
-            else:
-                header, data_rows = _import_csv(path)
+            header: list[str] = next(reader.rows, [])
         except Exception as exc:
             OkDialog("Import failed", str(exc))
             return
@@ -1147,7 +980,8 @@ class _TableWidget(Gtk.Box):
             flags=Gtk.DialogFlags.MODAL,
             message_type=Gtk.MessageType.QUESTION,
             buttons=Gtk.ButtonsType.YES_NO,
-            text=(f"Import {len(data_rows)} row(s) into this table?\n\n"
+            text=(f"Import the rows of {os.path.basename(path)} "
+                  "into this table?\n\n"
                   f"Columns matched: {len(file_to_col)}\n"
                   "Existing rows will be kept; imported rows are appended."))
         resp = dlg.run()
@@ -1156,31 +990,37 @@ class _TableWidget(Gtk.Box):
             return
 
         handle: str = self._gramplet._current_handle  # type: ignore[assignment]
-        imported: int = 0
-        errors: int   = 0
-        for data_row in data_rows:
-            vals: list[str] = (list(data_row) + [""] * len(file_to_col))
-            vals = vals[:len(file_to_col)]
-            ok: bool = True
-            cleaned: list[str] = []
-            for col, val in zip(file_to_col, vals):
-                val = val.strip()
-                if col["type"] == COL_TYPE_NUMBER and val:
-                    try:
-                        _to_number(val)
-                    except ValueError:
-                        errors += 1
-                        ok = False
-                        break
-                cleaned.append(val)
-            if ok:
-                db.add_row(self.table_id, handle, file_to_col, cleaned)
-                imported += 1
+        cleaner = _RowCleaner(file_to_col)
+        progress = ProgressMeter("Import table", can_cancel=True,
+                                 parent=self._window())
+        progress.set_pass("Importing rows", mode=ProgressMeter.MODE_ACTIVITY)
+
+        def _progress(count: int) -> bool:
+            progress.set_header(
+                f"Imported {count} row(s) "
+                f"({int(100 * reader.fraction())}% of the file)")
+            return progress.step()
+
+        try:
+            imported: Optional[int] = db.import_rows(
+                self.table_id, handle, file_to_col,
+                cleaner.chunks(reader.rows), _progress)
+        except Exception as exc:
+            progress.close()
+            self.load(handle)
+            OkDialog("Import failed",
+                     f"{exc}\n\nNo rows were imported.")
+            return
+        progress.close()
 
         self.load(handle)
+        if imported is None:
+            OkDialog("Import cancelled", "No rows were imported.")
+            return
         msg: str = f"Imported {imported} row(s)."
-        if errors:
-            msg += f"\n{errors} row(s) skipped due to invalid number values."
+        if cleaner.errors:
+            msg += (f"\n{cleaner.errors} row(s) skipped due to invalid "
+                    "number values.")
         OkDialog("Import complete", msg)
 
     # ---------------------------------------------------------------- helpers
@@ -1222,6 +1062,7 @@ class TableDataBase(Gramplet):
     def init(self) -> None:
         self._current_handle: Optional[str] = None
         self._tab_widgets: dict[int, _TableWidget] = {}
+        self._prefetch_id: Optional[int] = None
 
         root = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=0)
 
@@ -1270,15 +1111,6 @@ class TableDataBase(Gramplet):
         if self.object_type != "Person":
             self.connect_signal(self.object_type, self._active_changed)
 
-        # Option B: purge orphaned rows once at startup.
-        # By the time post_init() runs, the previous session's undo stack
-        # has been discarded by Gramps, so any handle that no longer exists
-        # in the tree is truly gone and safe to clean up permanently.
-        # We do NOT connect to delete/add signals — that would race with
-        # Gramps' own undo stack and risk destroying data that the user
-        # could still recover via Ctrl-Z.
-        self._purge_orphaned_rows()
-
         handle: Optional[str] = self.get_active(self.object_type) or None
         self._reload(handle)
 
@@ -1295,47 +1127,12 @@ class TableDataBase(Gramplet):
         """Called when the family tree is opened, closed, or replaced."""
         _DB.invalidate(self.dbstate)
         self._tab_widgets.clear()
+        # Option B: deletes are only journaled; the rows are removed when
+        # the tree is opened again (see tabledata_db.py).  load_on_reg has
+        # normally tracked the tree already.
+        track_deletes(self.dbstate.db)
         self._reload(None)
 
-    def _purge_orphaned_rows(self) -> None:
-        """
-        Remove rows for handles that no longer exist in Gramps.
-
-        Safe to call at startup: Gramps discards the previous session's
-        undo stack when it opens a tree, so any stale handle is permanently
-        gone.  We never call this during a live session — deleting a person
-        and then hitting Undo should restore their rows intact.
-        """
-        db = self._get_db()
-        if db is None:
-            return
-        try:
-            _ITER_FN: dict[str, str] = {
-                "Person":     "iter_person_handles",
-                "Family":     "iter_family_handles",
-                "Event":      "iter_event_handles",
-                "Place":      "iter_place_handles",
-                "Source":     "iter_source_handles",
-                "Citation":   "iter_citation_handles",
-                "Repository": "iter_repository_handles",
-                "Media":      "iter_media_handles",
-            }
-            iter_fn = getattr(
-                self.dbstate.db,
-                _ITER_FN.get(self.object_type, ""),
-                None)
-            if iter_fn is None:
-                return
-            live_handles: set[str] = set(iter_fn())
-            removed = db.purge_orphaned_rows(self.object_type, live_handles)
-            if removed:
-                import logging
-                logging.getLogger(__name__).info(
-                    "TableData: purged %d orphaned row-cells for %s",
-                    removed, self.object_type)
-        except Exception:
-            pass  # never crash the gramplet over a cleanup operation
-
     # -----------------------------------------------------------------------
     # Reload
     # -----------------------------------------------------------------------
@@ -1348,9 +1145,67 @@ class TableDataBase(Gramplet):
             self._rebuild_notebook([])
             return
 
+        start: float = time.perf_counter()
+        cached: bool = handle is None or db.is_cached(handle)
         tables: list[TableDef] = db.get_tables(self.object_type)
         self._set_status("" if handle else f"No {self.object_type} selected")
         self._rebuild_notebook(tables)
+        LOG.debug("TableData %s: loaded %d table(s) for %s in %.1f ms (%s)",
+                  self.object_type, len(tables), handle,
+                  1000 * (time.perf_counter() - start),
+                  "cached" if cached else "from database")
+        if handle and tables and self._prefetch_id is None:
+            self._prefetch_id = GLib.idle_add(self._prefetch_neighbours)
+
+    def _prefetch_neighbours(self) -> bool:
+        """
+        Idle callback: load the rows of the objects next to the active one
+        in the active view, so that moving up or down the list is served
+        from the cache.
+        """
+        self._prefetch_id = None
+        handle = self._current_handle
+        db = self._get_db()
+        if handle is None or db is None:
+            return False
+        start: float = time.perf_counter()
+        handles = self._neighbour_handles(handle, _PREFETCH)
+        loaded: int = db.prefetch(handles)
+        LOG.debug("TableData %s: prefetched %d of %d neighbour(s) in %.1f ms",
+                  self.object_type, loaded, len(handles),
+                  1000 * (time.perf_counter() - start))
+        return False
+
+    def _neighbour_handles(self, handle: str, count: int) -> list[str]:
+        """
+        Return the handles of up to *count* rows before and after *handle*
+        in the active view, if it is a list of this object type.
+        """
+        try:
+            page = self.uistate.viewmanager.active_page
+            if page is None or page.navigation_type() != self.object_type:
+                return []
+            model = page.model
+            if model is None:
+                return []
+            it = model.get_iter_from_handle(handle)
+            if it is None:
+                return []
+            parent = model.iter_parent(it)
+            index: int = model.get_path(it).get_indices()[-1]
+            size: int = model.iter_n_children(parent)
+            handles: list[str] = []
+            for n in range(max(0, index - count),
+                           min(size, index + count + 1)):
+                if n == index:
+                    continue
+                node = model.iter_nth_child(parent, n)
+                h = model.get_handle_from_iter(node) if node else None
+                if h:
+                    handles.append(h)
+            return handles
+        except Exception:
+            return []  # prefetching is only an optimisation
 
     def _rebuild_notebook(self, tables: list[TableDef]) -> None:
         """Synchronise the Gtk.Notebook to match *tables*."""
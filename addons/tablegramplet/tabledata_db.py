@@ -0,0 +1,1067 @@
+# tabledata_db.py
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2024  (your name)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+tabledata_db  –  the tabledata.db storage of the TableData gramplets.
+
+This module has no GUI dependencies (no Gtk, no gramps.gui, no ODF), so it
+is also used by the filter rules in tabledata_rules.py, which Gramps
+evaluates from the command line and from reports as well.
+
+Database schema
+===============
+One SQLite file per family tree:  <tree_dir>/tabledata.db
+
+  tables  (id INTEGER PK, object_type TEXT, tab_order INTEGER, name TEXT)
+
+  columns (table_id INTEGER → tables.id,
+           col_order INTEGER, name TEXT, col_type TEXT,
+           PRIMARY KEY (table_id, col_order))
+
+  rows    (table_id INTEGER → tables.id,
+           object_handle TEXT,
+           row_order INTEGER, data TEXT,
+           PRIMARY KEY (table_id, object_handle, row_order))
+
+Column schema is per-table and shared across all objects.
+Row data is per-table AND per-object (keyed by Gramps handle).
+
+Each table row is stored as ONE database row.  *data* is a JSON array of
+the cell values indexed by col_order (a missing or short array means empty
+cells), so loading an object's rows is a single range scan on the primary
+key and a bulk import is one executemany() over whole rows.
+
+  numbers (table_id, object_handle, row_order → rows,
+           col_order INTEGER, value REAL,
+           PRIMARY KEY (table_id, object_handle, row_order, col_order))
+  INDEX idx_numbers_value ON numbers (table_id, col_order, value)
+
+  deleted (object_type TEXT, object_handle TEXT,
+           PRIMARY KEY (object_type, object_handle))
+
+PRAGMA user_version records which one-time backfills of _migrate() have
+completed (see _VERSION_NUMBERS and _VERSION_DELETED).
+
+Older versions stored one database row per cell
+(rows.col_order / rows.value); _migrate() converts such a file
+automatically the first time it is opened.
+
+*numbers* is a secondary index: the value of every cell of a Number column
+that parses as a number, stored as REAL.  It is written in the same
+transaction as the row and lets query_rows() / find_handles() / aggregate()
+filter, sort and aggregate a column across ALL objects of a type without
+decoding the JSON of every row.  Deleting or renumbering a row cascades to
+its numbers.  Conditions on String / URL columns use the SQL function
+tabledata_text(data, col_order), which returns the case-folded cell text.
+
+Stale-data strategy (Option B — journal, purge at startup)
+==========================================================
+When a Gramps object is deleted, its rows in tabledata.db are left alone
+during that session.  This is deliberate: Gramps' undo stack is still live,
+and hard-deleting rows immediately would lose data that the user could still
+recover with Ctrl-Z.  Only the handle is recorded in the *deleted* journal
+(db signal "<type>-delete").  A batch transaction emits "<type>-rebuild"
+instead of the delete signals; then every stored handle of the type is
+journaled.
+
+The journal is written by track_deletes(), which the GENERAL plugin
+registration (load_on_reg) calls for every tree that is opened, for all
+object types, so deletes are journaled also when no TableData gramplet is
+loaded.  When the tree is opened the next time, track_deletes() calls
+purge_deleted_rows(), which looks up each journaled handle in Gramps and
+permanently removes the rows of those that are still gone (an undone delete
+brings the object back, and its rows are kept).  By then the previous
+session's undo stack has been discarded, so it is safe to do so.  Only the
+journaled handles are checked, so opening a large tree costs nothing when
+nothing was deleted.  When the journal is created for an existing file it is
+filled with every stored handle, so the first purge checks them all once.
+purge_orphaned_rows() removes the rows of all handles that are missing from
+a given full set of live handles.
+
+Orphaned rows accumulate only within a single session and are invisible to
+the user (there is no handle to select them by), so this is purely a storage
+concern rather than a correctness concern.
+
+Caching
+=======
+The _DB instance of a tree is shared by all TableData gramplets and keeps
+the table list, the column definitions and the rows of the most recently
+used objects in memory.  The rows of one object are loaded for ALL its
+tables with a single query, and after the active object changes the
+gramplet loads the rows of the neighbouring objects of the active view in
+the same way (in an idle callback).  Every write through _DB drops the
+cached data it affects.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, ClassVar, Iterable, Optional, Union
+
+LOG = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Type aliases
+# ---------------------------------------------------------------------------
+# A column definition dict, e.g. {"col_order": 0, "name": "Height", "type": "Number"}
+ColDef = dict[str, Any]
+# A row dict, e.g. {"row_order": 0, "values": ["72.5", "kg"]}
+RowData = dict[str, Any]
+# A table definition dict, e.g. {"id": 1, "name": "Measurements"}
+TableDef = dict[str, Any]
+
+# ---------------------------------------------------------------------------
+# Column-type constants
+# ---------------------------------------------------------------------------
+COL_TYPE_NUMBER: str = "Number"
+COL_TYPE_STRING: str = "String"
+COL_TYPE_URL: str    = "URL"
+COL_TYPES: list[str] = [COL_TYPE_NUMBER, COL_TYPE_STRING, COL_TYPE_URL]
+
+# Objects whose rows _DB keeps in memory (LRU), and how many objects before
+# and after the active one in the active view are loaded in advance
+_ROW_CACHE_SIZE: int = 500
+_PREFETCH: int = 10
+
+# Operators of query conditions; "contains" is a case-insensitive substring
+# match, the others compare numbers in Number columns and case-folded text
+# in other columns.
+QUERY_OPS: list[str] = ["=", "!=", "<", "<=", ">", ">=", "contains"]
+# Functions of _DB.aggregate()
+AGGREGATES: list[str] = ["count", "sum", "min", "max", "avg"]
+
+# PRAGMA user_version of tabledata.db: the backfills _migrate() has done
+_VERSION_NUMBERS: int = 1  # numbers index built from the existing rows
+_VERSION_DELETED: int = 2  # deleted journal seeded with the stored handles
+
+# Plain decimal numbers; anything else is checked with _to_number()
+_NUMBER_RE = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+def _to_number(text: str) -> Union[int, float]:
+    """Parse *text* as an int, falling back to float.  Raises ValueError."""
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _is_number(text: str) -> bool:
+    """Return True if *text* is accepted by _to_number()."""
+    if _NUMBER_RE.fullmatch(text):
+        return True
+    try:
+        _to_number(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _number_value(text: str) -> Optional[float]:
+    """
+    Return *text* as a float for the numbers index, or None.  NaN and the
+    infinities are not indexed (SQLite stores NaN as NULL).
+    """
+    if not text:
+        return None
+    try:
+        value = float(_to_number(text))
+    except (ValueError, OverflowError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def _cell_text(data: str, col_order: int) -> str:
+    """SQL function tabledata_text(data, col_order): the case-folded cell."""
+    values = json.loads(data)
+    return values[col_order].casefold() if col_order < len(values) else ""
+
+
+def _db_path(dbstate: Any) -> str:
+    """Return the absolute path to tabledata.db for the currently open tree."""
+    return os.path.join(dbstate.db.get_save_path(), "tabledata.db")
+
+
+# ---------------------------------------------------------------------------
+# Database access layer
+# ---------------------------------------------------------------------------
+class _DB:
+    """Thin sqlite3 wrapper; one instance is cached per tree path."""
+
+    _cache: ClassVar[dict[str, _DB]] = {}
+
+    # ------------------------------------------------------------------ cache
+    @classmethod
+    def get(cls, dbstate: Any) -> _DB:
+        """Return the cached _DB for the current tree, creating it if needed."""
+        return cls.get_path(_db_path(dbstate))
+
+    @classmethod
+    def get_path(cls, path: str) -> _DB:
+        """Return the cached _DB for the file *path*, creating it if needed."""
+        if path not in cls._cache:
+            cls._cache[path] = cls(path)
+        return cls._cache[path]
+
+    @classmethod
+    def invalidate(cls, dbstate: Any) -> None:
+        """Close and remove the cached connection for the current tree."""
+        try:
+            path = _db_path(dbstate)
+        except Exception:
+            return
+        inst = cls._cache.pop(path, None)
+        if inst is not None:
+            try:
+                inst._con.close()
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------- init
+    def __init__(self, path: str) -> None:
+        self._con: sqlite3.Connection = sqlite3.connect(
+            path, check_same_thread=False)
+        self._con.row_factory = sqlite3.Row
+        # Must be set per-connection, outside executescript
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA foreign_keys=ON")
+        self._con.create_function("tabledata_text", 2, _cell_text,
+                                  deterministic=True)
+        self._tables: dict[str, list[TableDef]] = {}
+        self._columns: dict[int, list[ColDef]] = {}
+        # handle -> {table_id: [(row_order, values)]}
+        self._objects: OrderedDict[
+            str, dict[int, list[tuple[int, list[str]]]]] = OrderedDict()
+        self._migrate()
+        self._con.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS purge_handles "
+            "(object_handle TEXT PRIMARY KEY)")
+
+    def _schema_has_table_id(self) -> bool:
+        """Return True if the *columns* table already has a *table_id* column."""
+        cur = self._con.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type='table' AND name='columns'")
+        if cur.fetchone() is None:
+            return True   # fresh install — no old schema to worry about
+        cur = self._con.execute("PRAGMA table_info(columns)")
+        return any(row["name"] == "table_id" for row in cur)
+
+    def _rows_are_cells(self) -> bool:
+        """Return True if the *rows* table still uses the one-cell-per-row layout."""
+        cur = self._con.execute("PRAGMA table_info(rows)")
+        return any(row["name"] == "col_order" for row in cur)
+
+    def _migrate(self) -> None:
+        """Create or upgrade the database schema."""
+        # Drop old single-table schema (columns keyed by object_type) if present.
+        if not self._schema_has_table_id():
+            self._con.executescript("""
+                DROP TABLE IF EXISTS rows;
+                DROP TABLE IF EXISTS columns;
+            """)
+        elif self._rows_are_cells():
+            self._con.execute("ALTER TABLE rows RENAME TO rows_cells")
+            self._con.commit()
+        cur = self._con.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type='table' AND name='numbers'")
+        new_numbers: bool = cur.fetchone() is None
+        cur = self._con.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type='table' AND name='deleted'")
+        new_deleted: bool = cur.fetchone() is None
+
+        self._con.executescript("""
+            CREATE TABLE IF NOT EXISTS tables (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                object_type TEXT    NOT NULL,
+                tab_order   INTEGER NOT NULL DEFAULT 0,
+                name        TEXT    NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS columns (
+                table_id  INTEGER NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
+                col_order INTEGER NOT NULL,
+                name      TEXT    NOT NULL,
+                col_type  TEXT    NOT NULL DEFAULT 'String',
+                PRIMARY KEY (table_id, col_order)
+            );
+            CREATE TABLE IF NOT EXISTS rows (
+                table_id      INTEGER NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
+                object_handle TEXT    NOT NULL,
+                row_order     INTEGER NOT NULL,
+                data          TEXT    NOT NULL DEFAULT '[]',
+                PRIMARY KEY (table_id, object_handle, row_order)
+            );
+            CREATE TABLE IF NOT EXISTS numbers (
+                table_id      INTEGER NOT NULL,
+                object_handle TEXT    NOT NULL,
+                row_order     INTEGER NOT NULL,
+                col_order     INTEGER NOT NULL,
+                value         REAL    NOT NULL,
+                PRIMARY KEY (table_id, object_handle, row_order, col_order),
+                FOREIGN KEY (table_id, object_handle, row_order)
+                    REFERENCES rows (table_id, object_handle, row_order)
+                    ON DELETE CASCADE ON UPDATE CASCADE
+            );
+            CREATE INDEX IF NOT EXISTS idx_numbers_value
+                ON numbers (table_id, col_order, value);
+            CREATE INDEX IF NOT EXISTS idx_rows_handle
+                ON rows (object_handle);
+            CREATE TABLE IF NOT EXISTS deleted (
+                object_type   TEXT NOT NULL,
+                object_handle TEXT NOT NULL,
+                PRIMARY KEY (object_type, object_handle)
+            );
+        """)
+        self._con.commit()
+        # Re-enable after executescript (which resets per-connection PRAGMAs)
+        self._con.execute("PRAGMA foreign_keys=ON")
+        cur = self._con.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type='table' AND name='rows_cells'")
+        if cur.fetchone() is not None:
+            self._migrate_cells()
+        # The backfills are committed together with the new user_version,
+        # so one that fails is run again the next time the file is opened.
+        version: int = self._con.execute("PRAGMA user_version").fetchone()[0]
+        if version < _VERSION_NUMBERS or new_numbers:
+            with self._con:
+                for r in self._con.execute("SELECT id FROM tables").fetchall():
+                    self._reindex_numbers(r["id"])
+                version = max(version, _VERSION_NUMBERS)
+                self._con.execute(f"PRAGMA user_version={version}")
+        if version < _VERSION_DELETED or new_deleted:
+            # files from before the journal: check every stored handle once
+            with self._con:
+                self._journal_stored_handles(None)
+                version = max(version, _VERSION_DELETED)
+                self._con.execute(f"PRAGMA user_version={version}")
+
+    def _migrate_cells(self) -> None:
+        """Convert the cells of the old *rows_cells* table into JSON rows."""
+        cur = self._con.execute(
+            "SELECT table_id, object_handle, row_order, col_order, value "
+            "FROM rows_cells "
+            "ORDER BY table_id, object_handle, row_order, col_order")
+
+        def grouped() -> Iterable[tuple[int, str, int, str]]:
+            key: Optional[tuple[int, str, int]] = None
+            values: list[str] = []
+            for r in cur:
+                k = (r["table_id"], r["object_handle"], r["row_order"])
+                if k != key:
+                    if key is not None:
+                        yield (*key, _encode_row(values))
+                    key, values = k, []
+                co: int = r["col_order"]
+                if co >= len(values):
+                    values.extend([""] * (co + 1 - len(values)))
+                values[co] = r["value"]
+            if key is not None:
+                yield (*key, _encode_row(values))
+
+        with self._con:
+            self._con.executemany(
+                "INSERT OR REPLACE INTO rows "
+                "(table_id, object_handle, row_order, data) VALUES (?,?,?,?)",
+                list(grouped()))
+            self._con.execute("DROP TABLE rows_cells")
+
+    # ── tables ──────────────────────────────────────────────────────────────
+    def get_tables(self, object_type: str) -> list[TableDef]:
+        """Return all tables for *object_type*, ordered by tab_order then id."""
+        if object_type not in self._tables:
+            cur = self._con.execute(
+                "SELECT id, name FROM tables "
+                "WHERE object_type=? ORDER BY tab_order, id",
+                (object_type,))
+            self._tables[object_type] = [
+                {"id": r["id"], "name": r["name"]} for r in cur]
+        return [dict(t) for t in self._tables[object_type]]
+
+    def add_table(self, object_type: str, name: str) -> int:
+        """Insert a new table row and return its new id."""
+        cur = self._con.execute(
+            "SELECT COALESCE(MAX(tab_order)+1,0) FROM tables "
+            "WHERE object_type=?", (object_type,))
+        order: int = cur.fetchone()[0]
+        self._tables.clear()
+        cur = self._con.execute(
+            "INSERT INTO tables (object_type, tab_order, name) VALUES (?,?,?)",
+            (object_type, order, name))
+        self._con.commit()
+        return cur.lastrowid  # type: ignore[return-value]
+
+    def rename_table(self, table_id: int, name: str) -> None:
+        self._tables.clear()
+        self._con.execute("UPDATE tables SET name=? WHERE id=?",
+                          (name, table_id))
+        self._con.commit()
+
+    def delete_table(self, table_id: int) -> None:
+        """Delete a table; CASCADE removes its columns and rows automatically."""
+        self._tables.clear()
+        self._columns.pop(table_id, None)
+        self._objects.clear()
+        self._con.execute("DELETE FROM tables WHERE id=?", (table_id,))
+        self._con.commit()
+
+    # ── columns ─────────────────────────────────────────────────────────────
+    def get_columns(self, table_id: int) -> list[ColDef]:
+        """Return all column definitions for *table_id*, ordered by col_order."""
+        if table_id not in self._columns:
+            cur = self._con.execute(
+                "SELECT col_order, name, col_type FROM columns "
+                "WHERE table_id=? ORDER BY col_order", (table_id,))
+            self._columns[table_id] = [{"col_order": r["col_order"],
+                                        "name":      r["name"],
+                                        "type":      r["col_type"]}
+                                       for r in cur]
+        return [dict(c) for c in self._columns[table_id]]
+
+    def add_column(self, table_id: int, name: str, col_type: str) -> None:
+        cur = self._con.execute(
+            "SELECT COALESCE(MAX(col_order)+1,0) FROM columns "
+            "WHERE table_id=?", (table_id,))
+        order: int = cur.fetchone()[0]
+        self._columns.pop(table_id, None)
+        self._con.execute(
+            "INSERT INTO columns (table_id, col_order, name, col_type) "
+            "VALUES (?,?,?,?)", (table_id, order, name, col_type))
+        self._con.commit()
+
+    def update_column(self, table_id: int, col_order: int,
+                      name: str, col_type: str) -> None:
+        self._columns.pop(table_id, None)
+        with self._con:
+            self._con.execute(
+                "UPDATE columns SET name=?, col_type=? "
+                "WHERE table_id=? AND col_order=?",
+                (name, col_type, table_id, col_order))
+            self._reindex_numbers(table_id)
+
+    def _number_columns(self, table_id: int) -> list[int]:
+        """Return the col_order of every Number column of *table_id*."""
+        cur = self._con.execute(
+            "SELECT col_order FROM columns WHERE table_id=? AND col_type=?",
+            (table_id, COL_TYPE_NUMBER))
+        return [r[0] for r in cur]
+
+    def _reindex_numbers(self, table_id: int) -> None:
+        """Rebuild the numbers index of *table_id*.  The caller commits."""
+        self._con.execute("DELETE FROM numbers WHERE table_id=?", (table_id,))
+        number_cols = self._number_columns(table_id)
+        if not number_cols:
+            return
+        cur = self._con.execute(
+            "SELECT object_handle, row_order, data FROM rows WHERE table_id=?",
+            (table_id,))
+        params: list[tuple[int, str, int, int, float]] = []
+        for r in cur.fetchall():
+            params.extend(_number_params(
+                table_id, r["object_handle"], r["row_order"],
+                json.loads(r["data"]), number_cols))
+        self._con.executemany(
+            "INSERT INTO numbers "
+            "(table_id, object_handle, row_order, col_order, value) "
+            "VALUES (?,?,?,?,?)", params)
+
+    def swap_columns(self, table_id: int, col_a: int, col_b: int) -> None:
+        """Swap the positions of two columns (and their row data)."""
+        TEMP: int = -1
+
+        def swap(values: list[str]) -> None:
+            width = max(col_a, col_b) + 1
+            if len(values) < width:
+                values.extend([""] * (width - len(values)))
+            values[col_a], values[col_b] = values[col_b], values[col_a]
+
+        self._columns.pop(table_id, None)
+        self._objects.clear()
+        with self._con:
+            for tbl in ("columns", "numbers"):
+                self._con.execute(
+                    f"UPDATE {tbl} SET col_order=? "
+                    "WHERE table_id=? AND col_order=?",
+                    (TEMP, table_id, col_a))
+                self._con.execute(
+                    f"UPDATE {tbl} SET col_order=? "
+                    "WHERE table_id=? AND col_order=?",
+                    (col_a, table_id, col_b))
+                self._con.execute(
+                    f"UPDATE {tbl} SET col_order=? "
+                    "WHERE table_id=? AND col_order=?",
+                    (col_b, table_id, TEMP))
+            self._rewrite_rows(table_id, swap)
+
+    def delete_column(self, table_id: int, col_order: int) -> None:
+        """Delete a column and renumber the remaining columns."""
+
+        def delete(values: list[str]) -> None:
+            if col_order < len(values):
+                del values[col_order]
+
+        self._columns.pop(table_id, None)
+        self._objects.clear()
+        with self._con:
+            for tbl in ("columns", "numbers"):
+                self._con.execute(
+                    f"DELETE FROM {tbl} WHERE table_id=? AND col_order=?",
+                    (table_id, col_order))
+                self._con.execute(
+                    f"UPDATE {tbl} SET col_order=col_order-1 "
+                    "WHERE table_id=? AND col_order>?",
+                    (table_id, col_order))
+            self._rewrite_rows(table_id, delete)
+
+    def _rewrite_rows(self, table_id: int, change: Any) -> None:
+        """
+        Apply *change* (a function that edits a list of values in place) to
+        every row of *table_id*.  Used by the column operations, which are
+        rare compared with row reads and writes.  The caller commits.
+        """
+        cur = self._con.execute(
+            "SELECT object_handle, row_order, data FROM rows WHERE table_id=?",
+            (table_id,))
+        updates: list[tuple[str, int, int, str]] = []
+        for r in cur.fetchall():
+            values: list[str] = json.loads(r["data"])
+            change(values)
+            updates.append((_encode_row(values), table_id,
+                            r["object_handle"], r["row_order"]))
+        self._con.executemany(
+            "UPDATE rows SET data=? "
+            "WHERE table_id=? AND object_handle=? AND row_order=?",
+            updates)
+
+    # ── rows ────────────────────────────────────────────────────────────────
+    def get_rows(self, table_id: int, object_handle: str,
+                 columns: list[ColDef]) -> list[RowData]:
+        """Return all rows for *(table_id, object_handle)*, ordered by row_order."""
+        if not columns:
+            return []
+        col_orders: list[int] = [c["col_order"] for c in columns]
+        self.prefetch([object_handle])
+        self._objects.move_to_end(object_handle)
+        result: list[RowData] = []
+        for ro, data in self._objects[object_handle].get(table_id, []):
+            n = len(data)
+            result.append({"row_order": ro,
+                           "values": [data[co] if co < n else ""
+                                      for co in col_orders]})
+        return result
+
+    def is_cached(self, object_handle: str) -> bool:
+        """Return True if the rows of *object_handle* are in memory."""
+        return object_handle in self._objects
+
+    def prefetch(self, handles: Iterable[str]) -> int:
+        """
+        Load the rows of all tables of every handle in *handles* that is not
+        cached yet, with one query.  Returns the number of handles loaded.
+        """
+        missing: list[str] = [h for h in dict.fromkeys(handles)
+                              if h not in self._objects]
+        if not missing:
+            return 0
+        loaded: dict[str, dict[int, list[tuple[int, list[str]]]]] = {
+            h: {} for h in missing}
+        ph = ",".join("?" * len(missing))
+        cur = self._con.execute(
+            "SELECT table_id, object_handle, row_order, data FROM rows "
+            f"WHERE object_handle IN ({ph}) "
+            "ORDER BY table_id, object_handle, row_order",
+            missing)
+        for r in cur:
+            loaded[r["object_handle"]].setdefault(r["table_id"], []).append(
+                (r["row_order"], json.loads(r["data"])))
+        for h in missing:
+            self._objects[h] = loaded[h]
+        while len(self._objects) > _ROW_CACHE_SIZE:
+            self._objects.popitem(last=False)
+        return len(missing)
+
+    def purge_orphaned_rows(self, object_type: str,
+                             live_handles: set[str]) -> int:
+        """
+        Hard-delete rows whose object_handle no longer exists in Gramps.
+
+        Called once at startup, after the previous session's undo stack has
+        been discarded, so it is safe to permanently remove data for any
+        handle that Gramps no longer knows about.
+
+        *live_handles* must be the complete set of handles that currently
+        exist in Gramps for this object type.  As a safety guard, the method
+        does nothing when *live_handles* is empty — an empty set passed by
+        mistake would otherwise wipe all stored data.
+
+        Returns the number of table rows permanently removed.
+        """
+        if not live_handles:
+            return 0
+
+        cur = self._con.execute(
+            "SELECT DISTINCT object_handle FROM rows "
+            "WHERE table_id IN "
+            "  (SELECT id FROM tables WHERE object_type=?)",
+            (object_type,))
+        stored: set[str] = {r[0] for r in cur}
+        orphans: set[str] = stored - live_handles
+
+        if not orphans:
+            return 0
+        with self._con:
+            return self._delete_handles(object_type, orphans)
+
+    def journal_deleted(self, object_type: str,
+                        handles: Iterable[str]) -> None:
+        """
+        Record handles that Gramps has deleted.  Their rows are kept (the
+        delete can still be undone) until purge_deleted_rows() runs at the
+        start of a later session.
+        """
+        with self._con:
+            self._con.executemany(
+                "INSERT OR IGNORE INTO deleted (object_type, object_handle) "
+                "VALUES (?,?)",
+                ((object_type, h) for h in handles))
+
+    def journal_stored_handles(self,
+                               object_type: Optional[str] = None) -> None:
+        """
+        Journal every handle that has rows in the tables of *object_type*
+        (all types if None), so that the next purge_deleted_rows() checks
+        them all.  Used when objects may have been deleted without a delete
+        signal, e.g. in a batch transaction.
+        """
+        with self._con:
+            self._journal_stored_handles(object_type)
+
+    def _journal_stored_handles(self, object_type: Optional[str]) -> None:
+        """journal_stored_handles() without the commit."""
+        sql: str = ("INSERT OR IGNORE INTO deleted (object_type, object_handle) "
+                    "SELECT DISTINCT t.object_type, r.object_handle "
+                    "FROM rows r JOIN tables t ON t.id = r.table_id")
+        if object_type is None:
+            self._con.execute(sql)
+        else:
+            self._con.execute(sql + " WHERE t.object_type=?", (object_type,))
+
+    def journaled_handles(self, object_type: str) -> list[str]:
+        cur = self._con.execute(
+            "SELECT object_handle FROM deleted WHERE object_type=? "
+            "ORDER BY object_handle", (object_type,))
+        return [r[0] for r in cur]
+
+    def purge_deleted_rows(self, object_type: str,
+                           exists: Callable[[str], bool]) -> int:
+        """
+        Hard-delete the rows of the journaled handles of *object_type* for
+        which *exists(handle)* is false, and clear the journal of the type.
+
+        Call only at startup, like purge_orphaned_rows().  If *exists*
+        raises, nothing is removed and the journal is kept.
+
+        Returns the number of table rows permanently removed.
+        """
+        handles: list[str] = self.journaled_handles(object_type)
+        if not handles:
+            return 0
+        gone: list[str] = [h for h in handles if not exists(h)]
+        with self._con:
+            count: int = self._delete_handles(object_type, gone)
+            self._con.execute("DELETE FROM deleted WHERE object_type=?",
+                              (object_type,))
+        return count
+
+    def _delete_handles(self, object_type: str,
+                        handles: Iterable[str]) -> int:
+        """
+        Delete all rows of *handles* in the tables of *object_type* and
+        return the number of rows deleted.  The handles are joined through
+        the temporary table *purge_handles*, so there is no limit on their
+        number.  Must be called inside a transaction.
+        """
+        handles = list(handles)
+        if not handles:
+            return 0
+        self._con.execute("DELETE FROM purge_handles")
+        self._con.executemany(
+            "INSERT OR IGNORE INTO purge_handles (object_handle) VALUES (?)",
+            ((h,) for h in handles))
+        cur = self._con.execute(
+            "DELETE FROM rows WHERE object_handle IN "
+            "  (SELECT object_handle FROM purge_handles) "
+            "AND table_id IN "
+            "  (SELECT id FROM tables WHERE object_type=?)",
+            (object_type,))
+        self._con.execute("DELETE FROM purge_handles")
+        for h in handles:
+            self._objects.pop(h, None)
+        return cur.rowcount
+
+
+    def add_row(self, table_id: int, object_handle: str,
+                columns: list[ColDef], values: list[str]) -> None:
+        self.add_rows(table_id, object_handle, columns, [values])
+
+    def add_rows(self, table_id: int, object_handle: str,
+                 columns: list[ColDef],
+                 rows: Iterable[list[str]]) -> int:
+        """
+        Append *rows* (lists of values matching *columns*) after the existing
+        rows of the object in one transaction.  Returns the number added.
+        """
+        return self.import_rows(table_id, object_handle, columns,
+                                [rows]) or 0
+
+    def import_rows(self, table_id: int, object_handle: str,
+                    columns: list[ColDef],
+                    chunks: Iterable[Iterable[list[str]]],
+                    progress: Optional[Callable[[int], bool]] = None
+                    ) -> Optional[int]:
+        """
+        Append the rows of *chunks* after the existing rows of the object,
+        one executemany() per chunk, all in ONE transaction.
+
+        *progress* is called after each chunk with the number of rows written
+        so far; if it returns True the whole import is rolled back and None
+        is returned.  An exception raised while reading *chunks* also rolls
+        back.  Returns the number of rows added.
+        """
+        cur = self._con.execute(
+            "SELECT COALESCE(MAX(row_order)+1,0) FROM rows "
+            "WHERE table_id=? AND object_handle=?",
+            (table_id, object_handle))
+        ro: int = cur.fetchone()[0]
+        self._objects.pop(object_handle, None)
+        number_cols = self._number_columns(table_id)
+        count: int = 0
+        try:
+            with self._con:
+                for chunk in chunks:
+                    params: list[tuple[int, str, int, str]] = []
+                    numbers: list[tuple[int, str, int, int, float]] = []
+                    for values in chunk:
+                        data = _row_values(columns, values)
+                        params.append(
+                            (table_id, object_handle, ro, _encode_row(data)))
+                        numbers.extend(_number_params(
+                            table_id, object_handle, ro, data, number_cols))
+                        ro += 1
+                    self._con.executemany(
+                        "INSERT INTO rows "
+                        "(table_id, object_handle, row_order, data) "
+                        "VALUES (?,?,?,?)", params)
+                    self._con.executemany(
+                        "INSERT INTO numbers "
+                        "(table_id, object_handle, row_order, col_order, value) "
+                        "VALUES (?,?,?,?,?)", numbers)
+                    count += len(params)
+                    if progress is not None and progress(count):
+                        raise _ImportCancelled()
+        except _ImportCancelled:
+            return None
+        return count
+
+    def update_row(self, table_id: int, object_handle: str, row_order: int,
+                   columns: list[ColDef], values: list[str]) -> None:
+        """Set the values of *columns*; other cells of the row are kept."""
+        cur = self._con.execute(
+            "SELECT data FROM rows "
+            "WHERE table_id=? AND object_handle=? AND row_order=?",
+            (table_id, object_handle, row_order))
+        r = cur.fetchone()
+        data: list[str] = json.loads(r["data"]) if r is not None else []
+        data = _row_values(columns, values, data)
+        self._objects.pop(object_handle, None)
+        with self._con:
+            self._con.execute(
+                "DELETE FROM numbers "
+                "WHERE table_id=? AND object_handle=? AND row_order=?",
+                (table_id, object_handle, row_order))
+            self._con.execute(
+                "INSERT OR REPLACE INTO rows "
+                "(table_id, object_handle, row_order, data) VALUES (?,?,?,?)",
+                (table_id, object_handle, row_order, _encode_row(data)))
+            self._con.executemany(
+                "INSERT INTO numbers "
+                "(table_id, object_handle, row_order, col_order, value) "
+                "VALUES (?,?,?,?,?)",
+                _number_params(table_id, object_handle, row_order, data,
+                               self._number_columns(table_id)))
+
+    def delete_row(self, table_id: int, object_handle: str,
+                   row_order: int) -> None:
+        """Delete a row and compact row_order for the same object."""
+        self._objects.pop(object_handle, None)
+        with self._con:
+            self._con.execute(
+                "DELETE FROM rows "
+                "WHERE table_id=? AND object_handle=? AND row_order=?",
+                (table_id, object_handle, row_order))
+            self._con.execute(
+                "UPDATE rows SET row_order=row_order-1 "
+                "WHERE table_id=? AND object_handle=? AND row_order>?",
+                (table_id, object_handle, row_order))
+
+    # ── queries across objects ──────────────────────────────────────────────
+    def find_table(self, object_type: str, name: str) -> Optional[int]:
+        """Return the id of the table called *name* (any case), or None."""
+        for table in self.get_tables(object_type):
+            if table["name"].casefold() == name.strip().casefold():
+                return table["id"]
+        return None
+
+    def _conditions_sql(self, table_id: int,
+                        conditions: Iterable[tuple[int, str, str]]
+                        ) -> tuple[str, str, list[Any], list[Any]]:
+        """
+        Return *(joins, where, join_params, where_params)* that restrict
+        *rows r* to the rows matching ALL *conditions*.  A condition is
+        *(col_order, op, value)* with *op* in QUERY_OPS.  Numeric comparisons
+        on Number columns use the numbers index; a row whose cell is empty
+        or not a number never matches them.  Raises ValueError for an
+        unknown operator or a non-numeric value for a Number column.
+        """
+        number_cols = set(self._number_columns(table_id))
+        joins: list[str] = []
+        where: list[str] = []
+        join_params: list[Any] = []
+        where_params: list[Any] = []
+        for i, (col_order, op, value) in enumerate(conditions):
+            if op not in QUERY_OPS:
+                raise ValueError(f"Unknown operator: {op}")
+            sql_op = "=" if op == "contains" else op
+            if op != "contains" and col_order in number_cols:
+                number = _number_value(value.strip())
+                if number is None:
+                    raise ValueError(f"Not a number: {value}")
+                joins.append(
+                    f"JOIN numbers n{i} ON n{i}.table_id=r.table_id "
+                    f"AND n{i}.object_handle=r.object_handle "
+                    f"AND n{i}.row_order=r.row_order "
+                    f"AND n{i}.col_order=? AND n{i}.value {sql_op} ?")
+                join_params += [col_order, number]
+            elif op == "contains":
+                where.append("instr(tabledata_text(r.data, ?), ?) > 0")
+                where_params += [col_order, value.casefold()]
+            else:
+                where.append(f"tabledata_text(r.data, ?) {sql_op} ?")
+                where_params += [col_order, value.casefold()]
+        where_sql = "".join(f" AND {w}" for w in where)
+        return " ".join(joins), where_sql, join_params, where_params
+
+    def find_handles(self, table_id: int,
+                     conditions: Iterable[tuple[int, str, str]]) -> set[str]:
+        """Return the handles of the objects with a row matching *conditions*."""
+        joins, where, jp, wp = self._conditions_sql(table_id, conditions)
+        cur = self._con.execute(
+            f"SELECT DISTINCT r.object_handle FROM rows r {joins} "
+            f"WHERE r.table_id=?{where}",
+            jp + [table_id] + wp)
+        return {r[0] for r in cur}
+
+    def query_rows(self, table_id: int, columns: list[ColDef],
+                   conditions: Iterable[tuple[int, str, str]] = (),
+                   order_by: Optional[int] = None, descending: bool = False,
+                   limit: Optional[int] = None
+                   ) -> list[tuple[str, RowData]]:
+        """
+        Return *(object_handle, row)* for the rows of ALL objects that match
+        *conditions*, sorted by the column *order_by* (numerically for a
+        Number column, empty values last) or else by handle and row_order.
+        """
+        joins, where, jp, wp = self._conditions_sql(table_id, conditions)
+        order: str = "r.object_handle, r.row_order"
+        if order_by is not None:
+            direction = "DESC" if descending else "ASC"
+            if order_by in self._number_columns(table_id):
+                joins += (" LEFT JOIN numbers s ON s.table_id=r.table_id "
+                          "AND s.object_handle=r.object_handle "
+                          "AND s.row_order=r.row_order AND s.col_order=?")
+                jp = jp + [order_by]
+                order = (f"s.value IS NULL, s.value {direction}, " + order)
+            else:
+                order = (f"tabledata_text(r.data, {int(order_by)}) = '', "
+                         f"tabledata_text(r.data, {int(order_by)}) "
+                         f"{direction}, " + order)
+        sql = (f"SELECT r.object_handle, r.row_order, r.data FROM rows r "
+               f"{joins} WHERE r.table_id=?{where} ORDER BY {order}")
+        params: list[Any] = jp + [table_id] + wp
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        col_orders: list[int] = [c["col_order"] for c in columns]
+        result: list[tuple[str, RowData]] = []
+        for r in self._con.execute(sql, params):
+            data: list[str] = json.loads(r["data"])
+            n = len(data)
+            result.append((r["object_handle"],
+                           {"row_order": r["row_order"],
+                            "values": [data[co] if co < n else ""
+                                       for co in col_orders]}))
+        return result
+
+    def aggregate(self, table_id: int, col_order: Optional[int], func: str,
+                  conditions: Iterable[tuple[int, str, str]] = ()
+                  ) -> dict[str, float]:
+        """
+        Return *{object_handle: value}* of *func* (one of AGGREGATES) over
+        the rows of each object that match *conditions*.  "count" counts
+        rows (*col_order* may be None); the others use the numbers of the
+        Number column *col_order*, so objects without any number in it are
+        left out.
+        """
+        if func not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate: {func}")
+        joins, where, jp, wp = self._conditions_sql(table_id, conditions)
+        if func == "count":
+            expr = "COUNT(*)"
+        else:
+            if col_order not in self._number_columns(table_id):
+                raise ValueError("Aggregates need a Number column")
+            joins += (" JOIN numbers a ON a.table_id=r.table_id "
+                      "AND a.object_handle=r.object_handle "
+                      "AND a.row_order=r.row_order AND a.col_order=?")
+            jp = jp + [col_order]
+            expr = f"{func.upper()}(a.value)"
+        cur = self._con.execute(
+            f"SELECT r.object_handle, {expr} FROM rows r {joins} "
+            f"WHERE r.table_id=?{where} GROUP BY r.object_handle",
+            jp + [table_id] + wp)
+        return {r[0]: r[1] for r in cur}
+
+
+# ---------------------------------------------------------------------------
+# Delete journal of the open tree
+# ---------------------------------------------------------------------------
+OBJECT_TYPES: list[str] = ["Person", "Family", "Event", "Place", "Source",
+                           "Citation", "Repository", "Media"]
+
+
+# the trees whose signals track_deletes() has connected
+_tracked: weakref.WeakSet[Any] = weakref.WeakSet()
+
+
+def load_on_reg(dbstate: Any, uistate: Any, plugin: Any) -> None:
+    """Track the deletes of every tree that is opened (see track_deletes)."""
+    if not getattr(dbstate, "tabledata_connected", False):
+        dbstate.tabledata_connected = True
+        dbstate.connect("database-changed", track_deletes)
+    track_deletes(dbstate.db)
+
+
+def track_deletes(db: Any) -> None:
+    """
+    Purge the rows of the objects deleted in earlier sessions of the tree
+    *db* and journal its deletes of all object types for this session,
+    whether or not a TableData gramplet is loaded.  Does nothing if *db* is
+    already tracked.  Trees without a tabledata.db are tracked as well,
+    because the file can be created later in the session.
+    """
+    if db is None or not db.is_open() or db in _tracked:
+        return
+    _tracked.add(db)
+    path: str = os.path.join(db.get_save_path(), "tabledata.db")
+    for object_type in OBJECT_TYPES:
+        db.connect(object_type.lower() + "-delete",
+                   functools.partial(_journal_deleted, path, object_type))
+        db.connect(object_type.lower() + "-rebuild",
+                   functools.partial(_journal_rebuilt, path, object_type))
+    if not os.path.exists(path):
+        return
+    try:
+        tdb: _DB = _DB.get_path(path)
+        for object_type in OBJECT_TYPES:
+            exists = db.method("has_%s_handle", object_type)
+            removed: int = tdb.purge_deleted_rows(object_type, exists)
+            if removed:
+                LOG.info("TableData: purged %d orphaned rows for %s",
+                         removed, object_type)
+    except Exception:
+        LOG.warning("TableData: purging deleted rows failed", exc_info=True)
+
+
+def _journal_deleted(path: str, object_type: str,
+                     handles: list[str]) -> None:
+    """Signal handler of "<type>-delete"."""
+    if os.path.exists(path):
+        _DB.get_path(path).journal_deleted(object_type, handles)
+
+
+def _journal_rebuilt(path: str, object_type: str) -> None:
+    """
+    Signal handler of "<type>-rebuild": a batch transaction (e.g. an import
+    or a tool) may have deleted objects without delete signals.
+    """
+    if os.path.exists(path):
+        _DB.get_path(path).journal_stored_handles(object_type)
+
+
+class _ImportCancelled(Exception):
+    """Raised inside the import transaction to roll it back."""
+
+
+def _row_values(columns: list[ColDef], values: list[str],
+                data: Optional[list[str]] = None) -> list[str]:
+    """
+    Return the stored cell list (indexed by col_order) with *values* placed
+    at the col_order of the matching *columns*, starting from *data*.
+    """
+    data = list(data) if data else []
+    for col, val in zip(columns, values):
+        co: int = col["col_order"]
+        if co >= len(data):
+            data.extend([""] * (co + 1 - len(data)))
+        data[co] = val
+    return data
+
+
+def _number_params(table_id: int, object_handle: str, row_order: int,
+                   data: list[str], number_cols: list[int]
+                   ) -> list[tuple[int, str, int, int, float]]:
+    """Return the *numbers* index entries of one stored row."""
+    params: list[tuple[int, str, int, int, float]] = []
+    for co in number_cols:
+        if co < len(data):
+            number = _number_value(data[co].strip())
+            if number is not None:
+                params.append((table_id, object_handle, row_order, co, number))
+    return params
+
+
+def _encode_row(values: list[str]) -> str:
+    """Serialise a cell list for the *rows.data* column."""
+    return json.dumps(values, ensure_ascii=False, separators=(",", ":"))
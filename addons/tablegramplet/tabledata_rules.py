@@ -0,0 +1,131 @@
+# tabledata_rules.py
+#
+# Gramps - a GTK+/GNOME based genealogy program
+#
+# Copyright (C) 2024  (your name)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+tabledata_rules  –  custom filter rules over the TableData tables.
+
+"<Objects> with table data <table> <column> <operator> <value>" matches the
+objects that have at least one row in the named table whose cell in the named
+column satisfies the condition, e.g.  Tax records / Amount / > / 100.
+
+The matching handles are computed once in prepare() with a single query on
+tabledata.db (numeric conditions use the numbers index), so applying the
+rule to each object is a set lookup.  The set is exposed as
+*selected_handles*, which lets the filter optimizer of Gramps 6 visit only
+those objects.
+
+One rule class is registered per object type (see tabledata.gpr.py).
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any
+
+from gramps.gen.filters.rules import Rule
+
+from tabledata_db import QUERY_OPS, _DB
+
+
+class _HasTableDataBase(Rule):
+    """Objects with a TableData row matching a condition."""
+
+    object_type: str = "Unknown"
+    selected_handles: frozenset[str] | set[str] = frozenset()
+
+    labels = ["Table:", "Column:",
+              "Operator (" + " ".join(QUERY_OPS) + "):", "Value:"]
+    category = "General filters"
+    description = ("Matches objects that have a row in a TableData table "
+                   "whose value in the column satisfies the condition. "
+                   "Numbers are compared numerically in Number columns, "
+                   "other values as case-insensitive text.")
+
+    def prepare(self, db: Any, user: Any) -> None:
+        self.selected_handles = set()
+        table_name, col_name, op, value = (list(self.list) + [""] * 4)[:4]
+        op = op.strip() or "="
+        path = os.path.join(db.get_save_path(), "tabledata.db")
+        if not os.path.exists(path):
+            return
+        tdb = _DB.get_path(path)
+        table_id = tdb.find_table(self.object_type, table_name)
+        if table_id is None:
+            return
+        col_order = next((c["col_order"] for c in tdb.get_columns(table_id)
+                          if c["name"].casefold() == col_name.strip().casefold()),
+                         None)
+        if col_order is None:
+            return
+        try:
+            self.selected_handles = tdb.find_handles(
+                table_id, [(col_order, op, value)])
+        except ValueError:
+            # unknown operator or not a number for a Number column
+            pass
+
+    def reset(self) -> None:
+        self.selected_handles = set()
+
+    def apply_to_one(self, db: Any, obj: Any) -> bool:
+        return obj.handle in self.selected_handles
+
+    # Gramps 5.x calls apply()
+    apply = apply_to_one
+
+
+class PersonHasTableData(_HasTableDataBase):
+    object_type = "Person"
+    name = "People with table data <table> <column> <operator> <value>"
+
+
+class FamilyHasTableData(_HasTableDataBase):
+    object_type = "Family"
+    name = "Families with table data <table> <column> <operator> <value>"
+
+
+class EventHasTableData(_HasTableDataBase):
+    object_type = "Event"
+    name = "Events with table data <table> <column> <operator> <value>"
+
+
+class PlaceHasTableData(_HasTableDataBase):
+    object_type = "Place"
+    name = "Places with table data <table> <column> <operator> <value>"
+
+
+class SourceHasTableData(_HasTableDataBase):
+    object_type = "Source"
+    name = "Sources with table data <table> <column> <operator> <value>"
+
+
+class CitationHasTableData(_HasTableDataBase):
+    object_type = "Citation"
+    name = "Citations with table data <table> <column> <operator> <value>"
+
+
+class RepositoryHasTableData(_HasTableDataBase):
+    object_type = "Repository"
+    name = "Repositories with table data <table> <column> <operator> <value>"
+
+
+class MediaHasTableData(_HasTableDataBase):
+    object_type = "Media"
+    name = "Media with table data <table> <column> <operator> <value>"
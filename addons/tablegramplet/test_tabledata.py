@@ -1,6 +1,6 @@
 # test_tabledata.py
 #
-# Unit tests for tabledata_base.py
+# Unit tests for tabledata_base.py and tabledata_db.py
 #
 # Run with:
 #   pytest test_tabledata.py -v
@@ -21,11 +21,14 @@ from __future__ import annotations
 
 import csv
 import importlib
+import json
 import os
 import sqlite3
+import subprocess
 import sys
 import types
 import tempfile
+import zipfile
 from pathlib import Path
 from typing import Any
 from unittest.mock import MagicMock
@@ -64,24 +67,28 @@ def _build_stubs() -> None:
     pango_mod = types.ModuleType("gi.repository.Pango")
     pango_mod.Underline = _Any()  # type: ignore[attr-defined]
     gdk_mod = types.ModuleType("gi.repository.Gdk")
+    glib_mod = _GtkModule("gi.repository.GLib")
 
     repo_mod = types.ModuleType("gi.repository")
     repo_mod.Gtk = gtk_mod      # type: ignore[attr-defined]
     repo_mod.Pango = pango_mod  # type: ignore[attr-defined]
     repo_mod.Gdk = gdk_mod      # type: ignore[attr-defined]
+    repo_mod.GLib = glib_mod    # type: ignore[attr-defined]
 
     sys.modules["gi.repository"]       = repo_mod
     sys.modules["gi.repository.Gtk"]   = gtk_mod
     sys.modules["gi.repository.Pango"] = pango_mod
     sys.modules["gi.repository.Gdk"]   = gdk_mod
+    sys.modules["gi.repository.GLib"]  = glib_mod
 
     # ── gramps stub ──────────────────────────────────────────────────────────
     for mod_name in ("gramps", "gramps.gen", "gramps.gen.plug",
-                     "gramps.gui", "gramps.gui.dialog"):
+                     "gramps.gui", "gramps.gui.dialog", "gramps.gui.utils"):
         sys.modules.setdefault(mod_name, types.ModuleType(mod_name))
 
     sys.modules["gramps.gen.plug"].Gramplet = object          # type: ignore[attr-defined]
     sys.modules["gramps.gui.dialog"].OkDialog = MagicMock()   # type: ignore[attr-defined]
+    sys.modules["gramps.gui.utils"].ProgressMeter = MagicMock()  # type: ignore[attr-defined]
 
 
 _build_stubs()
@@ -89,21 +96,24 @@ _build_stubs()
 # Now it is safe to import the module under test
 sys.path.insert(0, str(Path(__file__).parent))
 import tabledata_base as tb  # noqa: E402
+import tabledata_db as tdbm  # noqa: E402
 
 # Convenience re-exports
 _DB            = tb._DB
 _to_number     = tb._to_number
-_db_path       = tb._db_path
+_db_path       = tdbm._db_path
 _export_csv    = tb._export_csv
 _import_csv    = tb._import_csv
 COL_TYPE_NUMBER = tb.COL_TYPE_NUMBER
 COL_TYPE_STRING = tb.COL_TYPE_STRING
 COL_TYPE_URL    = tb.COL_TYPE_URL
 
+_import_ods    = tb._import_ods
+_RowCleaner    = tb._RowCleaner
+
 _HAVE_ODF = tb._HAVE_ODF
 if _HAVE_ODF:
     _export_ods = tb._export_ods
-    _import_ods = tb._import_ods
 
 
 # ---------------------------------------------------------------------------
@@ -211,6 +221,34 @@ class TestDbPath:
         dbstate.db.get_save_path.assert_called_once()
 
 
+# ---------------------------------------------------------------------------
+# tabledata_db / tabledata_rules – no GUI imports
+# ---------------------------------------------------------------------------
+
+class TestNoGuiImports:
+    """The filter rules are also evaluated from the CLI and from reports."""
+
+    _SCRIPT = (
+        "import sys, types\n"
+        "rules = types.ModuleType('gramps.gen.filters.rules')\n"
+        "rules.Rule = type('Rule', (), {})\n"
+        "for name in ('gramps', 'gramps.gen', 'gramps.gen.filters'):\n"
+        "    sys.modules[name] = types.ModuleType(name)\n"
+        "sys.modules['gramps.gen.filters.rules'] = rules\n"
+        "import tabledata_rules\n"
+        "loaded = [m for m in ('gi', 'gramps.gui', 'gramps.gen.plug', 'odf', "
+        "'tabledata_base') if m in sys.modules]\n"
+        "print(','.join(loaded))\n"
+    )
+
+    def test_rules_import_without_gui(self) -> None:
+        result = subprocess.run(
+            [sys.executable, "-c", self._SCRIPT],
+            cwd=str(Path(__file__).parent),
+            capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == ""
+
+
 # ---------------------------------------------------------------------------
 # _DB – schema and caching
 # ---------------------------------------------------------------------------
@@ -427,20 +465,16 @@ class TestDBColumns:
         # col_order values before deletion: Name=0, Score=1, Link=2
         score_col_order = cols[1]["col_order"]  # = 1
         db.add_row(tid, "h1", cols, ["Alice", "10", "http://x.com"])
-        # Verify the Score cell exists before deletion
-        cur = db._con.execute(
-            "SELECT * FROM rows WHERE table_id=? AND col_order=?",
-            (tid, score_col_order))
-        assert cur.fetchone() is not None
         # Delete "Score" column
         db.delete_column(tid, score_col_order)
-        # After deletion and renumbering, no cell should have the original
-        # col_order value of 1 mapped to Score's data — the row was deleted.
-        # Verify by checking total remaining row cells: should be 2 (Name + Link)
+        # After deletion and renumbering the stored row holds only the
+        # Name and Link cells, and Link has moved to col_order 1.
         cur = db._con.execute(
-            "SELECT COUNT(*) FROM rows WHERE table_id=? AND object_handle=?",
+            "SELECT data FROM rows WHERE table_id=? AND object_handle=?",
             (tid, "h1"))
-        assert cur.fetchone()[0] == 2
+        assert json.loads(cur.fetchone()[0]) == ["Alice", "http://x.com"]
+        rows = db.get_rows(tid, "h1", db.get_columns(tid))
+        assert rows[0]["values"] == ["Alice", "http://x.com"]
 
     def test_columns_isolated_by_table(self, db: _DB) -> None:
         t1 = db.add_table("Person", "T1")
@@ -593,6 +627,295 @@ class TestDBRows:
         # Missing cols default to ""
         assert rows[0]["values"] == ["Only Name", "", ""]
 
+    def test_add_rows_bulk(self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["First", "0", ""])
+        added = db.add_rows(tid, "h1", cols,
+                            [[f"N{i}", str(i), ""] for i in range(1, 101)])
+        assert added == 100
+        rows = db.get_rows(tid, "h1", cols)
+        assert [r["row_order"] for r in rows] == list(range(101))
+        assert rows[0]["values"][0] == "First"
+        assert rows[100]["values"] == ["N100", "100", ""]
+
+    def test_add_rows_empty(self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        assert db.add_rows(tid, "h1", cols, []) == 0
+        assert db.get_rows(tid, "h1", cols) == []
+
+    def test_one_db_row_per_table_row(self,
+                                      db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["Alice", "10", "http://a.com"])
+        cur = db._con.execute("SELECT COUNT(*) FROM rows")
+        assert cur.fetchone()[0] == 1
+
+    def test_update_row_subset_keeps_other_cells(
+            self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["Alice", "10", "http://a.com"])
+        db.update_row(tid, "h1", 0, cols[1:2], ["11"])
+        rows = db.get_rows(tid, "h1", cols)
+        assert rows[0]["values"] == ["Alice", "11", "http://a.com"]
+
+    def test_values_with_unicode_and_quotes(
+            self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ['Äijä "x"', "1", "a,b\nc"])
+        rows = db.get_rows(tid, "h1", cols)
+        assert rows[0]["values"] == ['Äijä "x"', "1", "a,b\nc"]
+
+
+# ---------------------------------------------------------------------------
+# _DB – in-memory cache of tables, columns and rows
+# ---------------------------------------------------------------------------
+
+class TestDBRowCache:
+
+    def _count_selects(self, db: _DB) -> list[str]:
+        statements: list[str] = []
+        db._con.set_trace_callback(
+            lambda sql: statements.append(sql)
+            if sql.lstrip().upper().startswith("SELECT") else None)
+        return statements
+
+    def test_one_query_for_all_tables(self, db: _DB) -> None:
+        tids = [db.add_table("Person", f"T{i}") for i in range(3)]
+        for tid in tids:
+            db.add_column(tid, "X", COL_TYPE_STRING)
+            db.add_row(tid, "h1", db.get_columns(tid), [f"in {tid}"])
+        cols = {tid: db.get_columns(tid) for tid in tids}
+        db.get_tables("Person")
+        selects = self._count_selects(db)
+        values = [db.get_rows(tid, "h1", cols[tid])[0]["values"][0]
+                  for tid in tids]
+        assert values == [f"in {tid}" for tid in tids]
+        assert len(selects) == 1
+        db.get_rows(tids[0], "h1", cols[tids[0]])
+        db.get_columns(tids[0])
+        db.get_tables("Person")
+        assert len(selects) == 1
+
+    def test_prefetch(self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        for h in ("h1", "h2", "h3"):
+            db.add_row(tid, h, cols, [h, "1", ""])
+        assert db.prefetch(["h1", "h2", "h3", "h4", "h1"]) == 4
+        assert db.prefetch(["h2", "h3"]) == 0
+        selects = self._count_selects(db)
+        assert db.get_rows(tid, "h2", cols)[0]["values"][0] == "h2"
+        assert db.get_rows(tid, "h4", cols) == []
+        assert selects == []
+
+    def test_writes_invalidate(self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["A", "1", ""])
+        assert len(db.get_rows(tid, "h1", cols)) == 1
+        db.add_row(tid, "h1", cols, ["B", "2", ""])
+        assert len(db.get_rows(tid, "h1", cols)) == 2
+        db.update_row(tid, "h1", 0, cols, ["A2", "1", ""])
+        assert db.get_rows(tid, "h1", cols)[0]["values"][0] == "A2"
+        db.delete_row(tid, "h1", 0)
+        assert [r["values"][0] for r in db.get_rows(tid, "h1", cols)] == ["B"]
+        db.swap_columns(tid, 0, 1)
+        cols = db.get_columns(tid)
+        assert [c["name"] for c in cols] == ["Score", "Name", "Link"]
+        assert db.get_rows(tid, "h1", cols)[0]["values"] == ["2", "B", ""]
+        db.delete_column(tid, 0)
+        cols = db.get_columns(tid)
+        assert db.get_rows(tid, "h1", cols)[0]["values"] == ["B", ""]
+        db.purge_orphaned_rows("Person", {"other"})
+        assert db.get_rows(tid, "h1", cols) == []
+
+    def test_table_and_column_changes(self, db: _DB) -> None:
+        tid = db.add_table("Person", "T")
+        assert [t["name"] for t in db.get_tables("Person")] == ["T"]
+        db.rename_table(tid, "U")
+        assert [t["name"] for t in db.get_tables("Person")] == ["U"]
+        db.add_column(tid, "X", COL_TYPE_STRING)
+        db.update_column(tid, 0, "Y", COL_TYPE_NUMBER)
+        assert db.get_columns(tid)[0]["type"] == COL_TYPE_NUMBER
+        db.add_row(tid, "h1", db.get_columns(tid), ["5"])
+        db.get_rows(tid, "h1", db.get_columns(tid))
+        db.delete_table(tid)
+        assert db.get_tables("Person") == []
+        assert db.get_columns(tid) == []
+
+    def test_returned_lists_are_copies(self, db_with_cols: tuple[_DB, int]
+                                       ) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        cols[0]["name"] = "changed"
+        cols.pop()
+        assert [c["name"] for c in db.get_columns(tid)] == [
+            "Name", "Score", "Link"]
+
+    def test_cache_size_is_bounded(self, db_with_cols: tuple[_DB, int],
+                                   monkeypatch: pytest.MonkeyPatch) -> None:
+        db, tid = db_with_cols
+        monkeypatch.setattr(tdbm, "_ROW_CACHE_SIZE", 5)
+        cols = db.get_columns(tid)
+        for i in range(10):
+            db.get_rows(tid, f"h{i}", cols)
+        assert len(db._objects) == 5
+        assert db.is_cached("h9") and not db.is_cached("h0")
+
+
+# ---------------------------------------------------------------------------
+# _DB – queries across objects (numbers index)
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def db_people(db_with_cols: tuple[_DB, int]) -> tuple[_DB, int]:
+    """Rows for four people: Name / Score / Link."""
+    db, tid = db_with_cols
+    cols = db.get_columns(tid)
+    db.add_rows(tid, "h1", cols, [["Alice", "10", ""], ["Alice2", "150", ""]])
+    db.add_rows(tid, "h2", cols, [["Bob", "99.5", ""]])
+    db.add_rows(tid, "h3", cols, [["carol", "", ""], ["Dave", "x", ""]])
+    db.add_rows(tid, "h4", cols, [["Eve", "1e3", "http://e"]])
+    return db, tid
+
+
+class TestDBQuery:
+
+    def _numbers(self, db: _DB) -> list[tuple[str, int, int, float]]:
+        cur = db._con.execute(
+            "SELECT object_handle, row_order, col_order, value FROM numbers "
+            "ORDER BY object_handle, row_order")
+        return [tuple(r) for r in cur]
+
+    def test_numbers_indexed(self, db_people: tuple[_DB, int]) -> None:
+        db, _tid = db_people
+        assert self._numbers(db) == [
+            ("h1", 0, 1, 10.0), ("h1", 1, 1, 150.0),
+            ("h2", 0, 1, 99.5), ("h4", 0, 1, 1000.0)]
+
+    def test_find_numeric(self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        assert db.find_handles(tid, [(1, ">", "100")]) == {"h1", "h4"}
+        assert db.find_handles(tid, [(1, "<=", "99.5")]) == {"h1", "h2"}
+        assert db.find_handles(tid, [(1, "=", "1000")]) == {"h4"}
+
+    def test_find_text(self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        assert db.find_handles(tid, [(0, "=", "CAROL")]) == {"h3"}
+        assert db.find_handles(tid, [(0, "contains", "li")]) == {"h1"}
+        assert db.find_handles(tid, [(1, "contains", "9")]) == {"h2"}
+
+    def test_conditions_apply_to_same_row(
+            self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        conds = [(0, "=", "alice"), (1, ">", "100")]
+        assert db.find_handles(tid, conds) == set()
+        conds = [(0, "=", "alice2"), (1, ">", "100")]
+        assert db.find_handles(tid, conds) == {"h1"}
+
+    def test_bad_conditions(self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        with pytest.raises(ValueError):
+            db.find_handles(tid, [(1, ">", "lots")])
+        with pytest.raises(ValueError):
+            db.find_handles(tid, [(0, "~", "a")])
+
+    def test_nan_is_not_indexed(self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        cols = db.get_columns(tid)
+        before = self._numbers(db)
+        db.add_row(tid, "h5", cols, ["eve", "nan", ""])
+        db.update_row(tid, "h5", 0, cols, ["eve", "NaN", ""])
+        db.import_rows(tid, "h6", cols, [[["x", "nan", ""], ["y", "inf", ""]]])
+        db.update_column(tid, 0, "Name", COL_TYPE_NUMBER)
+        assert [n for n in self._numbers(db) if n[0] in ("h5", "h6")] == []
+        assert len(db.get_rows(tid, "h5", cols)) == 1
+        assert [n for n in before if n[2] == 1] == [
+            n for n in self._numbers(db) if n[2] == 1]
+
+    def test_query_rows_sorted(self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        cols = db.get_columns(tid)
+        rows = db.query_rows(tid, cols, order_by=1, descending=True)
+        assert [r[1]["values"][1] for r in rows] == [
+            "1e3", "150", "99.5", "10", "", "x"]
+        rows = db.query_rows(tid, cols, [(1, ">=", "10")], order_by=1,
+                             limit=2)
+        assert [(h, r["values"][0]) for h, r in rows] == [
+            ("h1", "Alice"), ("h2", "Bob")]
+        rows = db.query_rows(tid, cols, order_by=0)
+        assert [r[1]["values"][0] for r in rows] == [
+            "Alice", "Alice2", "Bob", "carol", "Dave", "Eve"]
+
+    def test_aggregate(self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        assert db.aggregate(tid, 1, "sum") == {
+            "h1": 160.0, "h2": 99.5, "h4": 1000.0}
+        assert db.aggregate(tid, None, "count") == {
+            "h1": 2, "h2": 1, "h3": 2, "h4": 1}
+        assert db.aggregate(tid, 1, "max", [(0, "contains", "a")]) == {
+            "h1": 150.0}
+        with pytest.raises(ValueError):
+            db.aggregate(tid, 0, "sum")
+
+    def test_update_row_reindexes(self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        cols = db.get_columns(tid)
+        db.update_row(tid, "h3", 0, cols[1:2], ["500"])
+        assert db.find_handles(tid, [(1, ">", "400")]) == {"h3", "h4"}
+        db.update_row(tid, "h4", 0, cols[1:2], [""])
+        assert db.find_handles(tid, [(1, ">", "400")]) == {"h3"}
+
+    def test_delete_row_renumbers_numbers(
+            self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        db.delete_row(tid, "h1", 0)
+        assert [n for n in self._numbers(db) if n[0] == "h1"] == [
+            ("h1", 0, 1, 150.0)]
+
+    def test_column_changes(self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        db.swap_columns(tid, 0, 1)
+        assert db.find_handles(tid, [(0, ">", "100")]) == {"h1", "h4"}
+        db.delete_column(tid, 0)
+        assert self._numbers(db) == []
+        # Name is now col 0; make it a Number column
+        db.update_column(tid, 0, "Name", COL_TYPE_NUMBER)
+        assert self._numbers(db) == []
+        db.add_column(tid, "N", COL_TYPE_STRING)
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h5", cols, ["1", "", "7"])
+        db.update_column(tid, 2, "N", COL_TYPE_NUMBER)
+        assert db.find_handles(tid, [(2, "=", "7")]) == {"h5"}
+        assert db.find_handles(tid, [(0, "=", "1")]) == {"h5"}
+
+    def test_delete_and_purge_cascade(self,
+                                      db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        db.purge_orphaned_rows("Person", {"h1", "h2", "h3"})
+        assert {n[0] for n in self._numbers(db)} == {"h1", "h2"}
+        db.delete_table(tid)
+        assert self._numbers(db) == []
+
+    def test_find_table(self, db_people: tuple[_DB, int]) -> None:
+        db, tid = db_people
+        assert db.find_table("Person", " test ") == tid
+        assert db.find_table("Family", "Test") is None
+
+    def test_existing_file_gets_numbers_index(
+            self, db_people: tuple[_DB, int], db_path: str) -> None:
+        db, tid = db_people
+        db._con.execute("DROP TABLE numbers")
+        db._con.commit()
+        _DB._cache.clear()
+        db2 = _DB(db_path)
+        assert db2.find_handles(tid, [(1, ">", "100")]) == {"h1", "h4"}
+
 
 # ---------------------------------------------------------------------------
 # _DB – migration from old schema
@@ -625,6 +948,125 @@ class TestDBMigration:
         assert "table_id" in col_names
         assert "object_type" not in col_names
 
+    def test_cell_rows_are_converted(self, tmp_path: Path) -> None:
+        """Rows stored one cell per database row must be kept on upgrade."""
+        db_file = str(tmp_path / "tabledata.db")
+        con = sqlite3.connect(db_file)
+        con.executescript("""
+            CREATE TABLE tables (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                object_type TEXT NOT NULL,
+                tab_order INTEGER NOT NULL DEFAULT 0,
+                name TEXT NOT NULL
+            );
+            CREATE TABLE columns (
+                table_id INTEGER NOT NULL, col_order INTEGER NOT NULL,
+                name TEXT NOT NULL, col_type TEXT NOT NULL DEFAULT 'String',
+                PRIMARY KEY (table_id, col_order)
+            );
+            CREATE TABLE rows (
+                table_id INTEGER NOT NULL, object_handle TEXT NOT NULL,
+                row_order INTEGER NOT NULL, col_order INTEGER NOT NULL,
+                value TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (table_id, object_handle, row_order, col_order)
+            );
+            CREATE INDEX idx_rows_obj ON rows (table_id, object_handle);
+            INSERT INTO tables (id, object_type, name) VALUES (1, 'Person', 'T');
+            INSERT INTO columns VALUES (1, 0, 'Name', 'String');
+            INSERT INTO columns VALUES (1, 1, 'Score', 'Number');
+            INSERT INTO columns VALUES (1, 2, 'Link', 'URL');
+            INSERT INTO rows VALUES (1, 'h1', 0, 0, 'Alice');
+            INSERT INTO rows VALUES (1, 'h1', 0, 1, '10');
+            INSERT INTO rows VALUES (1, 'h1', 0, 2, 'http://a.com');
+            INSERT INTO rows VALUES (1, 'h1', 1, 0, 'Bob');
+            INSERT INTO rows VALUES (1, 'h1', 1, 2, 'http://b.com');
+            INSERT INTO rows VALUES (1, 'h2', 0, 1, '5');
+        """)
+        con.commit()
+        con.close()
+
+        db = _DB(db_file)
+        cols = db.get_columns(1)
+        assert [r["values"] for r in db.get_rows(1, "h1", cols)] == [
+            ["Alice", "10", "http://a.com"],
+            ["Bob", "", "http://b.com"],
+        ]
+        assert db.get_rows(1, "h2", cols)[0]["values"] == ["", "5", ""]
+        cur = db._con.execute("PRAGMA table_info(rows)")
+        assert "col_order" not in [r["name"] for r in cur]
+        cur = db._con.execute(
+            "SELECT name FROM sqlite_master WHERE name='rows_cells'")
+        assert cur.fetchone() is None
+        # A second open must not touch the converted data
+        _DB._cache.clear()
+        db2 = _DB(db_file)
+        assert len(db2.get_rows(1, "h1", cols)) == 2
+
+    def test_numbers_are_indexed_after_failed_backfill(
+            self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """A backfill that fails is done again on the next open."""
+        db_file = str(tmp_path / "tabledata.db")
+        db = _DB(db_file)
+        tid = db.add_table("Person", "T")
+        db.add_column(tid, "N", COL_TYPE_NUMBER)
+        db.add_row(tid, "h1", db.get_columns(tid), ["5"])
+        with db._con:
+            db._con.execute("DELETE FROM numbers")
+            db._con.execute("PRAGMA user_version=0")
+        db._con.close()
+
+        def fail(self: _DB, table_id: int) -> None:
+            raise sqlite3.OperationalError("disk I/O error")
+
+        with monkeypatch.context() as m:
+            m.setattr(_DB, "_reindex_numbers", fail)
+            with pytest.raises(sqlite3.OperationalError):
+                _DB(db_file)
+        db2 = _DB(db_file)
+        assert db2.find_handles(tid, [(0, "=", "5")]) == {"h1"}
+        assert db2._con.execute("PRAGMA user_version").fetchone()[0] >= 1
+
+    def test_stored_handles_are_journaled_once(self, tmp_path: Path) -> None:
+        """A file from before the journal gets every stored handle checked."""
+        db_file = str(tmp_path / "tabledata.db")
+        db = _DB(db_file)
+        tid = db.add_table("Person", "T")
+        db.add_column(tid, "X", COL_TYPE_STRING)
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["a"])
+        db.add_row(tid, "h2", cols, ["b"])
+        with db._con:
+            db._con.execute("DROP TABLE deleted")
+        db._con.close()
+
+        db2 = _DB(db_file)
+        assert db2.journaled_handles("Person") == ["h1", "h2"]
+        db2.purge_deleted_rows("Person", lambda h: True)
+        db2._con.close()
+        assert _DB(db_file).journaled_handles("Person") == []
+
+    def test_journal_is_seeded_after_failed_migration(
+            self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """A failure earlier in _migrate() does not skip the seeding."""
+        db_file = str(tmp_path / "tabledata.db")
+        db = _DB(db_file)
+        tid = db.add_table("Person", "T")
+        db.add_column(tid, "X", COL_TYPE_STRING)
+        db.add_row(tid, "h1", db.get_columns(tid), ["a"])
+        with db._con:
+            db._con.execute("DROP TABLE deleted")
+            db._con.execute("PRAGMA user_version=0")
+        db._con.close()
+
+        def fail(self: _DB, table_id: int) -> None:
+            raise sqlite3.OperationalError("disk I/O error")
+
+        with monkeypatch.context() as m:
+            m.setattr(_DB, "_reindex_numbers", fail)
+            with pytest.raises(sqlite3.OperationalError):
+                _DB(db_file)
+        assert _DB(db_file).journaled_handles("Person") == ["h1"]
+
 
 # ---------------------------------------------------------------------------
 # CSV import / export
@@ -739,6 +1181,185 @@ class TestCSVImport:
         assert data[1] == ["bar", "2"]
 
 
+# ---------------------------------------------------------------------------
+# Streaming import
+# ---------------------------------------------------------------------------
+
+_ODS_CONTENT = """<?xml version="1.0" encoding="UTF-8"?>
+<office:document-content
+    xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+    xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+    xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0">
+ <office:body><office:spreadsheet>
+  <table:table table:name="First">
+   <table:table-column table:number-columns-repeated="3"/>
+   <table:table-row>
+    <table:table-cell><text:p>Name</text:p></table:table-cell>
+    <table:table-cell><text:p>Score</text:p></table:table-cell>
+    <table:table-cell table:number-columns-repeated="1021"/>
+   </table:table-row>
+   <table:table-row table:number-rows-repeated="2">
+    <table:table-cell/>
+   </table:table-row>
+   <table:table-row>
+    <table:table-cell><text:p>A<text:s text:c="2"/>B</text:p></table:table-cell>
+    <table:table-cell table:number-columns-repeated="2"><text:p>7</text:p></table:table-cell>
+   </table:table-row>
+   <table:table-row table:number-rows-repeated="2">
+    <table:table-cell/>
+    <table:table-cell><text:p><text:span>x</text:span>y</text:p></table:table-cell>
+   </table:table-row>
+  </table:table>
+  <table:table table:name="Second">
+   <table:table-row>
+    <table:table-cell><text:p>ignored</text:p></table:table-cell>
+   </table:table-row>
+  </table:table>
+ </office:spreadsheet></office:body>
+</office:document-content>
+"""
+
+
+def _write_ods(path: str, content: str = _ODS_CONTENT) -> None:
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("mimetype",
+                    "application/vnd.oasis.opendocument.spreadsheet")
+        zf.writestr("content.xml", content)
+
+
+class TestOdsReader:
+    """The iterative ODS reader does not need odfpy."""
+
+    def test_rows(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "t.ods")
+        _write_ods(path)
+        header, data = _import_ods(path)
+        assert header == ["Name", "Score"]
+        assert data == [["A  B", "7", "7"], ["", "xy"], ["", "xy"]]
+
+    def test_fraction_reaches_end(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "t.ods")
+        _write_ods(path)
+        with tb._OdsReader(path) as reader:
+            assert 0.0 <= reader.fraction() <= 1.0
+            list(reader.rows)
+            assert reader.fraction() > 0.0
+
+    def test_not_a_zip(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "bad.ods")
+        Path(path).write_text("Name,Score\n")
+        with pytest.raises(zipfile.BadZipFile):
+            _import_ods(path)
+
+
+class TestCsvReader:
+
+    def test_streams_rows(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "s.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["A", "B"])
+            for i in range(1000):
+                w.writerow([f"a{i}", str(i)])
+        with tb._open_import(path) as reader:
+            assert next(reader.rows) == ["A", "B"]
+            assert next(reader.rows) == ["a0", "0"]
+            assert sum(1 for _ in reader.rows) == 999
+            assert reader.fraction() == 1.0
+
+
+class TestRowCleaner:
+
+    def _cols(self) -> list[tb.ColDef]:
+        return [
+            {"col_order": 0, "name": "Name",  "type": COL_TYPE_STRING},
+            {"col_order": 1, "name": "Score", "type": COL_TYPE_NUMBER},
+        ]
+
+    def test_pads_cuts_and_strips(self) -> None:
+        cleaner = _RowCleaner(self._cols())
+        assert cleaner.clean([[" a "], ["b", " 2 ", "extra"]]) == [
+            ["a", ""], ["b", "2"]]
+
+    def test_invalid_numbers_dropped(self) -> None:
+        cleaner = _RowCleaner(self._cols())
+        rows = [["a", "1"], ["b", "x"], ["c", "-1.5e3"], ["d", ""],
+                ["e", "1_000"], ["f", "1.2.3"]]
+        assert [r[0] for r in cleaner.clean(rows)] == ["a", "c", "d", "e"]
+        assert cleaner.errors == 2
+        assert cleaner.rows_read == 6
+
+    def test_chunks(self) -> None:
+        cleaner = _RowCleaner(self._cols(), chunk_size=4)
+        rows = ([str(i), str(i)] for i in range(10))
+        chunks = list(cleaner.chunks(rows))
+        assert [len(c) for c in chunks] == [4, 4, 2]
+
+
+class TestDBImportRows:
+
+    def test_import_in_chunks(self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["first", "0", ""])
+        calls: list[int] = []
+
+        def progress(count: int) -> bool:
+            calls.append(count)
+            return False
+
+        chunks = [[[f"r{i}", str(i), ""] for i in range(j, j + 3)]
+                  for j in (1, 4)]
+        assert db.import_rows(tid, "h1", cols, chunks, progress) == 6
+        assert calls == [3, 6]
+        rows = db.get_rows(tid, "h1", cols)
+        assert [r["row_order"] for r in rows] == list(range(7))
+        assert rows[6]["values"][0] == "r6"
+
+    def test_cancel_rolls_back(self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["kept", "0", ""])
+        chunks = [[["a", "1", ""]], [["b", "2", ""]]]
+        result = db.import_rows(tid, "h1", cols, chunks,
+                                lambda count: count >= 2)
+        assert result is None
+        rows = db.get_rows(tid, "h1", cols)
+        assert [r["values"][0] for r in rows] == ["kept"]
+
+    def test_read_error_rolls_back(self,
+                                   db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+
+        def chunks():
+            yield [["a", "1", ""]]
+            raise ValueError("broken file")
+
+        with pytest.raises(ValueError):
+            db.import_rows(tid, "h1", cols, chunks())
+        assert db.get_rows(tid, "h1", cols) == []
+
+    def test_csv_file_end_to_end(self, tmp_path: Path,
+                                 db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)[:2]
+        path = str(tmp_path / "in.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["Name", "Score"])
+            for i in range(25):
+                w.writerow([f"n{i}", "bad" if i % 5 == 0 else str(i)])
+        cleaner = _RowCleaner(cols, chunk_size=10)
+        with tb._open_import(path) as reader:
+            next(reader.rows)
+            imported = db.import_rows(tid, "h1", cols,
+                                      cleaner.chunks(reader.rows))
+        assert imported == 20
+        assert cleaner.errors == 5
+        assert len(db.get_rows(tid, "h1", cols)) == 20
+
+
 # ---------------------------------------------------------------------------
 # ODS import / export  (skipped when odfpy is not installed)
 # ---------------------------------------------------------------------------
@@ -924,12 +1545,12 @@ class TestDBPurgeOrphanedRows:
             self, db_with_cols: tuple[_DB, int]) -> None:
         db, tid = db_with_cols
         cols = db.get_columns(tid)
-        # 3 columns → each add_row inserts 3 cells
+        # each add_row stores one database row, whatever the column count
         db.add_row(tid, "h_orphan", cols, ["A", "1", ""])
         db.add_row(tid, "h_orphan", cols, ["B", "2", ""])
         db.add_row(tid, "h_live",   cols, ["C", "3", ""])
         removed = db.purge_orphaned_rows("Person", {"h_live"})
-        assert removed == 6   # 2 orphaned rows × 3 columns
+        assert removed == 2   # 2 orphaned rows
 
     def test_purge_multiple_orphaned_handles(
             self, db_with_cols: tuple[_DB, int]) -> None:
@@ -950,13 +1571,234 @@ class TestDBPurgeOrphanedRows:
         Rows for a deleted object must survive until the next startup purge,
         so that Gramps' Undo can still work.  This test verifies that rows
         remain queryable by handle even after the notional deletion — because
-        Option B does not touch the DB on delete signals at all.
+        Option B only journals the handle on delete signals.
         """
         db, tid = db_with_cols
         cols = db.get_columns(tid)
         db.add_row(tid, "h1", cols, ["Alice", "99", ""])
-        # Simulate: object deleted in Gramps, but we do NOT call any cleanup.
+        # Simulate: object deleted in Gramps; the handle is only journaled.
         # Rows must still be there (will be purged next startup).
+        db.journal_deleted("Person", ["h1"])
         rows = db.get_rows(tid, "h1", cols)
         assert len(rows) == 1
         assert rows[0]["values"][0] == "Alice"
+
+    def test_purge_many_orphans(self, db_with_cols: tuple[_DB, int]) -> None:
+        """More orphans than SQLite allows variables in one statement."""
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        with db._con:
+            db._con.executemany(
+                "INSERT INTO rows (table_id, object_handle, row_order, data) "
+                "VALUES (?,?,0,'[]')",
+                ((tid, f"h{i}") for i in range(40000)))
+        removed = db.purge_orphaned_rows("Person", {"h0"})
+        assert removed == 39999
+        assert len(db.get_rows(tid, "h0", cols)) == 1
+
+
+# ---------------------------------------------------------------------------
+# _DB – journal of deleted handles
+# ---------------------------------------------------------------------------
+
+class TestDBDeletedJournal:
+
+    def test_journal_is_per_type_and_unique(self, db: _DB) -> None:
+        db.journal_deleted("Person", ["h2", "h1"])
+        db.journal_deleted("Person", ["h1"])
+        db.journal_deleted("Family", ["f1"])
+        assert db.journaled_handles("Person") == ["h1", "h2"]
+        assert db.journaled_handles("Family") == ["f1"]
+
+    def test_purge_removes_only_gone_handles(
+            self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        for h in ("h1", "h2", "h3"):
+            db.add_row(tid, h, cols, [h, "1", ""])
+            db.add_row(tid, h, cols, [h, "2", ""])
+        # h1 was deleted for good, h2's delete was undone, h3 never deleted
+        db.journal_deleted("Person", ["h1", "h2"])
+        removed = db.purge_deleted_rows("Person", lambda h: h != "h1")
+        assert removed == 2
+        assert db.get_rows(tid, "h1", cols) == []
+        assert len(db.get_rows(tid, "h2", cols)) == 2
+        assert len(db.get_rows(tid, "h3", cols)) == 2
+        assert db.journaled_handles("Person") == []
+
+    def test_purge_checks_only_journaled_handles(
+            self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["a", "1", ""])
+        db.add_row(tid, "h2", cols, ["b", "2", ""])
+        db.journal_deleted("Person", ["h2"])
+        checked: list[str] = []
+
+        def exists(handle: str) -> bool:
+            checked.append(handle)
+            return False
+
+        assert db.purge_deleted_rows("Person", exists) == 1
+        assert checked == ["h2"]
+        assert len(db.get_rows(tid, "h1", cols)) == 1
+
+    def test_empty_journal_is_noop(self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["a", "1", ""])
+        assert db.purge_deleted_rows("Person", lambda h: False) == 0
+        assert len(db.get_rows(tid, "h1", cols)) == 1
+
+    def test_purge_keeps_other_object_types(self, db: _DB) -> None:
+        t_p = db.add_table("Person", "P")
+        t_f = db.add_table("Family", "F")
+        db.add_column(t_p, "X", COL_TYPE_STRING)
+        db.add_column(t_f, "X", COL_TYPE_STRING)
+        db.add_row(t_p, "h1", db.get_columns(t_p), ["person"])
+        db.add_row(t_f, "h1", db.get_columns(t_f), ["family"])
+        db.journal_deleted("Person", ["h1"])
+        db.journal_deleted("Family", ["h1"])
+        assert db.purge_deleted_rows("Person", lambda h: False) == 1
+        assert db.get_rows(t_f, "h1", db.get_columns(t_f)) != []
+        assert db.journaled_handles("Family") == ["h1"]
+
+    def test_failing_lookup_keeps_journal(
+            self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["a", "1", ""])
+        db.journal_deleted("Person", ["h1"])
+
+        def exists(handle: str) -> bool:
+            raise RuntimeError("database closed")
+
+        with pytest.raises(RuntimeError):
+            db.purge_deleted_rows("Person", exists)
+        assert db.journaled_handles("Person") == ["h1"]
+        assert len(db.get_rows(tid, "h1", cols)) == 1
+
+    def test_purge_drops_cached_rows(
+            self, db_with_cols: tuple[_DB, int]) -> None:
+        db, tid = db_with_cols
+        cols = db.get_columns(tid)
+        db.add_row(tid, "h1", cols, ["a", "1", ""])
+        assert len(db.get_rows(tid, "h1", cols)) == 1
+        db.journal_deleted("Person", ["h1"])
+        db.purge_deleted_rows("Person", lambda h: False)
+        assert not db.is_cached("h1")
+        assert db.get_rows(tid, "h1", cols) == []
+
+    def test_journal_stored_handles_of_one_type(self, db: _DB) -> None:
+        t_p = db.add_table("Person", "P")
+        t_f = db.add_table("Family", "F")
+        db.add_column(t_p, "X", COL_TYPE_STRING)
+        db.add_column(t_f, "X", COL_TYPE_STRING)
+        db.add_row(t_p, "h1", db.get_columns(t_p), ["a"])
+        db.add_row(t_p, "h1", db.get_columns(t_p), ["b"])
+        db.add_row(t_p, "h2", db.get_columns(t_p), ["c"])
+        db.add_row(t_f, "f1", db.get_columns(t_f), ["d"])
+        db.journal_stored_handles("Person")
+        assert db.journaled_handles("Person") == ["h1", "h2"]
+        assert db.journaled_handles("Family") == []
+
+
+# ---------------------------------------------------------------------------
+# track_deletes – the journal of the open tree
+# ---------------------------------------------------------------------------
+
+class _FakeTree:
+    """The parts of a Gramps database that track_deletes() uses."""
+
+    def __init__(self, path: Path, live: set[str]) -> None:
+        self.path = path
+        self.live = live
+        self.callbacks: dict[str, list[Any]] = {}
+
+    def is_open(self) -> bool:
+        return True
+
+    def get_save_path(self) -> str:
+        return str(self.path)
+
+    def connect(self, signal: str, callback: Any) -> None:
+        self.callbacks.setdefault(signal, []).append(callback)
+
+    def emit(self, signal: str, *args: Any) -> None:
+        for callback in self.callbacks.get(signal, []):
+            callback(*args)
+
+    def method(self, fmt: str, object_type: str) -> Any:
+        return lambda handle: handle in self.live
+
+
+class TestTrackDeletes:
+
+    @pytest.fixture(autouse=True)
+    def tracked(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(tdbm, "_tracked", tdbm.weakref.WeakSet())
+
+    @staticmethod
+    def _store(tmp_path: Path, object_type: str,
+               handles: list[str]) -> tuple[_DB, int]:
+        db = _DB.get_path(str(tmp_path / "tabledata.db"))
+        tid = db.add_table(object_type, "T")
+        db.add_column(tid, "X", COL_TYPE_STRING)
+        for h in handles:
+            db.add_row(tid, h, db.get_columns(tid), [h])
+        return db, tid
+
+    def test_deletes_of_every_type_are_journaled(self, tmp_path: Path) -> None:
+        db, _tid = self._store(tmp_path, "Event", ["e1", "e2"])
+        tree = _FakeTree(tmp_path, {"e2"})
+        tdbm.track_deletes(tree)
+        tree.emit("event-delete", ["e1"])
+        tree.emit("media-delete", ["m1"])
+        assert db.journaled_handles("Event") == ["e1"]
+        assert db.journaled_handles("Media") == ["m1"]
+
+    def test_rows_are_purged_when_the_tree_is_opened_again(
+            self, tmp_path: Path) -> None:
+        db, tid = self._store(tmp_path, "Event", ["e1", "e2"])
+        tree = _FakeTree(tmp_path, {"e2"})
+        tdbm.track_deletes(tree)
+        tree.emit("event-delete", ["e1"])
+        assert len(db.get_rows(tid, "e1", db.get_columns(tid))) == 1
+        tdbm.track_deletes(_FakeTree(tmp_path, {"e2"}))
+        assert db.get_rows(tid, "e1", db.get_columns(tid)) == []
+        assert len(db.get_rows(tid, "e2", db.get_columns(tid))) == 1
+        assert db.journaled_handles("Event") == []
+
+    def test_rebuild_journals_stored_handles(self, tmp_path: Path) -> None:
+        db, _tid = self._store(tmp_path, "Place", ["p1", "p2"])
+        self._store(tmp_path, "Person", ["h1"])
+        tree = _FakeTree(tmp_path, set())
+        tdbm.track_deletes(tree)
+        tree.emit("place-rebuild")
+        assert db.journaled_handles("Place") == ["p1", "p2"]
+        assert db.journaled_handles("Person") == []
+
+    def test_tree_is_tracked_once(self, tmp_path: Path) -> None:
+        tree = _FakeTree(tmp_path, set())
+        tdbm.track_deletes(tree)
+        tdbm.track_deletes(tree)
+        assert len(tree.callbacks["person-delete"]) == 1
+        assert len(tree.callbacks["person-rebuild"]) == 1
+
+    def test_no_file_is_created(self, tmp_path: Path) -> None:
+        tree = _FakeTree(tmp_path, set())
+        tdbm.track_deletes(tree)
+        tree.emit("person-delete", ["h1"])
+        tree.emit("person-rebuild")
+        assert not (tmp_path / "tabledata.db").exists()
+
+    def test_load_on_reg_connects_after_gramplet(self, tmp_path: Path) -> None:
+        """The gramplet may track the tree before load_on_reg runs."""
+        tree = _FakeTree(tmp_path, set())
+        dbstate = types.SimpleNamespace(db=tree, signals=[])
+        dbstate.connect = lambda signal, callback: dbstate.signals.append(signal)
+        tdbm.track_deletes(tree)
+        tdbm.load_on_reg(dbstate, None, None)
+        tdbm.load_on_reg(dbstate, None, None)
+        assert dbstate.signals == ["database-changed"]
+        assert len(tree.callbacks["person-delete"]) == 1
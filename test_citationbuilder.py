@@ -0,0 +1,131 @@
+import time
+
+from addons.citationbuilder import matcher_module
+
+
+# citationbuilder: citation strings from the README and the matchers, and
+# ordinary Volume/Page values that must not match
+CORPUS = [
+    ("narc1", "Liperin seurakunnan arkisto - Syntyneiden ja kastettujen luettelot 1772-1811 (I C:3), jakso 3: kastetut 1772 tammikuu; Kansallisarkisto: http://digi.narc.fi/digi/view.ka?kuid=6593368 / Viitattu 22.10.2018"),
+    ("narc1", "Antrean seurakunnan arkisto - I C:11 Syntyneiden ja kastettujen luettelot, 1.7.1902 - 1911 1902-1911, jakso 16, sivu 26-27: 1902 marraskuu; Kansallisarkisto: https://astia.narc.fi/uusiastia/viewer/?fileId=9847027858&aineistoId=1201603817 / Viitattu 13.3.2025"),
+    ("narc2", "Kaatuneiden henkilöasiakirjat (kokoelma) - Perhonen Onni Aleksi, 16.10.1907; Kansallisarkisto: https://astia.narc.fi/uusiastia/kortti_aineisto.html?id=2684857838 / Viitattu 26.5.2022"),
+    ("sshy", "Tampereen tuomiokirkkoseurakunta - rippikirja, 1878-1887 (MKO166-181 I Aa:17) > 39: Clayhills tjenstespersoner; SSHY: http://www.sukuhistoria.fi/sshy/sivut/jasenille/paikat.php?bid=18233&pnum=39 / Viitattu 6.11.2018"),
+    ("sshy2", "Tampereen tuomiokirkkoseurakunta rippikirja 1795-1800 (TK630 I Aa:2)  N:o 1 Häggman, Kask, Grefvelin ; SSHY http://www.sukuhistoria.fi/sshy/sivut/jasenille/paikat.php?bid=15950&pnum=8 / Viitattu 03.02.2022"),
+    ("sshy2", "Alastaro rippikirja 1751-1757 (JK478 I Aa1:3)  Sivu 10 Laurois Nepponen ; SSHY http://www.sukuhistoria.fi/sshy/sivut/jasenille/paikat.php?bid=15846&pnum=13 / Viitattu 03.02.2022"),
+    ("sshy2", "Tampereen tuomiokirkkoseurakunta rippikirja 1898-1907 (AP_VI Aa:31)  Sivu 483 Trapp (Wuorio), Trast (Lehto) ; SSHY http://www.sukuhistoria.fi/sshy/sivut/jasenille/paikat.php?bid=31605&pnum=485 / Viitattu 13.03.2025"),
+    ("svar", "Hajoms kyrkoarkiv, Husförhörslängder, SE/GLA/13195/A I/12 (1861-1872), bildid: C0045710_00045"),
+    ("kansalliskirjasto2", "Kurun Sanomat, 30.11.1939, nro 48, s. 1https://digi.kansalliskirjasto.fi/sanomalehti/binding/3040878?page=1Kansalliskirjaston digitaaliset aineistotViitattu:06.12.2024"),
+    ("kansalliskirjasto2", "Vasabladet, 18.11.1911, nro 138, s. 4\nhttps://digi.kansalliskirjasto.fi/sanomalehti/binding/1340877?page=4\nKansalliskirjaston Digitoidut aineistot"),
+    ("familysearch", '"United States, Census, 1950", , FamilySearch (https://www.familysearch.org/ark:/61903/1:1:6X1G-K822 : Wed Mar 20 22:12:37 UTC 2024), Entry for Alfred L Kinney and Esther S Kinney, April 8, 1950.'),
+    ("familysearch", '"Find a Grave Index," database, FamilySearch (https://www.familysearch.org/ark:/61903/1:1:63PR-4NT2 : 18 December 2020), Augusta Heino, ; Burial, Camberwell, London Borough of Southwark, Greater London, England, Camberwell Old Cemetery; citing record ID 218217643, Find a Grave, http://www.findagrave.com.'),
+    (None, "s. 45"),
+    (None, "Page 12, entry 3"),
+    (None, "Vol. 3, p. 112"),
+    (None, "rippikirja 1878-1887 s. 39"),
+    (None, "Kansallisarkisto, Digihakemisto"),
+    (None, "SSHY jäsensivut"),
+    (None, '"Quoted title" without a repository'),
+    (None, "https://www.example.com/record/12345"),
+]
+
+
+def test_corpus():
+    for name, line in CORPUS:
+        m = matcher_module.matches(line, online=False)
+        if name is None:
+            assert m is None, line
+        else:
+            assert m is not None, line
+            assert m.matcher == name, line
+
+
+def test_narc1_fields():
+    m = matcher_module.matches(CORPUS[0][1])
+    assert m.reponame == "Liperin seurakunnan arkisto"
+    assert m.sourcetitle == "Liperin seurakunnan syntyneiden ja kastettujen luettelot 1772-1811 (I C:3)"
+    assert m.citationpage == "jakso 3: kastetut 1772 tammikuu"
+    assert m.details == "Kansallisarkisto: http://digi.narc.fi/digi/view.ka?kuid=6593368"
+    assert m.url == "http://digi.narc.fi/digi/view.ka?kuid=6593368"
+
+
+def test_familysearch_fields():
+    m = matcher_module.matches(CORPUS[11][1])
+    assert m.sourcetitle == "Find a Grave Index"
+    assert m.reponame == "FamilySearch"
+    assert m.url == "https://www.familysearch.org/ark:/61903/1:1:63PR-4NT2"
+    assert m.citationpage.startswith("Augusta Heino, ; Burial")
+
+
+def test_familysearch_title_quotes():
+    tail = " , FamilySearch (https://www.familysearch.org/ark:/61903/1:1:X : 2020), Page"
+    m = matcher_module.matches('"A "nested" title",' + tail)
+    assert m.sourcetitle == "A nested title"
+    m = matcher_module.matches('"Pat\'s Index",' + tail)
+    assert m.sourcetitle == "Pat's Index"
+    assert matcher_module.matches('"Unclosed title,' + tail) is None
+
+
+def test_familysearch_apostrophe():
+    line = "\"Finland, Lutheran Church Book Duplicates, 1720-1860\", , FamilySearch (https://www.familysearch.org/ark:/61903/1:1:XXXX-YYY : 1 May 2024), Anna Ma'tt'ila's entry, 1801."
+    m = matcher_module.matches(line)
+    assert m.sourcetitle == "Finland, Lutheran Church Book Duplicates, 1720-1860"
+    assert m.citationpage == "Anna Ma'tt'ila's entry, 1801."
+    assert m.details == line
+
+
+def test_prefilter():
+    names = [matcher.name for matcher in matcher_module.candidates(CORPUS[3][1])]
+    assert names == ["sshy"]
+    assert matcher_module.candidates("s. 45") == []
+    hiski = "https://hiski.genealogia.fi/hiski?fi+t1830723"
+    assert [m.name for m in matcher_module.candidates(hiski)] == ["hiski"]
+    assert matcher_module.candidates(hiski, online=False) == []
+
+
+def test_match_lines():
+    lines = [line for _name, line in CORPUS] * 3
+    results = matcher_module.match_lines(lines)
+    assert len(results) == len(lines)
+    assert [m and m.matcher for m in results[: len(CORPUS)]] == [
+        name for name, _line in CORPUS
+    ]
+    assert results[0] is results[len(CORPUS)]
+
+
+def test_benchmark():
+    """
+    Throughput of the pre-filtered registry compared with trying every
+    offline matcher, with its compiled pattern, on every line. This
+    measures the pre-filter only, not the earlier matches(). Run with -s to
+    see the numbers.
+    """
+    lines = [
+        line.replace("1", str(i % 10)) for i in range(500) for _name, line in CORPUS
+    ]
+    offline = [m for m in matcher_module.MATCHERS if not m.online]
+
+    def match_all(line):
+        for matcher in offline:
+            m = matcher.func(line)
+            if m:
+                return m
+        return None
+
+    t0 = time.perf_counter()
+    expected = [match_all(line) for line in lines]
+    t1 = time.perf_counter()
+    results = [matcher_module.matches(line, online=False) for line in lines]
+    t2 = time.perf_counter()
+    batch = matcher_module.match_lines(lines)
+    t3 = time.perf_counter()
+
+    def fields(m):
+        return m and (m.reponame, m.sourcetitle, m.citationpage, m.details, m.url)
+
+    assert [fields(m) for m in results] == [fields(m) for m in expected]
+    assert [fields(m) for m in batch] == [fields(m) for m in expected]
+    print()
+    print(f"{len(lines)} lines")
+    print(f"no pre-filter  {len(lines) / (t1 - t0):10.0f} lines/s")
+    print(f"pre-filtered   {len(lines) / (t2 - t1):10.0f} lines/s")
+    print(f"match_lines    {len(lines) / (t3 - t2):10.0f} lines/s")